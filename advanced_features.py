@@ -5,15 +5,98 @@ Additional capabilities for batch processing, contract comparison, and advanced
 """
 import json
 import os
+import time
 from datetime import datetime
-from typing import Dict, List, Any, Tuple
-import pandas as pd
-from enhanced_analyzer import EnhancedCUADAnalyzer
+from typing import Dict, List, Any, Tuple, Optional, TYPE_CHECKING
+from incremental_analysis import IncrementalContractAnalyzer
+from contract_comparison import ClauseLibraryIndex, compare_documents
+from near_duplicates import NearDuplicateIndex, cluster_duplicates
+from analysis_store import AnalysisStore
+from metrics import BATCH_SIZE, STAGE_SECONDS, record_cache
+from structured_logging import get_logger, hot
+
+if TYPE_CHECKING:
+    # Type hints only: importing the analyzer pulls in torch and transformers
+    from enhanced_analyzer import EnhancedCUADAnalyzer
+
+logger = get_logger("batch")
 
 class AdvancedContractProcessor:
-    def __init__(self, analyzer: EnhancedCUADAnalyzer):
+    def __init__(self, analyzer: "EnhancedCUADAnalyzer", store: Optional[AnalysisStore] = None):
         self.analyzer = analyzer
-        self.analysis_history = []
+        # Every analysis is persisted; history queries go to the store
+        self.store = store or AnalysisStore()
+        # Analyses are cached per text hash; edits of a cached text only re-run changed categories
+        self.incremental = IncrementalContractAnalyzer(analyzer)
+        self.template_library = ClauseLibraryIndex()
+        # MinHash/LSH index over every stored contract, rebuilt from the store on startup
+        self.duplicate_index = NearDuplicateIndex()
+        for document_id, signature in self.store.iter_signatures():
+            self.duplicate_index.add(document_id, signature=signature)
+    
+    def analyze_cached(self, contract_text: str, base_text: Optional[str] = None,
+                       base_document_id: Optional[str] = None) -> Dict:
+        """Comprehensive analysis served from the cache when possible.
+        
+        base_text (or its document id) names a related contract whose cached
+        analysis is diffed against, so only categories whose context differs
+        are re-run.
+        """
+        document_id = self.incremental.document_key(contract_text)
+        if base_text:
+            base_document_id = self.incremental.document_key(base_text)
+        analysis = self.incremental.analyze(contract_text, document_id, base_document_id)
+        analysis.pop('change_summary', None)
+        return analysis
+    
+    def analyze_with_history(self, contract_text: str, name: str = "Contract") -> Dict:
+        """Analyze a contract, reusing the analysis of a near-duplicate seen before.
+        
+        Returns the analysis, its document id, the MinHash signature, the
+        near-duplicate it was derived from (if any) and the categories whose
+        results were reused instead of re-run.
+        """
+        document_id = self.incremental.document_key(contract_text)
+        signature = self.duplicate_index.hasher.signature(contract_text)
+        
+        near_duplicate = None
+        previous = self.store.get_latest(document_id)
+        if previous:
+            if self.incremental.get_snapshot(document_id) is None:
+                # Snapshots do not survive a restart or LRU eviction; the text is identical, so rebuild it
+                stored = self.store.get_analysis(previous["id"])
+                self.incremental.rebuild_snapshot(document_id, contract_text, stored["analysis"])
+            near_duplicate = {"document_id": document_id, "name": previous["name"], "similarity": 1.0}
+        else:
+            match = self.duplicate_index.best_match(signature=signature)
+            # The store does not keep contract text, so only a cached snapshot can be diffed against
+            if match and self.incremental.get_snapshot(match[0]) is not None:
+                previous = self.store.get_latest(match[0]) or {}
+                near_duplicate = {"document_id": match[0], "name": previous.get("name"), "similarity": round(match[1], 3)}
+            elif match:
+                logger.info("Near-duplicate %s has no cached snapshot; analyzing from scratch", match[0],
+                            extra=hot(similarity=round(match[1], 3)))
+        record_cache("near_duplicates", near_duplicate is not None)
+        
+        base_document_id = near_duplicate["document_id"] if near_duplicate else None
+        analysis = self.incremental.analyze(contract_text, document_id, base_document_id)
+        change_summary = analysis.pop('change_summary', {})
+        analysis_id = self.store.record_analysis(document_id, name, analysis, signature, contract_text)
+        if document_id not in self.duplicate_index:
+            self.duplicate_index.add(document_id, signature=signature)
+        
+        return {
+            "document_id": document_id,
+            "analysis_id": analysis_id,
+            "analysis": analysis,
+            "near_duplicate": near_duplicate,
+            "reused_categories": change_summary.get("categories_reused", []),
+            "signature": signature
+        }
+    
+    def query_history(self, **filters) -> Dict:
+        """Paginated history of stored analyses (see AnalysisStore.query)"""
+        return self.store.query(**filters)
         
     def batch_analyze_contracts(self, contracts: List[Dict[str, str]]) -> Dict:
         """
@@ -32,20 +115,35 @@ class AdvancedContractProcessor:
             "comparative_analysis": {}
         }
         
+        BATCH_SIZE.observe(len(contracts), kind="batch_analyze")
         all_risks = []
         contract_types = {}
         
+        # Near-duplicates inside this batch, for clustering in the report
+        batch_index = NearDuplicateIndex()
+        duplicate_pairs = []
+        batch_keys = [str(i) for i in range(len(contracts))]
+        reused_count = 0
+        
         for i, contract in enumerate(contracts):
-            print(f"Analyzing contract {i+1}/{len(contracts)}: {contract['name']}")
+            logger.info("Analyzing contract %d/%d", i + 1, len(contracts), extra=hot(contract=contract['name']))
             
-            # Comprehensive analysis
-            analysis = self.analyzer.analyze_contract_comprehensive(contract['text'])
+            # Comprehensive analysis, reusing a near-duplicate's analysis when one exists
+            record = self.analyze_with_history(contract['text'], contract['name'])
+            analysis = record["analysis"]
+            if record["reused_categories"]:
+                reused_count += 1
+            
+            for key, similarity in batch_index.query(signature=record["signature"]):
+                duplicate_pairs.append((key, batch_keys[i], similarity))
+            batch_index.add(batch_keys[i], signature=record["signature"])
             
             # Add to results
             contract_result = {
                 "name": contract['name'],
                 "analysis": analysis,
-                "risk_level": self._categorize_risk_level(analysis.get('risk_assessment', {}).get('risk_score', 0))
+                "risk_level": self._categorize_risk_level(analysis.get('risk_assessment', {}).get('risk_score', 0)),
+                "near_duplicate_of": record["near_duplicate"]
             }
             
             results["individual_results"].append(contract_result)
@@ -67,9 +165,17 @@ class AdvancedContractProcessor:
             
             all_risks.extend(analysis.get('risk_assessment', {}).get('high_risk', []))
         
+        results["batch_summary"]["near_duplicates_reused"] = reused_count
+        
+        clusters = cluster_duplicates(duplicate_pairs, batch_keys)
+        for cluster in clusters:
+            for member in cluster["members"]:
+                member["name"] = contracts[int(member.pop("key"))]['name']
+        
         # Comparative analysis
         results["comparative_analysis"] = {
             "contract_types": contract_types,
+            "duplicate_clusters": clusters,
             "common_risks": self._find_common_risks(all_risks),
             "risk_distribution": {
                 "high": results["batch_summary"]["high_risk_count"],
@@ -84,9 +190,10 @@ class AdvancedContractProcessor:
         """Compare two contracts side by side"""
         print(f"Comparing {names[0]} vs {names[1]}")
         
-        # Analyze both contracts
-        analysis1 = self.analyzer.analyze_contract_comprehensive(contract1)
-        analysis2 = self.analyzer.analyze_contract_comprehensive(contract2)
+        # Analyze both contracts; the second is diffed against the first, so
+        # categories with identical context are not re-run
+        analysis1 = self.analyze_cached(contract1)
+        analysis2 = self.analyze_cached(contract2, base_text=contract1)
         
         comparison = {
             "contracts": {
@@ -96,12 +203,21 @@ class AdvancedContractProcessor:
             "comparison_summary": {
                 "risk_comparison": self._compare_risks(analysis1, analysis2),
                 "term_comparison": self._compare_terms(analysis1, analysis2),
+                "clause_comparison": compare_documents(contract1, contract2),
                 "recommendations": self._generate_comparison_recommendations(analysis1, analysis2, names)
             }
         }
         
         return comparison
     
+    def add_template(self, name: str, contract_text: str) -> Dict:
+        """Add a template contract to the clause library"""
+        return self.template_library.add_template(name, contract_text)
+    
+    def compare_with_templates(self, contract_text: str, top_k: int = 3) -> Dict:
+        """Compare a contract against the closest templates in the library"""
+        return self.template_library.compare_to_library(contract_text, top_k=top_k)
+    
     def analyze_app_store_compliance(self, contract_text: str, platform: str = "both") -> Dict:
         """
         Analyze app agreement for App Store/Play Store compliance
@@ -164,6 +280,7 @@ class AdvancedContractProcessor:
     
     def generate_contract_report(self, analysis_results: Dict, contract_name: str = "Contract") -> str:
         """Generate a comprehensive report in markdown format"""
+        start = time.perf_counter()
         report = f"""# Contract Analysis Report: {contract_name}
 **Generated on:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
@@ -221,6 +338,7 @@ class AdvancedContractProcessor:
             for i, rec in enumerate(recommendations, 1):
                 report += f"{i}. {rec}\n"
         
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage="report_generation")
         return report
     
     def _categorize_risk_level(self, risk_score: int) -> str:
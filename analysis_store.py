@@ -0,0 +1,392 @@
+"""
+Persistent Analysis Store
+=========================
+SQLite (WAL mode) store for every contract analysis: contract hash, type,
+risk score, per-category answers and timestamps, indexed for the queries the
+dashboard needs ("HIGH-risk vendor contracts this month", "contracts governed
+by Delaware law"). Replaces the in-memory analysis_history list and ad-hoc
+JSON result files.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_DB_PATH = Path(__file__).parent / "analysis_store.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    document_id TEXT NOT NULL,
+    name TEXT,
+    contract_type TEXT,
+    risk_score INTEGER NOT NULL DEFAULT 0,
+    overall_risk TEXT,
+    governing_law TEXT,
+    counterparty TEXT,
+    analyzed_at TEXT NOT NULL,
+    analyzed_ts REAL NOT NULL,
+    result_json TEXT NOT NULL,
+    minhash BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_document ON analyses(document_id, analyzed_ts);
+CREATE INDEX IF NOT EXISTS idx_analyses_risk_type_time ON analyses(overall_risk, contract_type, analyzed_ts);
+CREATE INDEX IF NOT EXISTS idx_analyses_type_time ON analyses(contract_type, analyzed_ts);
+CREATE INDEX IF NOT EXISTS idx_analyses_law ON analyses(governing_law, analyzed_ts);
+CREATE INDEX IF NOT EXISTS idx_analyses_time ON analyses(analyzed_ts);
+
+CREATE TABLE IF NOT EXISTS category_answers (
+    analysis_id INTEGER NOT NULL REFERENCES analyses(id) ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    answer TEXT,
+    confidence REAL,
+    question_used TEXT,
+    PRIMARY KEY (analysis_id, category)
+);
+CREATE INDEX IF NOT EXISTS idx_answers_category ON category_answers(category, confidence);
+"""
+
+# Jurisdictions recognised when normalizing governing law answers
+US_STATES = [
+    "Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado", "Connecticut", "Delaware",
+    "Florida", "Georgia", "Hawaii", "Idaho", "Illinois", "Indiana", "Iowa", "Kansas", "Kentucky",
+    "Louisiana", "Maine", "Maryland", "Massachusetts", "Michigan", "Minnesota", "Mississippi",
+    "Missouri", "Montana", "Nebraska", "Nevada", "New Hampshire", "New Jersey", "New Mexico",
+    "New York", "North Carolina", "North Dakota", "Ohio", "Oklahoma", "Oregon", "Pennsylvania",
+    "Rhode Island", "South Carolina", "South Dakota", "Tennessee", "Texas", "Utah", "Vermont",
+    "Virginia", "Washington", "West Virginia", "Wisconsin", "Wyoming", "District of Columbia"
+]
+OTHER_JURISDICTIONS = [
+    "England and Wales", "England", "Scotland", "Ireland", "Germany", "France", "Netherlands",
+    "Switzerland", "Singapore", "Hong Kong", "India", "Japan", "Canada", "Ontario", "British Columbia",
+    "Australia", "New South Wales", "Israel", "Sweden", "Spain", "Italy", "Luxembourg", "Cayman Islands"
+]
+# Longest names first so "West Virginia" wins over "Virginia"
+JURISDICTION_RE = re.compile(
+    r'\b(' + '|'.join(re.escape(name) for name in sorted(US_STATES + OTHER_JURISDICTIONS, key=len, reverse=True)) + r')\b',
+    re.IGNORECASE
+)
+JURISDICTION_NAMES = {name.lower(): name for name in US_STATES + OTHER_JURISDICTIONS}
+GOVERNING_LAW_HINT_RE = re.compile(r'govern|laws? of|jurisdiction', re.IGNORECASE)
+# "between TechCorp Inc., a Delaware corporation ("Provider"), and BusinessSolutions LLC ..."
+PARTIES_RE = re.compile(
+    r'\bbetween\s+(?P<first>[A-Z][\w&.\- ]{1,80}?)\s*(?:,[^,()]{0,80})?(?:\s*\([^)]{0,40}\))?,?\s+and\s+'
+    r'(?P<second>[A-Z][\w&.\- ]{1,80}?)\s*(?=[,(.;]|\s+effective|\s*$)'
+)
+
+MAX_PAGE_SIZE = 200
+
+
+def extract_jurisdiction(answer: Optional[str], contract_text: Optional[str] = None) -> Optional[str]:
+    """Normalize a governing law answer (or the contract's governing law sentence) to a jurisdiction"""
+    if answer:
+        match = JURISDICTION_RE.search(answer)
+        if match:
+            return JURISDICTION_NAMES[match.group(1).lower()]
+    if contract_text:
+        for sentence in re.split(r'(?<=[.!?])\s+', contract_text):
+            if GOVERNING_LAW_HINT_RE.search(sentence):
+                match = JURISDICTION_RE.search(sentence)
+                if match:
+                    return JURISDICTION_NAMES[match.group(1).lower()]
+    return None
+
+
+def extract_counterparty(contract_text: Optional[str]) -> Optional[str]:
+    """Second named party of the opening "between X and Y" recital, if any"""
+    if not contract_text:
+        return None
+    match = PARTIES_RE.search(contract_text[:3000])
+    if not match:
+        return None
+    return match.group('second').strip(' .') or None
+
+
+def period_bounds(period: str, now: Optional[datetime] = None) -> Tuple[Optional[float], Optional[float]]:
+    """Timestamp range for named periods: today, this_week, this_month, this_year"""
+    now = now or datetime.now()
+    if period == "today":
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif period == "this_week":
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        start = datetime.fromtimestamp(start.timestamp() - start.weekday() * 86400)
+    elif period == "this_month":
+        start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    elif period == "this_year":
+        start = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    else:
+        raise ValueError(f"Unknown period: {period}")
+    return start.timestamp(), None
+
+
+class AnalysisStore:
+    def __init__(self, db_path: Optional[str] = None):
+        """Open (and create if needed) the analysis database"""
+        self.db_path = str(db_path or os.getenv('ANALYSIS_STORE_PATH') or DEFAULT_DB_PATH)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._listeners = []
+        self._commit_callbacks = []
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection (one per thread; WAL lets readers run alongside the writer)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def add_listener(self, listener, on_commit=None):
+        """Call listener(conn, record) inside the write transaction of every new analysis,
+        and on_commit(record) once that transaction has been committed"""
+        self._listeners.append(listener)
+        if on_commit is not None:
+            self._commit_callbacks.append(on_commit)
+
+    def transaction(self):
+        """Serialized write transaction on this thread's connection (use as a context manager)"""
+        return _WriteTransaction(self)
+
+    def record_analysis(self, document_id: str, name: str, analysis: Dict,
+                        signature: Optional[np.ndarray] = None, contract_text: Optional[str] = None,
+                        counterparty: Optional[str] = None) -> int:
+        """Persist one analysis with its per-category answers; returns the row id"""
+        risk_assessment = analysis.get('risk_assessment', {})
+        cuad_results = analysis.get('cuad_analysis', {})
+        analyzed_at = analysis.get('timestamp') or datetime.now().isoformat()
+        try:
+            analyzed_ts = datetime.fromisoformat(analyzed_at).timestamp()
+        except ValueError:
+            analyzed_ts = datetime.now().timestamp()
+
+        governing_law = extract_jurisdiction(cuad_results.get('governing_law', {}).get('answer'), contract_text)
+        counterparty = counterparty or extract_counterparty(contract_text)
+        record = {
+            "document_id": document_id,
+            "name": name,
+            "contract_type": analysis.get('contract_type', 'unknown'),
+            "risk_score": risk_assessment.get('risk_score', 0),
+            "overall_risk": risk_assessment.get('overall_risk', 'LOW'),
+            "governing_law": governing_law,
+            "counterparty": counterparty,
+            "analyzed_at": analyzed_at,
+            "analyzed_ts": analyzed_ts,
+            "analysis": analysis
+        }
+
+        conn = self.connection()
+        with self._write_lock, conn:
+            cursor = conn.execute(
+                """INSERT INTO analyses (document_id, name, contract_type, risk_score, overall_risk,
+                                         governing_law, counterparty, analyzed_at, analyzed_ts, result_json, minhash)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (document_id, name, record["contract_type"], record["risk_score"], record["overall_risk"],
+                 governing_law, counterparty, analyzed_at, analyzed_ts, json.dumps(analysis),
+                 signature.astype(np.uint64).tobytes() if signature is not None else None)
+            )
+            analysis_id = cursor.lastrowid
+            conn.executemany(
+                """INSERT INTO category_answers (analysis_id, category, answer, confidence, question_used)
+                   VALUES (?, ?, ?, ?, ?)""",
+                [(analysis_id, category, result.get('answer'), result.get('confidence'), result.get('question_used'))
+                 for category, result in cuad_results.items()]
+            )
+            record["id"] = analysis_id
+            for listener in self._listeners:
+                listener(conn, record)
+        for callback in self._commit_callbacks:
+            callback(record)
+        return analysis_id
+
+    def _summary(self, row: sqlite3.Row) -> Dict:
+        return {
+            "id": row["id"],
+            "document_id": row["document_id"],
+            "name": row["name"],
+            "contract_type": row["contract_type"],
+            "risk_score": row["risk_score"],
+            "overall_risk": row["overall_risk"],
+            "governing_law": row["governing_law"],
+            "counterparty": row["counterparty"],
+            "timestamp": row["analyzed_at"]
+        }
+
+    def get_latest(self, document_id: str) -> Optional[Dict]:
+        """Most recent analysis summary of a document"""
+        row = self.connection().execute(
+            "SELECT * FROM analyses WHERE document_id = ? ORDER BY analyzed_ts DESC, id DESC LIMIT 1",
+            (document_id,)
+        ).fetchone()
+        return self._summary(row) if row else None
+
+    def get_analysis(self, analysis_id: int) -> Optional[Dict]:
+        """Full stored analysis, including the original result payload"""
+        conn = self.connection()
+        row = conn.execute("SELECT * FROM analyses WHERE id = ?", (analysis_id,)).fetchone()
+        if row is None:
+            return None
+        summary = self._summary(row)
+        summary["analysis"] = json.loads(row["result_json"])
+        return summary
+
+    def category_answers(self, analysis_id: int) -> Dict[str, Dict]:
+        rows = self.connection().execute(
+            "SELECT category, answer, confidence, question_used FROM category_answers WHERE analysis_id = ?",
+            (analysis_id,)
+        ).fetchall()
+        return {row["category"]: {"answer": row["answer"], "confidence": row["confidence"],
+                                  "question_used": row["question_used"]} for row in rows}
+
+    def question_usage(self) -> List[Dict]:
+        """How often each question template produced the kept answer, per contract type and category"""
+        rows = self.connection().execute(
+            """SELECT a.contract_type, c.category, c.question_used, COUNT(*) AS wins
+               FROM category_answers c JOIN analyses a ON a.id = c.analysis_id
+               WHERE c.question_used IS NOT NULL AND c.question_used != ''
+               GROUP BY a.contract_type, c.category, c.question_used"""
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def query(self, overall_risk: Optional[str] = None, contract_type: Optional[str] = None,
+              governing_law: Optional[str] = None, counterparty: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None,
+              name_contains: Optional[str] = None, page: int = 1, page_size: int = 20) -> Dict:
+        """Filtered, newest-first, paginated list of analysis summaries"""
+        clauses = []
+        params = []
+        if overall_risk:
+            clauses.append("overall_risk = ?")
+            params.append(overall_risk.upper())
+        if contract_type:
+            clauses.append("contract_type = ?")
+            params.append(contract_type)
+        if governing_law:
+            clauses.append("governing_law = ? COLLATE NOCASE")
+            params.append(JURISDICTION_NAMES.get(governing_law.lower(), governing_law))
+        if counterparty:
+            clauses.append("counterparty = ? COLLATE NOCASE")
+            params.append(counterparty)
+        if since is not None:
+            clauses.append("analyzed_ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("analyzed_ts < ?")
+            params.append(until)
+        if name_contains:
+            clauses.append("name LIKE ?")
+            params.append(f"%{name_contains}%")
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        page = max(1, int(page))
+        page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+
+        conn = self.connection()
+        total = conn.execute(f"SELECT COUNT(*) FROM analyses {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * FROM analyses {where} ORDER BY analyzed_ts DESC, id DESC LIMIT ? OFFSET ?",
+            params + [page_size, (page - 1) * page_size]
+        ).fetchall()
+
+        return {
+            "items": [self._summary(row) for row in rows],
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "pages": (total + page_size - 1) // page_size
+        }
+
+    def iter_signatures(self) -> Iterator[Tuple[str, np.ndarray]]:
+        """Latest MinHash signature per document, for rebuilding the duplicate index"""
+        rows = self.connection().execute(
+            """SELECT document_id, minhash FROM analyses
+               WHERE id IN (SELECT MAX(id) FROM analyses WHERE minhash IS NOT NULL GROUP BY document_id)"""
+        )
+        for row in rows:
+            yield row["document_id"], np.frombuffer(row["minhash"], dtype=np.uint64).copy()
+
+    def count(self) -> int:
+        return self.connection().execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+    def import_json_results(self, json_path: str, name: Optional[str] = None) -> int:
+        """Import a per-category result file such as contract_analysis.json"""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            cuad_results = json.load(f)
+        analysis = {
+            "contract_type": "unknown",
+            "cuad_analysis": cuad_results,
+            "risk_assessment": {},
+            "timestamp": datetime.fromtimestamp(os.path.getmtime(json_path)).isoformat()
+        }
+        document_id = f"import:{Path(json_path).resolve()}"
+        return self.record_analysis(document_id, name or Path(json_path).stem, analysis)
+
+
+class _WriteTransaction:
+    def __init__(self, store: AnalysisStore):
+        self.store = store
+        self.conn = None
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.store._write_lock.acquire()
+        self.conn = self.store.connection()
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.store._write_lock.release()
+        return False
+
+
+def main():
+    """Command line access to the analysis store"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Contract Analysis Store")
+    parser.add_argument("--db", help="Database path (defaults to ANALYSIS_STORE_PATH or analysis_store.db)")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Import JSON result files")
+    import_parser.add_argument("files", nargs="+")
+
+    query_parser = subparsers.add_parser("query", help="Query stored analyses")
+    query_parser.add_argument("--risk")
+    query_parser.add_argument("--type")
+    query_parser.add_argument("--law")
+    query_parser.add_argument("--period", choices=["today", "this_week", "this_month", "this_year"])
+    query_parser.add_argument("--page", type=int, default=1)
+    query_parser.add_argument("--page-size", type=int, default=20)
+
+    args = parser.parse_args()
+    store = AnalysisStore(args.db)
+
+    if args.action == "import":
+        for json_file in args.files:
+            analysis_id = store.import_json_results(json_file)
+            print(f"Imported {json_file} as analysis #{analysis_id}")
+    elif args.action == "query":
+        since = period_bounds(args.period)[0] if args.period else None
+        results = store.query(overall_risk=args.risk, contract_type=args.type, governing_law=args.law,
+                              since=since, page=args.page, page_size=args.page_size)
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,495 @@
+"""
+Contract Analysis Pipeline Benchmark
+====================================
+Reproducible benchmark of the analysis pipeline on synthetic contracts:
+per-stage latency (context extraction, tokenization, forward pass, span
+selection, risk scoring, report generation), end-to-end throughput at
+several concurrency levels, forward-pass throughput by batch size, and peak
+resident memory. Results are written as JSON so runs on different commits
+can be compared with --compare.
+
+Runs fully offline on CPU: when YOUR fine-tuned weights (and tokenizer) are
+not present at --model-path, a small randomly initialized RoBERTa with a
+byte-level vocabulary is used instead, so timings stay representative of the
+architecture while answers are meaningless.
+
+    python benchmark_pipeline.py --output bench.json
+    python benchmark_pipeline.py --clauses 20 80 --concurrency 1 2 4 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import metrics
+import structured_logging
+
+CONTRACT_TYPES = ["app_agreement", "employment", "vendor_supply", "service_agreement", "general_contract"]
+
+TITLES = {
+    "app_agreement": ("MOBILE APP TERMS OF SERVICE", "the Developer", "the User"),
+    "employment": ("EMPLOYMENT AGREEMENT", "the Employer", "the Employee"),
+    "vendor_supply": ("SUPPLY AGREEMENT", "the Supplier", "the Buyer"),
+    "service_agreement": ("CONSULTING SERVICE AGREEMENT", "the Consultant", "the Client"),
+    "general_contract": ("MASTER AGREEMENT", "the First Party", "the Second Party")
+}
+
+# Clause variants per CUAD-style category; {a} and {b} are the two parties
+CLAUSE_LIBRARY = {
+    "governing_law": [
+        "This Agreement shall be governed by the laws of the State of {state}, without regard to conflict of laws principles.",
+        "Any dispute arising hereunder shall be resolved exclusively in the courts of {state}, whose laws govern this Agreement.",
+        "The parties agree that the laws of {state} apply and submit to the jurisdiction of its courts."
+    ],
+    "termination": [
+        "Either party may terminate this Agreement upon {days} days written notice to the other party.",
+        "{a} may terminate this Agreement immediately if {b} commits a material breach that is not cured within {days} days.",
+        "This Agreement will expire after {years} years unless terminated earlier in accordance with this section."
+    ],
+    "liability": [
+        "In no event shall {a} be liable for indirect, incidental or consequential damages.",
+        "The total liability of {a} shall not exceed the fees paid in the {months} months preceding the claim.",
+        "{b} shall have unlimited liability for any breach of its obligations under this Agreement."
+    ],
+    "payment_terms": [
+        "{b} shall pay all invoices within {days} days of receipt; late payments accrue interest at {rate} percent per month.",
+        "The fee for the term is ${amount}, payable in advance on the first day of each quarter.",
+        "All prices exclude taxes, which shall be paid by {b} in addition to the fees."
+    ],
+    "intellectual_property": [
+        "All intellectual property created under this Agreement shall be owned exclusively by {a}.",
+        "{a} grants {b} a non-exclusive, non-transferable license to use the deliverables.",
+        "Each party retains all copyright and other rights in works it owned before the effective date."
+    ],
+    "confidentiality": [
+        "Each party shall keep confidential all non-public information disclosed by the other party for {years} years.",
+        "Confidential information may only be disclosed to personnel with a need to know who are bound by written obligations.",
+        "The non-disclosure obligations in this section survive termination of this Agreement."
+    ],
+    "data_privacy": [
+        "{a} may collect personal information including name, email and usage data to operate and improve its offering.",
+        "Personal data will be retained for {months} months and then deleted or anonymized.",
+        "{a} may share collected data with affiliated companies and advertising partners."
+    ],
+    "subscription_terms": [
+        "Subscriptions automatically renew each month unless cancelled at least {days} days before the renewal date.",
+        "The subscription costs ${amount} per month and may be cancelled at any time with no refund for the current period.",
+        "{a} may change subscription pricing with {days} days notice."
+    ],
+    "user_content": [
+        "{b} grants {a} a worldwide, perpetual, irrevocable license to use, modify and share user content.",
+        "{a} may remove user content at its sole discretion without notice.",
+        "{b} retains ownership of user content uploaded to the service."
+    ],
+    "boilerplate": [
+        "This Agreement constitutes the entire agreement between the parties and supersedes all prior understandings.",
+        "No waiver of any provision shall be effective unless in writing and signed by both parties.",
+        "If any provision is held invalid, the remaining provisions shall continue in full force and effect.",
+        "Notices shall be delivered in writing to the addresses set out above.",
+        "Neither party may assign this Agreement without the prior written consent of the other party."
+    ]
+}
+
+STATES = ["Delaware", "California", "New York", "Texas", "Washington"]
+
+
+def parse_clause_mix(value: Optional[str]) -> Dict[str, float]:
+    """'liability=3,termination=1' -> weights; unspecified categories get weight 1"""
+    weights = {category: 1.0 for category in CLAUSE_LIBRARY}
+    if value:
+        for part in value.split(","):
+            category, _, weight = part.partition("=")
+            if category not in CLAUSE_LIBRARY:
+                raise ValueError(f"Unknown clause category {category!r}; choose from {sorted(CLAUSE_LIBRARY)}")
+            weights[category] = float(weight or 1)
+    return weights
+
+
+def generate_contract(seed: int, clauses: int = 40, contract_type: str = "general_contract",
+                      clause_mix: Optional[Dict[str, float]] = None) -> str:
+    """Deterministic synthetic contract of numbered clauses drawn from the clause library"""
+    rng = random.Random(seed)
+    weights = clause_mix or parse_clause_mix(None)
+    categories = [category for category in CLAUSE_LIBRARY if weights.get(category, 0) > 0]
+    if contract_type != "app_agreement":
+        categories = [category for category in categories if category not in ("subscription_terms", "user_content")]
+    title, party_a, party_b = TITLES[contract_type]
+
+    lines = [title, "", f"This {title.title()} (the \"Agreement\") is entered into between {party_a} and {party_b}.", ""]
+    for number in range(1, clauses + 1):
+        category = rng.choices(categories, weights=[weights[category] for category in categories])[0]
+        template = rng.choice(CLAUSE_LIBRARY[category])
+        text = template.format(
+            a=party_a, b=party_b, state=rng.choice(STATES), days=rng.choice([10, 15, 30, 60, 90]),
+            years=rng.randint(1, 5), months=rng.choice([3, 6, 12, 24]), rate=rng.choice([1, 1.5, 2]),
+            amount=rng.choice([99, 500, 2500, 10000])
+        )
+        heading = category.replace("_", " ").upper()
+        lines.append(f"{number}. {heading}")
+        lines.append(text[0].upper() + text[1:])
+        lines.append("")
+    return "\n".join(lines)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _bytes_to_unicode() -> Dict[int, str]:
+    """GPT-2 byte-to-unicode table used by byte-level BPE vocabularies"""
+    printable = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + list(range(ord("®"), ord("ÿ") + 1))
+    characters = printable[:]
+    extra = 0
+    for byte in range(256):
+        if byte not in printable:
+            printable.append(byte)
+            characters.append(256 + extra)
+            extra += 1
+    return dict(zip(printable, map(chr, characters)))
+
+
+MODEL_SIZES = {
+    "tiny": {"hidden_size": 64, "num_hidden_layers": 2, "num_attention_heads": 2, "intermediate_size": 128},
+    "small": {"hidden_size": 256, "num_hidden_layers": 4, "num_attention_heads": 4, "intermediate_size": 1024},
+    "base": {"hidden_size": 768, "num_hidden_layers": 12, "num_attention_heads": 12, "intermediate_size": 3072}
+}
+
+
+def has_fine_tuned_model(model_path: str) -> bool:
+    path = Path(model_path)
+    has_weights = (path / "pytorch_model.bin").exists() or (path / "model.safetensors").exists()
+    has_tokenizer = (path / "vocab.json").exists() and (path / "merges.txt").exists()
+    return has_weights and has_tokenizer and (path / "config.json").exists()
+
+
+def build_random_model(directory: str, size: str = "small", seed: int = 0) -> str:
+    """Write a randomly initialized RoBERTa QA model with a byte-level tokenizer to directory"""
+    import torch
+    from transformers import RobertaConfig, RobertaForQuestionAnswering
+
+    specials = ["<s>", "<pad>", "</s>", "<unk>"]
+    vocab = {token: index for index, token in enumerate(specials)}
+    for character in _bytes_to_unicode().values():
+        vocab[character] = len(vocab)
+    vocab["<mask>"] = len(vocab)
+    with open(os.path.join(directory, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    with open(os.path.join(directory, "merges.txt"), "w", encoding="utf-8") as f:
+        f.write("#version: 0.2\n")
+
+    torch.manual_seed(seed)
+    config = RobertaConfig(vocab_size=len(vocab), max_position_embeddings=514, type_vocab_size=1,
+                           pad_token_id=1, bos_token_id=0, eos_token_id=2, **MODEL_SIZES[size])
+    RobertaForQuestionAnswering(config).save_pretrained(directory, safe_serialization=True)
+    return directory
+
+
+class PeakMemorySampler:
+    """Samples resident memory on a background thread; peak is the max seen since reset()"""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        self.peak = max(self.peak, metrics.resident_memory_bytes() or 0)
+
+    def reset(self) -> int:
+        self.sample()
+        peak, self.peak = self.peak, 0
+        return peak
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def summarize(values: List[float]) -> Dict:
+    """count, mean and nearest-rank percentiles, in milliseconds"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def percentile(q):
+        return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(50) * 1000, 3),
+        "p95_ms": round(percentile(95) * 1000, 3),
+        "p99_ms": round(percentile(99) * 1000, 3),
+        "total_s": round(sum(ordered), 4)
+    }
+
+
+class PipelineBenchmark:
+    def __init__(self, analyzer, processor, seed: int = 0, clause_mix: Optional[Dict[str, float]] = None):
+        self.analyzer = analyzer
+        self.processor = processor
+        self.seed = seed
+        self.clause_mix = clause_mix
+        self._next_seed = seed
+
+    def contracts(self, count: int, clauses: int) -> List[str]:
+        """Distinct contracts (so no cache can serve them) cycling through contract types"""
+        texts = []
+        for index in range(count):
+            contract_type = CONTRACT_TYPES[index % len(CONTRACT_TYPES)]
+            texts.append(generate_contract(self._next_seed, clauses, contract_type, self.clause_mix))
+            self._next_seed += 1
+        return texts
+
+    def analyze(self, contract_text: str) -> Dict:
+        analysis = self.analyzer.analyze_contract_comprehensive(contract_text)
+        self.processor.generate_contract_report(analysis, "Benchmark Contract")
+        return analysis
+
+    def stage_latency(self, clauses: int, contracts: int) -> Dict:
+        """Per-stage and end-to-end latency for sequential analyses of one contract size"""
+        texts = self.contracts(contracts, clauses)
+        end_to_end = []
+        with metrics.STAGE_SECONDS.record_samples() as samples:
+            for text in texts:
+                start = time.perf_counter()
+                self.analyze(text)
+                end_to_end.append(time.perf_counter() - start)
+        return {
+            "clauses": clauses,
+            "characters_mean": round(sum(map(len, texts)) / len(texts)),
+            "contracts": contracts,
+            "end_to_end": summarize(end_to_end),
+            "stages": {key[0]: summarize(values) for key, values in sorted(samples.items())}
+        }
+
+    def concurrency(self, level: int, clauses: int, contracts: int) -> Dict:
+        """Throughput of independent analyses run from `level` threads"""
+        texts = self.contracts(contracts, clauses)
+        latencies = []
+
+        def timed(text):
+            start = time.perf_counter()
+            self.analyze(text)
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=level) as executor:
+            list(executor.map(timed, texts))
+        elapsed = time.perf_counter() - start
+        return {
+            "concurrency": level,
+            "clauses": clauses,
+            "contracts": contracts,
+            "seconds": round(elapsed, 3),
+            "contracts_per_second": round(contracts / elapsed, 3),
+            "latency": summarize(latencies)
+        }
+
+    def forward_batch(self, batch_size: int, seq_length: int, repeats: int) -> Dict:
+        """Forward-pass throughput at a batch size, on padded inputs like the QA loop"""
+        import torch
+
+        question = self.analyzer.question_templates["liability"][0]
+        context = generate_contract(self.seed, 60, "general_contract", self.clause_mix)
+        inputs = self.analyzer.tokenizer.encode_plus(question, context, add_special_tokens=True, max_length=seq_length,
+                                                     truncation=True, padding="max_length", return_tensors="pt")
+        batch = {name: tensor.repeat(batch_size, 1) for name, tensor in inputs.items()}
+        with torch.no_grad():
+            self.analyzer.model(**batch)  # shape warm-up
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                self.analyzer.model(**batch)
+                timings.append(time.perf_counter() - start)
+        best = min(timings)
+        return {
+            "batch_size": batch_size,
+            "seq_length": seq_length,
+            "forward": summarize(timings),
+            "sequences_per_second": round(batch_size / best, 2)
+        }
+
+
+def load_pipeline(model_path: str, model_size: str, seed: int, work_dir: str):
+    """(analyzer, processor, model description), falling back to a random-init model"""
+    from enhanced_analyzer import EnhancedCUADAnalyzer
+    from advanced_features import AdvancedContractProcessor
+
+    if has_fine_tuned_model(model_path):
+        source = "fine_tuned"
+    else:
+        print(f"ℹ️  No fine-tuned weights at {model_path}; using a random-init '{model_size}' RoBERTa")
+        model_path = os.path.join(work_dir, "model")
+        os.makedirs(model_path, exist_ok=True)
+        build_random_model(model_path, model_size, seed)
+        source = "random_init"
+
+    analyzer = EnhancedCUADAnalyzer(model_path, enable_groq_enhancement=False)
+    processor = AdvancedContractProcessor(analyzer)
+    config = analyzer.model.config
+    model = {
+        "source": source,
+        "size": model_size if source == "random_init" else "fine_tuned",
+        "hidden_size": config.hidden_size,
+        "layers": config.num_hidden_layers,
+        "parameters": sum(parameter.numel() for parameter in analyzer.model.parameters())
+    }
+    return analyzer, processor, model
+
+
+def run_benchmark(args) -> Dict:
+    import torch
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    random.seed(args.seed)
+    torch.manual_seed(args.seed)
+    clause_mix = parse_clause_mix(args.clause_mix)
+
+    with tempfile.TemporaryDirectory() as work_dir, PeakMemorySampler() as memory:
+        # Keep analysis history out of the real store
+        os.environ.setdefault("ANALYSIS_STORE_PATH", os.path.join(work_dir, "analysis_store.db"))
+        analyzer, processor, model = load_pipeline(args.model_path, args.model_size, args.seed, work_dir)
+        peak_after_load = memory.reset()
+        bench = PipelineBenchmark(analyzer, processor, args.seed, clause_mix)
+
+        analyzer.warm_up([min(512, args.seq_length)], batch_sizes=(1,))
+        bench.analyze(generate_contract(args.seed, 10))
+
+        results = {"stage_latency": [], "concurrency": [], "forward_batch": []}
+        for clauses in args.clauses:
+            row = bench.stage_latency(clauses, args.contracts)
+            row["peak_rss_bytes"] = memory.reset()
+            results["stage_latency"].append(row)
+            print(f"{clauses} clauses: {row['end_to_end']['p50_ms']:.0f} ms p50 end-to-end")
+
+        for level in args.concurrency:
+            row = bench.concurrency(level, args.clauses[0], max(args.contracts, level * 2))
+            row["peak_rss_bytes"] = memory.reset()
+            results["concurrency"].append(row)
+            print(f"concurrency {level}: {row['contracts_per_second']:.2f} contracts/s")
+
+        for batch_size in args.batch_sizes:
+            row = bench.forward_batch(batch_size, args.seq_length, args.repeats)
+            row["peak_rss_bytes"] = memory.reset()
+            results["forward_batch"].append(row)
+            print(f"batch {batch_size}: {row['sequences_per_second']:.1f} sequences/s")
+
+        peak = max([peak_after_load] + [row["peak_rss_bytes"] for rows in results.values() for row in rows])
+
+    import transformers
+    return {
+        "meta": {
+            "benchmark": "contract_pipeline",
+            "version": 1,
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "transformers": transformers.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+            "seed": args.seed,
+            "clause_mix": clause_mix,
+            "model": model
+        },
+        "peak_rss_bytes": peak,
+        "peak_rss_after_load_bytes": peak_after_load,
+        **results
+    }
+
+
+def comparable_metrics(result: Dict) -> Dict[str, float]:
+    """Flat {name: value} of the headline numbers; lower is better except *_per_second"""
+    values = {"peak_rss_mb": result["peak_rss_bytes"] / 1e6}
+    for row in result["stage_latency"]:
+        values[f"e2e_p50_ms[clauses={row['clauses']}]"] = row["end_to_end"]["p50_ms"]
+        for stage, summary in row["stages"].items():
+            if summary.get("count"):
+                values[f"{stage}_mean_ms[clauses={row['clauses']}]"] = summary["mean_ms"]
+    for row in result["concurrency"]:
+        values[f"contracts_per_second[concurrency={row['concurrency']}]"] = row["contracts_per_second"]
+    for row in result["forward_batch"]:
+        values[f"sequences_per_second[batch={row['batch_size']}]"] = row["sequences_per_second"]
+    return values
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """Print changes against a previous run; returns the names of regressions beyond threshold"""
+    before, after = comparable_metrics(baseline), comparable_metrics(current)
+    if baseline["meta"].get("model") != current["meta"].get("model"):
+        print("⚠️  Baseline used a different model; differences are not comparable")
+    regressions = []
+    print(f"\nComparison with {baseline['meta'].get('git_commit')} (threshold {threshold:.0%}):")
+    for name in sorted(set(before) & set(after)):
+        if not before[name]:
+            continue
+        change = (after[name] - before[name]) / before[name]
+        worse = -change if "per_second" in name else change
+        flag = "  REGRESSION" if worse > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"  {name:55s} {before[name]:12.2f} -> {after[name]:12.2f} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Contract analysis pipeline benchmark")
+    parser.add_argument("--model-path", default="./", help="Fine-tuned model directory (random-init fallback if absent)")
+    parser.add_argument("--model-size", choices=sorted(MODEL_SIZES), default="small",
+                        help="Size of the random-init fallback model")
+    parser.add_argument("--clauses", type=int, nargs="+", default=[20, 80], help="Contract sizes in clauses")
+    parser.add_argument("--clause-mix", help="Category weights, e.g. liability=3,termination=2,boilerplate=0")
+    parser.add_argument("--contracts", type=int, default=5, help="Contracts per measurement")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--seq-length", type=int, default=512)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, help="torch intra-op threads (default: torch's choice)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    parser.add_argument("--regression-threshold", type=float, default=0.10,
+                        help="Relative slowdown reported as a regression (exit status 1)")
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), result, args.regression_threshold)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    structured_logging.quiet_offline_run()
+    main()
@@ -0,0 +1,301 @@
+"""
+Confidence Calibration
+======================
+The analyzer's confidence is start_prob * end_prob of the best span, which is
+not a probability that the answer is right: it depends on the category, the
+context length and how peaked the model is. Thresholds on it (the
+governing-law risk check, early exit, caching) cannot be trusted until it is
+calibrated.
+
+This module fits one calibrator per category on an evaluation set, mapping
+raw confidence to the observed probability that the answer is correct:
+
+- temperature: logistic on the confidence logit, sigmoid(logit(c) / T + b)
+  (T = 1, b = 0 is the identity)
+- isotonic:    monotone step function fitted with pool-adjacent-violators
+
+Both are monotone, so within a category the ranking of answers (and the
+best-template choice) is unchanged. A calibrator fitted on every category
+together covers categories with too few evaluation questions.
+
+The calibrators are stored next to the model as confidence_calibration.json
+and applied in one vectorized pass over a contract's category results
+(CONFIDENCE_CALIBRATION_PATH overrides the location, CALIBRATED_CONFIDENCE=0
+disables it). The raw value stays available as raw_confidence; template
+early-exit thresholds keep working on the raw value.
+
+    python calibration.py --dataset CUAD_v1/test.json --model-path ./
+"""
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+import structured_logging
+
+CALIBRATION_FILENAME = "confidence_calibration.json"
+METHODS = ("auto", "temperature", "isotonic")
+FALLBACK = "*"
+MIN_SAMPLES = 20
+MIN_ISOTONIC_SAMPLES = 200
+ECE_BINS = 10
+EPSILON = 1e-7
+
+
+def _logit(confidences: np.ndarray) -> np.ndarray:
+    confidences = np.clip(confidences, EPSILON, 1 - EPSILON)
+    return np.log(confidences) - np.log1p(-confidences)
+
+
+def _sigmoid(values: np.ndarray) -> np.ndarray:
+    return 0.5 * (1.0 + np.tanh(0.5 * values))
+
+
+class TemperatureCalibrator:
+    kind = "temperature"
+
+    def __init__(self, temperature: float = 1.0, bias: float = 0.0):
+        self.temperature = temperature
+        self.bias = bias
+
+    def apply(self, confidences: np.ndarray) -> np.ndarray:
+        return _sigmoid(_logit(confidences) / self.temperature + self.bias)
+
+    @classmethod
+    def fit(cls, confidences: np.ndarray, correct: np.ndarray, l2: float = 1e-3,
+            iterations: int = 50) -> "TemperatureCalibrator":
+        """Damped Newton's method on the binary log loss, lightly pulled towards the identity"""
+        features = np.stack([_logit(confidences), np.ones_like(confidences)], axis=1)
+        prior = np.array([1.0, 0.0])
+
+        def loss(weights):
+            scores = features @ weights
+            return np.sum(np.logaddexp(0.0, scores) - correct * scores) + 0.5 * l2 * np.sum((weights - prior) ** 2)
+
+        weights = prior.copy()
+        for _ in range(iterations):
+            probabilities = _sigmoid(features @ weights)
+            gradient = features.T @ (probabilities - correct) + l2 * (weights - prior)
+            hessian = (features.T * (probabilities * (1 - probabilities))) @ features + l2 * np.eye(2)
+            step = np.linalg.solve(hessian, gradient)
+            # Halve the step until the loss goes down; raw logits span a wide range
+            current, rate = loss(weights), 1.0
+            while rate > 1e-6 and loss(weights - rate * step) > current:
+                rate /= 2
+            weights = weights - rate * step
+            if np.abs(rate * step).max() < 1e-9:
+                break
+        # Confidence that does not predict correctness at all: keep the mapping monotone, near the base rate
+        scale = max(weights[0], 1e-3)
+        return cls(temperature=float(1.0 / scale), bias=float(weights[1]))
+
+    def to_dict(self) -> Dict:
+        return {"kind": self.kind, "temperature": self.temperature, "bias": self.bias}
+
+
+class IsotonicCalibrator:
+    kind = "isotonic"
+
+    def __init__(self, knots_x: List[float], knots_y: List[float]):
+        self.knots_x = np.asarray(knots_x, dtype=float)
+        self.knots_y = np.asarray(knots_y, dtype=float)
+
+    def apply(self, confidences: np.ndarray) -> np.ndarray:
+        return np.interp(confidences, self.knots_x, self.knots_y)
+
+    @classmethod
+    def fit(cls, confidences: np.ndarray, correct: np.ndarray) -> "IsotonicCalibrator":
+        """Pool adjacent violators over confidence-sorted outcomes; one knot per pooled block"""
+        order = np.argsort(confidences, kind="stable")
+        x, y = confidences[order], correct[order].astype(float)
+        # blocks of [sum of x, sum of y, count]
+        blocks = []
+        for value_x, value_y in zip(x, y):
+            blocks.append([value_x, value_y, 1])
+            while len(blocks) > 1 and blocks[-2][1] / blocks[-2][2] > blocks[-1][1] / blocks[-1][2]:
+                sum_x, sum_y, count = blocks.pop()
+                blocks[-1][0] += sum_x
+                blocks[-1][1] += sum_y
+                blocks[-1][2] += count
+        return cls([sum_x / count for sum_x, _, count in blocks], [sum_y / count for _, sum_y, count in blocks])
+
+    def to_dict(self) -> Dict:
+        return {"kind": self.kind, "knots_x": self.knots_x.tolist(), "knots_y": self.knots_y.tolist()}
+
+
+CALIBRATORS = {TemperatureCalibrator.kind: TemperatureCalibrator, IsotonicCalibrator.kind: IsotonicCalibrator}
+
+
+def calibrator_from_dict(data: Dict):
+    data = dict(data)
+    return CALIBRATORS[data.pop("kind")](**data)
+
+
+def fit_calibrator(confidences: np.ndarray, correct: np.ndarray, method: str = "auto"):
+    if method == "auto":
+        method = "isotonic" if len(confidences) >= MIN_ISOTONIC_SAMPLES else "temperature"
+    return CALIBRATORS[method].fit(np.asarray(confidences, dtype=float), np.asarray(correct, dtype=float))
+
+
+class ConfidenceCalibration:
+    def __init__(self, calibrators: Optional[Dict] = None, meta: Optional[Dict] = None):
+        """calibrators: category -> calibrator, FALLBACK for categories without their own"""
+        self.calibrators = calibrators or {}
+        self.meta = meta or {}
+
+    def apply(self, categories: Sequence[str], confidences: Sequence[float]) -> np.ndarray:
+        """Calibrated confidences, one vectorized calibrator call per distinct category"""
+        categories = np.asarray(categories)
+        confidences = np.asarray(confidences, dtype=float)
+        calibrated = confidences.copy()
+        for category in np.unique(categories):
+            calibrator = self.calibrators.get(category, self.calibrators.get(FALLBACK))
+            if calibrator is not None:
+                mask = categories == category
+                calibrated[mask] = calibrator.apply(confidences[mask])
+        return calibrated
+
+    def methods(self) -> Dict[str, str]:
+        return {category: calibrator.kind for category, calibrator in self.calibrators.items()}
+
+    def to_dict(self) -> Dict:
+        return {"calibrators": {category: calibrator.to_dict() for category, calibrator in self.calibrators.items()},
+                "meta": self.meta}
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "ConfidenceCalibration":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        calibrators = {category: calibrator_from_dict(calibrator)
+                       for category, calibrator in data.get("calibrators", {}).items()}
+        return cls(calibrators, data.get("meta"))
+
+    @classmethod
+    def fit(cls, categories: Sequence[str], confidences: Sequence[float], correct: Sequence[bool],
+            method: str = "auto", min_samples: int = MIN_SAMPLES) -> "ConfidenceCalibration":
+        """Per-category calibrators where a category has min_samples answers, plus the fallback"""
+        categories = np.asarray(categories)
+        confidences = np.asarray(confidences, dtype=float)
+        correct = np.asarray(correct, dtype=float)
+        calibrators = {}
+        if len(confidences) >= min_samples:
+            calibrators[FALLBACK] = fit_calibrator(confidences, correct, method)
+        for category in np.unique(categories):
+            mask = categories == category
+            if mask.sum() >= min_samples:
+                calibrators[str(category)] = fit_calibrator(confidences[mask], correct[mask], method)
+        return cls(calibrators)
+
+
+def calibration_path(model_path: str) -> str:
+    return os.getenv("CONFIDENCE_CALIBRATION_PATH") or os.path.join(model_path, CALIBRATION_FILENAME)
+
+
+def load_calibration(model_path: str) -> Optional[ConfidenceCalibration]:
+    """The model's confidence calibration, or None when there is none (raw confidences are reported)"""
+    if os.getenv("CALIBRATED_CONFIDENCE", "1").lower() in ("0", "false", "no"):
+        return None
+    path = calibration_path(model_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        calibration = ConfidenceCalibration.load(path)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"⚠️  Ignoring confidence calibration {path}: {e}")
+        return None
+    print(f"✅ Confidence calibration loaded: {len(calibration.calibrators)} calibrators")
+    return calibration
+
+
+def calibration_error(confidences: np.ndarray, correct: np.ndarray, bins: int = ECE_BINS) -> Dict:
+    """Expected calibration error (equal-width bins) and Brier score"""
+    confidences = np.asarray(confidences, dtype=float)
+    correct = np.asarray(correct, dtype=float)
+    if not len(confidences):
+        return {"ece": 0.0, "brier": 0.0}
+    bin_index = np.minimum((confidences * bins).astype(int), bins - 1)
+    gaps = np.abs(np.bincount(bin_index, weights=confidences - correct, minlength=bins))
+    return {"ece": round(float(gaps.sum() / len(confidences)), 4),
+            "brier": round(float(np.mean((confidences - correct) ** 2)), 4)}
+
+
+def main():
+    import argparse
+    import itertools
+
+    from cuad_evaluation import ANALYZER_CATEGORIES, evaluate_analyzer, iter_cuad_examples
+    from enhanced_analyzer import EnhancedCUADAnalyzer
+
+    parser = argparse.ArgumentParser(description="Fit per-category confidence calibrators on a CUAD evaluation set")
+    parser.add_argument("--dataset", required=True, help="CUAD evaluation set (SQuAD v2 .json or .jsonl)")
+    parser.add_argument("--model-path", default="./")
+    parser.add_argument("--limit", type=int, help="Fit on the first N questions only")
+    parser.add_argument("--method", choices=METHODS, default="auto",
+                        help=f"auto: isotonic from {MIN_ISOTONIC_SAMPLES} answers per category, temperature below")
+    parser.add_argument("--min-samples", type=int, default=MIN_SAMPLES,
+                        help="Answers a category needs for its own calibrator")
+    parser.add_argument("--holdout", type=float, default=0.3, help="Share of questions held out to report the error")
+    parser.add_argument("--output", help=f"Calibration file (default: {CALIBRATION_FILENAME} in the model directory)")
+    args = parser.parse_args()
+
+    analyzer = EnhancedCUADAnalyzer(args.model_path, enable_groq_enhancement=False)
+    examples = iter_cuad_examples(args.dataset, sorted(ANALYZER_CATEGORIES))
+    examples = list(itertools.islice(examples, args.limit) if args.limit else examples)
+    records = []
+    evaluate_analyzer(analyzer, examples, records=records)
+
+    categories = np.array([record["category"] for record in records])
+    confidences = np.array([record["confidence"] for record in records])
+    correct = np.array([record["correct"] for record in records], dtype=float)
+
+    # Error before and after calibration on held-out questions, then the final fit on all of them
+    held_out = np.random.default_rng(0).random(len(records)) < args.holdout
+    fitted = ConfidenceCalibration.fit(categories[~held_out], confidences[~held_out], correct[~held_out],
+                                       args.method, args.min_samples)
+    held_categories, held_confidences, held_correct = categories[held_out], confidences[held_out], correct[held_out]
+    calibrated = fitted.apply(held_categories, held_confidences)
+    report = {}
+    for category in [FALLBACK] + sorted(set(categories.tolist())):
+        mask = np.ones(len(held_categories), dtype=bool) if category == FALLBACK else held_categories == category
+        report[category] = {
+            "answers": len(records) if category == FALLBACK else int((categories == category).sum()),
+            "held_out": int(mask.sum()),
+            "accuracy": round(float(held_correct[mask].mean()), 4) if mask.any() else None,
+            "raw": calibration_error(held_confidences[mask], held_correct[mask]),
+            "calibrated": calibration_error(calibrated[mask], held_correct[mask])
+        }
+
+    calibration = ConfidenceCalibration.fit(categories, confidences, correct, args.method, args.min_samples)
+    calibration.meta = {
+        "built_at": datetime.now().isoformat(),
+        "dataset": args.dataset,
+        "answers": len(records),
+        "method": args.method,
+        "holdout": args.holdout,
+        "report": report
+    }
+    output = args.output or calibration_path(args.model_path)
+    calibration.save(output)
+
+    methods = calibration.methods()
+    print(f"\n{'Category':25s} {'N':>5s} {'method':>12s} {'accuracy':>9s} {'ECE raw':>8s} {'ECE cal':>8s} "
+          f"{'Brier raw':>10s} {'Brier cal':>10s}")
+    for category, row in report.items():
+        accuracy = "-" if row["accuracy"] is None else f"{row['accuracy']:.1%}"
+        name = "all categories" if category == FALLBACK else category
+        method = methods.get(category, "fallback" if FALLBACK in methods else "none")
+        print(f"{name:25s} {row['answers']:5d} {method:>12s} "
+              f"{accuracy:>9s} {row['raw']['ece']:8.4f} {row['calibrated']['ece']:8.4f} "
+              f"{row['raw']['brier']:10.4f} {row['calibrated']['brier']:10.4f}")
+    print(f"\nCalibration written to {output}")
+
+
+if __name__ == "__main__":
+    structured_logging.quiet_offline_run()
+    main()
@@ -0,0 +1,315 @@
+"""
+Clause Segmentation Engine
+==========================
+Parses a contract once into a compact tree of clauses (headers, numbering and
+all-caps headings) with character offsets, plus sentence segments that never
+cross a clause boundary. Documents are cached, so QA, risk scoring, comparison
+and highlighting all share the same parse instead of re-splitting the text.
+"""
+import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from metrics import record_cache
+
+# "1.", "2.1", "3)", "ARTICLE IV", "Section 5.2" at the start of a line
+NUMBERED_RE = re.compile(
+    r'^(?:(?P<label>article|section)\s+(?P<labelled>[ivxlcdm]+|\d{1,3}(?:\.\d{1,3})*)\.?'
+    r'|(?P<number>\d{1,3}(?:\.\d{1,3})*\.?\)?))'
+    r'(?:\s+|$)(?P<rest>.*)$',
+    re.IGNORECASE
+)
+# "GOVERNING LAW: This agreement is governed by ..."
+INLINE_HEADING_RE = re.compile(r"^(?P<heading>[A-Z][A-Z0-9 &/,'()\-]{2,}):\s*")
+MARKDOWN_HEADING_RE = re.compile(r'^(?P<hashes>#{1,6})\s+')
+SEGMENT_RE = re.compile(r'[^.!?]*[.!?]*')
+LINE_RE = re.compile(r'[^\n]*\n?')
+
+MAX_HEADING_LENGTH = 100
+
+
+class Clause:
+    """One node of the clause tree; offsets index into the document text"""
+    __slots__ = ("number", "heading", "title", "level", "start", "body_start", "end", "children", "parent")
+
+    def __init__(self, number: Optional[str], heading: Optional[str], title: Optional[str],
+                 level: int, start: int, body_start: int):
+        self.number = number
+        self.heading = heading
+        self.title = title
+        self.level = level
+        self.start = start
+        self.body_start = body_start
+        self.end = start
+        self.children = []
+        self.parent = None
+
+    def own_end(self) -> int:
+        """End of the text that belongs to this clause and not to its children"""
+        return self.children[0].start if self.children else self.end
+
+    def to_dict(self) -> Dict:
+        """JSON-friendly representation of the clause subtree"""
+        return {
+            "number": self.number,
+            "heading": self.heading,
+            "title": self.title,
+            "level": self.level,
+            "start": self.start,
+            "body_start": self.body_start,
+            "end": self.end,
+            "children": [child.to_dict() for child in self.children]
+        }
+
+
+class ContractDocument:
+    """Structured view of a contract: clause tree plus sentence segments"""
+
+    def __init__(self, text: str, clauses: List[Clause]):
+        self.text = text
+        self.clauses = clauses
+        self._flat = list(self._walk(clauses))
+        self._flat_starts = [clause.start for clause in self._flat]
+        self.segment_starts, self._segments = self._build_segments()
+        self._sentences = None
+        self.cache = {}  # per-document memo for downstream consumers (e.g. risk term scans)
+
+    @staticmethod
+    def _walk(clauses: List[Clause]) -> Iterator[Clause]:
+        for clause in clauses:
+            yield clause
+            yield from ContractDocument._walk(clause.children)
+
+    def _build_segments(self) -> Tuple[List[int], List[str]]:
+        """Sentence segments that concatenate back to the text exactly.
+
+        Segments are cut at sentence punctuation and additionally at every
+        clause start and heading end, so a heading never fuses with the body.
+        """
+        boundaries = {0, len(self.text)}
+        for clause in self._flat:
+            boundaries.add(clause.start)
+            boundaries.add(clause.body_start)
+        boundaries = sorted(boundaries)
+
+        starts = []
+        segments = []
+        for region_start, region_end in zip(boundaries, boundaries[1:]):
+            offset = region_start
+            for segment in SEGMENT_RE.findall(self.text, region_start, region_end):
+                if segment:
+                    starts.append(offset)
+                    segments.append(segment)
+                    offset += len(segment)
+        return starts, segments
+
+    def iter_clauses(self) -> Iterator[Clause]:
+        """All clauses in document order (pre-order walk of the tree)"""
+        return iter(self._flat)
+
+    def headings(self) -> List[str]:
+        """Titles of all headed clauses in document order"""
+        return [clause.title for clause in self._flat if clause.title]
+
+    def clause_text(self, clause: Clause) -> str:
+        return self.text[clause.start:clause.end]
+
+    def clause_body(self, clause: Clause) -> str:
+        """Clause text without its heading, children included"""
+        return self.text[clause.body_start:clause.end]
+
+    def clause_at(self, offset: int) -> Optional[Clause]:
+        """Deepest clause containing a character offset"""
+        index = bisect_right(self._flat_starts, offset) - 1
+        clause = self._flat[index] if index >= 0 else None
+        while clause is not None and not (clause.start <= offset < clause.end):
+            clause = clause.parent
+        return clause
+
+    def segment_texts(self) -> List[str]:
+        return self._segments
+
+    def sentences(self) -> List[str]:
+        """Sentence text of each segment, as used for QA context extraction"""
+        if self._sentences is None:
+            self._sentences = [segment.rstrip('.!?').strip() for segment in self._segments]
+        return self._sentences
+
+    def segment_span(self, index: int) -> Tuple[int, int]:
+        start = self.segment_starts[index]
+        return start, start + len(self._segments[index])
+
+    def find_terms(self, terms: List[str]) -> List[Tuple[int, int, str]]:
+        """Non-overlapping (start, end, term) matches, earliest and longest first"""
+        matches = []
+        for term in filter(None, terms):
+            position = self.text.find(term)
+            while position != -1:
+                matches.append((position, position + len(term), term))
+                position = self.text.find(term, position + 1)
+        matches.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+
+        selected = []
+        last_end = -1
+        for start, end, term in matches:
+            if start >= last_end:
+                selected.append((start, end, term))
+                last_end = end
+        return selected
+
+    def render_with_markers(self) -> str:
+        """Whitespace-normalized text with a "[HEADING]:" marker per headed clause"""
+        parts = []
+        for clause in self._flat:
+            body = ' '.join(self.text[clause.body_start:clause.own_end()].split())
+            if clause.heading:
+                parts.append(f"\n[{clause.heading.upper()}]: {body}".rstrip())
+            elif clause.number and clause.start != clause.body_start:
+                parts.append(f"{clause.number} {body}".rstrip())
+            elif body:
+                parts.append(body)
+        return ' '.join(parts).strip()
+
+    def to_dict(self) -> Dict:
+        return {
+            "length": len(self.text),
+            "clauses": [clause.to_dict() for clause in self.clauses],
+            "segment_count": len(self._segments)
+        }
+
+
+class ClauseSegmenter:
+    def __init__(self, max_documents: int = 128):
+        """Clause segmenter with an LRU cache of parsed documents"""
+        self.max_documents = max_documents
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def segment(self, text: str) -> ContractDocument:
+        """Return the (cached) structured document for a contract text"""
+        with self._lock:
+            document = self._documents.get(text)
+            if document is not None:
+                self._documents.move_to_end(text)
+        record_cache("clause_segments", document is not None)
+        if document is not None:
+            return document
+
+        document = ContractDocument(text, self.parse_clauses(text))
+
+        with self._lock:
+            self._documents[text] = document
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+        return document
+
+    def parse_clauses(self, text: str) -> List[Clause]:
+        """Build the clause tree from heading lines"""
+        roots = []
+        stack = []
+        offset = 0
+
+        for line in LINE_RE.findall(text):
+            if not line:
+                break
+            clause = self._parse_heading_line(line, offset)
+            offset += len(line)
+            if clause is None:
+                continue
+
+            while stack and stack[-1].level >= clause.level:
+                stack.pop().end = clause.start
+            if stack:
+                clause.parent = stack[-1]
+                stack[-1].children.append(clause)
+            else:
+                roots.append(clause)
+            stack.append(clause)
+
+        for open_clause in stack:
+            open_clause.end = len(text)
+        self._close_ends(roots, len(text))
+
+        first_start = roots[0].start if roots else len(text)
+        if text[:first_start].strip():
+            preamble = Clause(None, None, None, 1, 0, 0)
+            preamble.end = first_start
+            roots.insert(0, preamble)
+        return roots
+
+    def _close_ends(self, clauses: List[Clause], parent_end: int):
+        """Make sure every clause ends no later than its parent"""
+        for clause in clauses:
+            clause.end = min(max(clause.end, clause.start), parent_end)
+            self._close_ends(clause.children, clause.end)
+
+    def _parse_heading_line(self, line: str, offset: int) -> Optional[Clause]:
+        """Return a Clause if the line starts one, otherwise None"""
+        stripped = line.strip()
+        if not stripped:
+            return None
+        start = offset + (len(line) - len(line.lstrip()))
+        line_body_start = offset + len(line)
+
+        level = None
+        markdown = MARKDOWN_HEADING_RE.match(stripped)
+        if markdown:
+            level = len(markdown.group('hashes'))
+            stripped = stripped[markdown.end():]
+
+        bold = stripped.startswith('**') and stripped.rstrip(':').endswith('**') and len(stripped) > 4
+        candidate = stripped.replace('**', '').strip()
+
+        number = None
+        rest = candidate
+        numbered = NUMBERED_RE.match(candidate)
+        if numbered:
+            number = (numbered.group('labelled') or numbered.group('number')).rstrip('.)')
+            label = numbered.group('label')
+            has_separator = (label is not None or '.' in numbered.group('number') or
+                             numbered.group('number').endswith(')'))
+            if has_separator:
+                rest = numbered.group('rest').strip()
+                if label and label.lower() == 'article':
+                    level = level or 1
+                else:
+                    level = level or number.count('.') + 1
+            else:
+                number = None
+
+        heading = None
+        title = None
+        body_start = line_body_start
+        rest_offset = offset + len(line.rstrip()) - len(rest) if rest and line.rstrip().endswith(rest) else line_body_start
+        inline = INLINE_HEADING_RE.match(rest)
+        if bold or markdown or (rest and len(rest) <= MAX_HEADING_LENGTH and rest.isupper()):
+            heading = rest.rstrip(':').strip() or None
+            title = candidate.rstrip(':').strip()
+        elif inline:
+            heading = inline.group('heading').strip()
+            title = f"{number}. {heading}" if number else heading
+            body_start = rest_offset + inline.end()
+        elif number and rest and len(rest) <= 60 and rest[-1] not in '.;,' and rest[0].isupper():
+            heading = rest.rstrip(':').strip()
+            title = candidate.rstrip(':').strip()
+        elif numbered and numbered.group('label') and not rest:
+            heading = title = candidate.rstrip(':').strip()
+        elif number and rest:
+            # Numbered body paragraph: the clause text starts right after the numbering
+            body_start = rest_offset
+
+        if number is None and heading is None:
+            return None
+
+        return Clause(number, heading, title, level or 1, start, body_start)
+
+
+# Global instance shared by the analyzer, comparison and highlighting code
+clause_segmenter = ClauseSegmenter()
+
+
+def segment_contract(text: str) -> ContractDocument:
+    """Parse (or fetch from cache) the structured model of a contract"""
+    return clause_segmenter.segment(text)
@@ -0,0 +1,296 @@
+"""
+Clause-Level Contract Comparison
+================================
+Aligns the clauses of two contracts using content hashes plus token
+similarity and reports per-clause differences with character offsets.
+A clause library index makes it cheap to compare one contract against
+hundreds of templates without analyzing every template pair.
+"""
+import difflib
+import hashlib
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from clause_segmenter import ContractDocument, segment_contract
+
+TOKEN_RE = re.compile(r"[a-z0-9$%]+")
+
+# Minimum token Jaccard similarity for two clauses to count as the same clause
+MATCH_THRESHOLD = 0.35
+# Extra similarity credit when two clauses share the same heading
+HEADING_BONUS = 0.2
+# Tokens present in more than this share of clauses are too common to index
+COMMON_TOKEN_RATIO = 0.5
+
+
+class ClauseUnit:
+    """Comparable unit: one clause's own text (heading plus body, children excluded)"""
+    __slots__ = ("index", "title", "heading_key", "start", "end", "text", "tokens", "token_set", "digest")
+
+    def __init__(self, index: int, title: Optional[str], heading: Optional[str], start: int, end: int, text: str):
+        self.index = index
+        self.title = title
+        self.heading_key = ' '.join(TOKEN_RE.findall(heading.lower())) if heading else None
+        self.start = start
+        self.end = end
+        self.text = text
+        self.tokens = TOKEN_RE.findall(text.lower())
+        self.token_set = frozenset(self.tokens)
+        self.digest = hashlib.blake2b(' '.join(self.tokens).encode('utf-8'), digest_size=8).hexdigest()
+
+    def location(self) -> Dict:
+        return {"title": self.title, "start": self.start, "end": self.end}
+
+
+def clause_units(document: ContractDocument) -> List[ClauseUnit]:
+    """Comparable units of a segmented document (memoized on the document)"""
+    units = document.cache.get("clause_units")
+    if units is not None:
+        return units
+
+    units = []
+    for clause in document.iter_clauses():
+        own_end = clause.own_end()
+        body = document.text[clause.body_start:own_end].strip()
+        if not body and clause.children:
+            continue  # pure container heading, its children are compared instead
+        text = f"{clause.heading or ''} {body}".strip()
+        if not text:
+            continue
+        units.append(ClauseUnit(len(units), clause.title, clause.heading, clause.start, own_end, text))
+
+    document.cache["clause_units"] = units
+    return units
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def pair_similarity(unit_a: ClauseUnit, unit_b: ClauseUnit) -> float:
+    similarity = jaccard(unit_a.token_set, unit_b.token_set)
+    if unit_a.heading_key and unit_a.heading_key == unit_b.heading_key:
+        similarity += HEADING_BONUS
+    return similarity
+
+
+def align_clauses(units_a: List[ClauseUnit], units_b: List[ClauseUnit]) -> List[Tuple[Optional[ClauseUnit], Optional[ClauseUnit], float]]:
+    """Align clauses of two documents.
+
+    Identical clauses are paired by hash first; the rest are paired greedily by
+    similarity, with candidates drawn from an inverted token index so clauses
+    that share no informative token are never scored.
+    """
+    pairs = []
+    matched_a = set()
+    matched_b = set()
+
+    # 1. Exact matches by content hash, in document order
+    by_digest = defaultdict(list)
+    for unit in units_b:
+        by_digest[unit.digest].append(unit)
+    for unit in units_a:
+        candidates = by_digest.get(unit.digest)
+        if candidates:
+            match = candidates.pop(0)
+            pairs.append((unit, match, 1.0))
+            matched_a.add(unit.index)
+            matched_b.add(match.index)
+
+    remaining_a = [unit for unit in units_a if unit.index not in matched_a]
+    remaining_b = [unit for unit in units_b if unit.index not in matched_b]
+
+    # 2. Similarity matches among the rest
+    postings = defaultdict(list)
+    by_heading = defaultdict(list)
+    for unit in remaining_b:
+        for token in unit.token_set:
+            postings[token].append(unit)
+        if unit.heading_key:
+            by_heading[unit.heading_key].append(unit)
+    common_limit = max(2, int(len(remaining_b) * COMMON_TOKEN_RATIO))
+
+    scored = []
+    for unit in remaining_a:
+        candidates = {}
+        for token in unit.token_set:
+            posting = postings.get(token)
+            if posting and len(posting) <= common_limit:
+                for candidate in posting:
+                    candidates[candidate.index] = candidate
+        for candidate in by_heading.get(unit.heading_key, ()):
+            candidates[candidate.index] = candidate
+        for candidate in candidates.values():
+            similarity = pair_similarity(unit, candidate)
+            if similarity >= MATCH_THRESHOLD:
+                scored.append((similarity, unit.index, candidate.index, unit, candidate))
+
+    scored.sort(key=lambda item: (-item[0], item[1], item[2]))
+    for similarity, _, _, unit, candidate in scored:
+        if unit.index in matched_a or candidate.index in matched_b:
+            continue
+        pairs.append((unit, candidate, jaccard(unit.token_set, candidate.token_set)))
+        matched_a.add(unit.index)
+        matched_b.add(candidate.index)
+
+    # 3. Unmatched clauses were removed from A or added in B
+    pairs.extend((unit, None, 0.0) for unit in units_a if unit.index not in matched_a)
+    pairs.extend((None, unit, 0.0) for unit in units_b if unit.index not in matched_b)
+
+    pairs.sort(key=lambda pair: (pair[0].start if pair[0] else float('inf'), pair[1].start if pair[1] else 0))
+    return pairs
+
+
+def word_changes(unit_a: ClauseUnit, unit_b: ClauseUnit, limit: int = 10) -> List[Dict]:
+    """Word-level edits turning clause A into clause B"""
+    words_a = unit_a.text.split()
+    words_b = unit_b.text.split()
+    changes = []
+    matcher = difflib.SequenceMatcher(None, words_a, words_b, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        changes.append({
+            "type": tag,
+            "removed": ' '.join(words_a[i1:i2]),
+            "added": ' '.join(words_b[j1:j2])
+        })
+        if len(changes) >= limit:
+            break
+    return changes
+
+
+def compare_documents(text_a: str, text_b: str) -> Dict:
+    """Clause-by-clause comparison of two contract texts"""
+    units_a = clause_units(segment_contract(text_a))
+    units_b = clause_units(segment_contract(text_b))
+
+    clauses = []
+    counts = {"unchanged": 0, "modified": 0, "added": 0, "removed": 0}
+    unchanged_tokens = 0
+    for unit_a, unit_b, similarity in align_clauses(units_a, units_b):
+        if unit_a and unit_b:
+            status = "unchanged" if unit_a.digest == unit_b.digest else "modified"
+        else:
+            status = "removed" if unit_a else "added"
+        counts[status] += 1
+        if status == "unchanged":
+            unchanged_tokens += len(unit_a.tokens)
+
+        entry = {
+            "status": status,
+            "contract_1": unit_a.location() if unit_a else None,
+            "contract_2": unit_b.location() if unit_b else None,
+            "similarity": round(similarity, 3)
+        }
+        if status == "modified":
+            entry["changes"] = word_changes(unit_a, unit_b)
+        clauses.append(entry)
+
+    total_tokens = sum(len(unit.tokens) for unit in units_a) or 1
+
+    return {
+        "clauses": clauses,
+        "summary": {
+            **counts,
+            "clauses_contract_1": len(units_a),
+            "clauses_contract_2": len(units_b),
+            "unchanged_ratio": round(unchanged_tokens / total_tokens, 3)
+        }
+    }
+
+
+class ClauseLibraryIndex:
+    def __init__(self):
+        """Index of template contracts for fast one-against-many comparison"""
+        self.templates = {}
+        self._digests = defaultdict(set)   # clause digest -> template names
+        self._postings = defaultdict(set)  # token -> {(template name, unit index)}
+        self._lock = threading.Lock()
+
+    def add_template(self, name: str, text: str) -> Dict:
+        """Add (or replace) a template in the library"""
+        units = clause_units(segment_contract(text))
+        with self._lock:
+            if name in self.templates:
+                self._remove(name)
+            self.templates[name] = {"text": text, "units": units}
+            for unit in units:
+                self._digests[unit.digest].add(name)
+                for token in unit.token_set:
+                    self._postings[token].add((name, unit.index))
+        return {"name": name, "clauses": len(units)}
+
+    def remove_template(self, name: str):
+        with self._lock:
+            self._remove(name)
+
+    def _remove(self, name: str):
+        template = self.templates.pop(name, None)
+        if template is None:
+            return
+        for unit in template["units"]:
+            self._digests[unit.digest].discard(name)
+            for token in unit.token_set:
+                self._postings[token].discard((name, unit.index))
+
+    def find_closest(self, contract_text: str, top_k: int = 5, max_postings: Optional[int] = None) -> List[Dict]:
+        """Rank templates by how much of the contract's clause text they cover.
+
+        Each query clause credits a template with its best clause similarity,
+        weighted by clause length. Candidates come from the hash and token
+        indexes, so templates sharing nothing with the contract are never touched.
+        """
+        units = clause_units(segment_contract(contract_text))
+        total_weight = sum(len(unit.tokens) for unit in units) or 1
+
+        with self._lock:
+            template_count = len(self.templates)
+            common_limit = max_postings or max(4, template_count * 4)
+            coverage = defaultdict(float)
+            exact_matches = defaultdict(int)
+
+            for unit in units:
+                weight = len(unit.tokens)
+                best = {}
+                for name in self._digests.get(unit.digest, ()):
+                    best[name] = 1.0
+                    exact_matches[name] += 1
+
+                candidates = set()
+                for token in unit.token_set:
+                    posting = self._postings.get(token)
+                    if posting and len(posting) <= common_limit:
+                        candidates.update(posting)
+                for name, index in candidates:
+                    if best.get(name) == 1.0:
+                        continue
+                    similarity = jaccard(unit.token_set, self.templates[name]["units"][index].token_set)
+                    if similarity > best.get(name, 0.0):
+                        best[name] = similarity
+
+                for name, similarity in best.items():
+                    if similarity >= MATCH_THRESHOLD:
+                        coverage[name] += similarity * weight
+
+        ranked = sorted(coverage.items(), key=lambda item: -item[1])[:top_k]
+        return [{
+            "template": name,
+            "coverage": round(score / total_weight, 3),
+            "identical_clauses": exact_matches.get(name, 0)
+        } for name, score in ranked]
+
+    def compare_to_library(self, contract_text: str, top_k: int = 3) -> Dict:
+        """Find the closest templates and diff the contract against each of them"""
+        matches = self.find_closest(contract_text, top_k=top_k)
+        for match in matches:
+            template_text = self.templates[match["template"]]["text"]
+            match["comparison"] = compare_documents(template_text, contract_text)
+        return {
+            "templates_indexed": len(self.templates),
+            "matches": matches
+        }
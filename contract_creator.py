@@ -8,14 +8,19 @@ import os
 import requests
 from datetime import datetime, timedelta
 from typing import Dict, Optional
+from clause_segmenter import segment_contract
+from metrics import GROQ_CALLS, time_stage
+from tracing import span, traced
 
 class ContractCreator:
     def __init__(self, api_key: Optional[str] = None):
         """Initialize contract creator with Groq API"""
         self.api_key = api_key or os.getenv('GROQ_API_KEY_CREATION') or os.getenv('GROQ_API_KEY')
-        self.base_url = "https://api.groq.com/openai/v1/chat/completions"
+        # GROQ_BASE_URL points at a local stub for load tests
+        self.base_url = os.getenv('GROQ_BASE_URL', "https://api.groq.com/openai/v1/chat/completions")
         self.available = bool(self.api_key)
     
+    @traced("contract_creator.create_contract")
     def create_contract(self, contract_params: Dict) -> Dict:
         """Create a professional contract using RoBERTa analysis + Groq generation"""
         
@@ -104,7 +109,14 @@ class ContractCreator:
                     }
                     
                     print(f"🤖 Generating contract with model: {model}")
-                    response = requests.post(self.base_url, headers=headers, json=payload, timeout=60)
+                    try:
+                        with span("groq.request", model=model) as request_span, time_stage("groq_call"):
+                            response = requests.post(self.base_url, headers=headers, json=payload, timeout=60)
+                            request_span.set(status=response.status_code)
+                    except requests.exceptions.Timeout:
+                        GROQ_CALLS.inc(caller="create_contract", model=model, outcome="timeout")
+                        raise
+                    GROQ_CALLS.inc(caller="create_contract", model=model, outcome=str(response.status_code))
                     
                     if response.status_code == 200:
                         result = response.json()
@@ -147,18 +159,8 @@ class ContractCreator:
     
     def _extract_sections(self, contract_text: str) -> list:
         """Extract main sections from the generated contract"""
-        sections = []
-        lines = contract_text.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            # Look for section headers (usually numbered or all caps)
-            if (line.isupper() and len(line) > 3) or \
-               (line.startswith(tuple('123456789')) and '.' in line[:5]) or \
-               line.startswith('**') and line.endswith('**'):
-                sections.append(line.replace('**', '').strip())
-        
-        return sections[:10]  # Return first 10 sections found
+        # Headers, numbering and all-caps headings come from the shared clause tree
+        return segment_contract(contract_text).headings()[:10]  # Return first 10 sections found
     
     def analyze_contract_risks(self, contract_text: str) -> Dict:
         """Use RoBERTa model to analyze risks in the generated contract"""
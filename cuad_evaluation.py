@@ -0,0 +1,652 @@
+"""
+CUAD Evaluation Engine
+======================
+Accuracy and speed of YOUR fine-tuned model on a CUAD (SQuAD v2 format)
+dataset in one run, so a performance change can be checked for accuracy
+regressions at the same time:
+
+- streams examples from the dataset file (SQuAD JSON or JSON lines)
+- runs batched inference over sliding windows of each contract
+- vectorized span search over every window of a batch at once
+- SQuAD exact match / F1, AUPR and precision at 80% recall, per CUAD
+  category and overall (all in percent)
+- throughput, per-batch latency and peak memory
+
+evaluate_analyzer() scores the analysis pipeline itself (question templates,
+context selection, beam search) on the CUAD categories it covers.
+
+    python cuad_evaluation.py --dataset CUAD_v1/test.json --output eval.json
+    python cuad_evaluation.py --dataset CUAD_v1/test.json --limit 500 --compare eval.json
+
+Existing prediction files can be scored without running the model:
+
+    python cuad_evaluation.py --dataset CUAD_v1/test.json --nbest nbest_predictions_.json
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import string
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from benchmark_pipeline import (MODEL_SIZES, PeakMemorySampler, build_random_model, git_commit,
+                                has_fine_tuned_model, summarize)
+import structured_logging
+
+OVERALL = "overall"
+RECALL_TARGET = 0.8
+JACCARD_THRESHOLD = 0.5
+PUNCTUATION = set(string.punctuation)
+
+
+# Dataset streaming
+
+def _squad_examples(article: Dict) -> Iterator[Dict]:
+    title = article.get("title", "")
+    for paragraph in article["paragraphs"]:
+        context = paragraph["context"]
+        for qa in paragraph["qas"]:
+            yield {
+                "id": qa["id"],
+                "title": title,
+                "category": qa.get("category") or category_of(qa["id"]),
+                "question": qa["question"],
+                "context": context,
+                "answers": [answer["text"] for answer in qa.get("answers", [])]
+            }
+
+
+def category_of(question_id: str) -> str:
+    """CUAD question ids are '<contract title>__<category>'"""
+    return question_id.rsplit("__", 1)[1] if "__" in question_id else "unknown"
+
+
+def iter_cuad_examples(path: str, categories: Optional[List[str]] = None) -> Iterator[Dict]:
+    """Yield one question at a time from a CUAD dataset.
+
+    .jsonl files are read line by line (each line a SQuAD article or a flat
+    {id, question, context, answers} record); SQuAD .json files are parsed
+    once and then yielded question by question.
+    """
+    wanted = set(categories) if categories else None
+
+    def records():
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from json.load(f)["data"]
+
+    for record in records():
+        if "paragraphs" in record:
+            examples = _squad_examples(record)
+        else:
+            examples = [{
+                "id": record["id"],
+                "title": record.get("title", ""),
+                "category": record.get("category") or category_of(record["id"]),
+                "question": record["question"],
+                "context": record["context"],
+                "answers": [answer["text"] if isinstance(answer, dict) else answer
+                            for answer in record.get("answers", [])]
+            }]
+        for example in examples:
+            if wanted is None or example["category"] in wanted:
+                yield example
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Scoring
+
+def normalize_answer(text: str) -> str:
+    """SQuAD normalization: lower case, no punctuation, articles or extra whitespace"""
+    text = "".join(character for character in text.lower() if character not in PUNCTUATION)
+    text = re.sub(r"\b(a|an|the)\b", " ", text)
+    return " ".join(text.split())
+
+
+def exact_match(prediction: str, gold: str) -> float:
+    return float(normalize_answer(prediction) == normalize_answer(gold))
+
+
+def token_f1(prediction: str, gold: str) -> float:
+    predicted, expected = normalize_answer(prediction).split(), normalize_answer(gold).split()
+    if not predicted or not expected:
+        return float(predicted == expected)
+    common = sum((Counter(predicted) & Counter(expected)).values())
+    if not common:
+        return 0.0
+    precision, recall = common / len(predicted), common / len(expected)
+    return 2 * precision * recall / (precision + recall)
+
+
+def jaccard(prediction: str, gold: str) -> float:
+    """Word-set overlap used by the CUAD benchmark to decide whether a span matches a clause"""
+    def words(text):
+        for character in ".,;:":
+            text = text.replace(character, "")
+        return set(text.lower().split())
+
+    predicted, expected = words(prediction), words(gold)
+    union = predicted | expected
+    return len(predicted & expected) / len(union) if union else 0.0
+
+
+def spans_match(prediction: str, gold: str, category: str) -> bool:
+    if jaccard(prediction, gold) >= JACCARD_THRESHOLD:
+        return True
+    # As in CUAD, a predicted span containing a party name counts for Parties
+    return category == "Parties" and gold.lower() in prediction.lower()
+
+
+def precision_recall_curve(matched_probabilities: np.ndarray, false_probabilities: np.ndarray, total_gold: int):
+    """Precision and recall at every confidence threshold, recall ascending.
+
+    matched_probabilities holds, per gold clause, the highest probability of a
+    candidate span matching it; false_probabilities holds candidates matching
+    no gold clause. A candidate is predicted when its probability >= threshold.
+    """
+    thresholds = np.unique(np.concatenate([matched_probabilities, false_probabilities]))[::-1]
+    if not len(thresholds) or not total_gold:
+        return np.zeros(0), np.zeros(0)
+    matched, false = np.sort(matched_probabilities), np.sort(false_probabilities)
+    true_positives = len(matched) - np.searchsorted(matched, thresholds, side="left")
+    false_positives = len(false) - np.searchsorted(false, thresholds, side="left")
+    precision = true_positives / np.maximum(true_positives + false_positives, 1)
+    recall = true_positives / total_gold
+    return precision, recall
+
+
+def aupr(precision: np.ndarray, recall: np.ndarray) -> float:
+    """Area under the interpolated precision-recall curve (precision = best at any higher recall)"""
+    if not len(precision):
+        return 0.0
+    interpolated = np.maximum.accumulate(precision[::-1])[::-1]
+    recall = np.concatenate([[0.0], recall])
+    interpolated = np.concatenate([[interpolated[0]], interpolated])
+    return float(np.sum(np.diff(recall) * (interpolated[1:] + interpolated[:-1]) / 2))
+
+
+def precision_at_recall(precision: np.ndarray, recall: np.ndarray, target: float = RECALL_TARGET) -> float:
+    reached = recall >= target
+    return float(precision[reached].max()) if reached.any() else 0.0
+
+
+class ScoreAccumulator:
+    """Collects per-question results as they stream in; report() computes the metrics"""
+
+    def __init__(self):
+        self.exact = defaultdict(list)
+        self.f1 = defaultdict(list)
+        self.has_answer = defaultdict(list)
+        self.matched = defaultdict(list)
+        self.false = defaultdict(list)
+        self.gold_count = Counter()
+
+    def add(self, category: str, answers: List[str], prediction: str, nbest: List[Dict]):
+        golds = answers or [""]
+        self.exact[category].append(max(exact_match(prediction, gold) for gold in golds))
+        self.f1[category].append(max(token_f1(prediction, gold) for gold in golds))
+        self.has_answer[category].append(bool(answers))
+
+        candidates = [candidate for candidate in nbest if candidate["text"].strip()]
+        self.gold_count[category] += len(answers)
+        matched_candidates = set()
+        for gold in answers:
+            matches = [index for index, candidate in enumerate(candidates)
+                       if spans_match(candidate["text"], gold, category)]
+            matched_candidates.update(matches)
+            if matches:
+                self.matched[category].append(max(candidates[index]["probability"] for index in matches))
+        self.false[category].extend(candidate["probability"] for index, candidate in enumerate(candidates)
+                                    if index not in matched_candidates)
+
+    def _metrics(self, categories: List[str]) -> Dict:
+        exact = np.array([value for category in categories for value in self.exact[category]])
+        f1 = np.array([value for category in categories for value in self.f1[category]])
+        has_answer = np.array([value for category in categories for value in self.has_answer[category]], dtype=bool)
+        precision, recall = precision_recall_curve(
+            np.array([value for category in categories for value in self.matched[category]]),
+            np.array([value for category in categories for value in self.false[category]]),
+            sum(self.gold_count[category] for category in categories))
+        return {
+            "questions": int(len(exact)),
+            "with_answer": int(has_answer.sum()),
+            "exact": round(100 * float(exact.mean()), 2) if len(exact) else 0.0,
+            "f1": round(100 * float(f1.mean()), 2) if len(f1) else 0.0,
+            "has_answer_f1": round(100 * float(f1[has_answer].mean()), 2) if has_answer.any() else None,
+            "no_answer_f1": round(100 * float(f1[~has_answer].mean()), 2) if (~has_answer).any() else None,
+            "aupr": round(100 * aupr(precision, recall), 2),
+            "precision_at_80_recall": round(100 * precision_at_recall(precision, recall), 2)
+        }
+
+    def report(self) -> Dict:
+        categories = sorted(self.exact)
+        return {
+            OVERALL: self._metrics(categories),
+            "categories": {category: self._metrics([category]) for category in categories}
+        }
+
+
+# Batched inference
+
+def best_spans(start_logits, end_logits, context_mask, n_best: int, max_answer_length: int):
+    """Top n_best (score, start, end) per window plus the no-answer score, for a whole batch.
+
+    Scores every valid (start, end) pair at once: both inside the context and
+    0 <= end - start < max_answer_length.
+    """
+    import torch
+
+    length = start_logits.shape[1]
+    start = start_logits.masked_fill(~context_mask, float("-inf"))
+    end = end_logits.masked_fill(~context_mask, float("-inf"))
+    scores = start.unsqueeze(2) + end.unsqueeze(1)
+    pairs = torch.ones(length, length, dtype=torch.bool, device=scores.device)
+    band = pairs.triu() & ~pairs.triu(max_answer_length)
+    scores = scores.masked_fill(~band, float("-inf"))
+
+    top_scores, flat_index = scores.flatten(1).topk(min(n_best, length * length), dim=1)
+    null_scores = start_logits[:, 0] + end_logits[:, 0]
+    return (top_scores.cpu().numpy(), (flat_index // length).cpu().numpy(), (flat_index % length).cpu().numpy(),
+            null_scores.cpu().numpy())
+
+
+class CUADEvaluationEngine:
+    def __init__(self, model, tokenizer, batch_size: int = 16, max_length: int = 512, doc_stride: int = 128,
+                 max_query_length: int = 64, max_answer_length: int = 256, n_best: int = 20,
+                 null_threshold: float = 0.0, examples_per_chunk: int = 8):
+        """tokenizer must be a fast tokenizer (character offsets are needed to recover answer text)"""
+        self.model = model
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.doc_stride = doc_stride
+        self.max_query_length = max_query_length
+        self.max_answer_length = max_answer_length
+        self.n_best = n_best
+        self.null_threshold = null_threshold
+        self.examples_per_chunk = examples_per_chunk
+        self.timings = defaultdict(list)
+        self.features = 0
+
+    @classmethod
+    def from_pretrained(cls, model_path: str = "./", **options):
+        import torch
+        from transformers import RobertaForQuestionAnswering, RobertaTokenizerFast
+
+        model = RobertaForQuestionAnswering.from_pretrained(model_path)
+        model.eval()
+        if torch.cuda.is_available():
+            model.to("cuda")
+        return cls(model, RobertaTokenizerFast.from_pretrained(model_path), **options)
+
+    def _question(self, question: str) -> str:
+        ids = self.tokenizer(question, add_special_tokens=False)["input_ids"]
+        if len(ids) <= self.max_query_length:
+            return question
+        return self.tokenizer.decode(ids[:self.max_query_length])
+
+    def predict(self, examples: List[Dict]) -> List[List[Dict]]:
+        """n-best answers per example, each {"text", "probability", "start_logit", "end_logit"}"""
+        import torch
+
+        started = time.perf_counter()
+        encoded = self.tokenizer(
+            [self._question(example["question"]) for example in examples],
+            [example["context"] for example in examples],
+            truncation="only_second",
+            max_length=self.max_length,
+            stride=self.doc_stride,
+            return_overflowing_tokens=True,
+            return_offsets_mapping=True
+        )
+        feature_count = len(encoded["input_ids"])
+        context_masks = [[sequence_id == 1 for sequence_id in encoded.sequence_ids(index)]
+                         for index in range(feature_count)]
+        self.timings["tokenization"].append(time.perf_counter() - started)
+        self.features += feature_count
+
+        candidates = [dict() for _ in examples]
+        null_scores = [float("inf")] * len(examples)
+        device = next(self.model.parameters()).device
+        pad_id = self.tokenizer.pad_token_id
+
+        for batch_start in range(0, feature_count, self.batch_size):
+            indices = range(batch_start, min(batch_start + self.batch_size, feature_count))
+            width = max(len(encoded["input_ids"][index]) for index in indices)
+            input_ids = np.full((len(indices), width), pad_id, dtype=np.int64)
+            attention_mask = np.zeros((len(indices), width), dtype=np.int64)
+            context_mask = np.zeros((len(indices), width), dtype=bool)
+            for row, index in enumerate(indices):
+                length = len(encoded["input_ids"][index])
+                input_ids[row, :length] = encoded["input_ids"][index]
+                attention_mask[row, :length] = 1
+                context_mask[row, :length] = context_masks[index]
+
+            started = time.perf_counter()
+            with torch.inference_mode():
+                outputs = self.model(input_ids=torch.from_numpy(input_ids).to(device),
+                                     attention_mask=torch.from_numpy(attention_mask).to(device))
+            self.timings["forward"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            start_logits, end_logits = outputs.start_logits.float(), outputs.end_logits.float()
+            scores, starts, ends, nulls = best_spans(start_logits, end_logits,
+                                                     torch.from_numpy(context_mask).to(device),
+                                                     self.n_best, self.max_answer_length)
+            start_values, end_values = start_logits.cpu().numpy(), end_logits.cpu().numpy()
+            for row, index in enumerate(indices):
+                example_index = encoded["overflow_to_sample_mapping"][index]
+                context = examples[example_index]["context"]
+                offsets = encoded["offset_mapping"][index]
+                null_scores[example_index] = min(null_scores[example_index], float(nulls[row]))
+                found = candidates[example_index]
+                for score, start, end in zip(scores[row], starts[row], ends[row]):
+                    if not np.isfinite(score):
+                        break
+                    text = context[offsets[start][0]:offsets[end][1]]
+                    if text and (text not in found or found[text][0] < score):
+                        found[text] = (float(score), float(start_values[row, start]), float(end_values[row, end]))
+            self.timings["span_search"].append(time.perf_counter() - started)
+
+        return [self._nbest(found, null_score) for found, null_score in zip(candidates, null_scores)]
+
+    def _nbest(self, found: Dict, null_score: float) -> List[Dict]:
+        """Best spans across all windows plus the empty answer, with softmax probabilities"""
+        ranked = sorted(found.items(), key=lambda item: item[1][0], reverse=True)[:self.n_best]
+        entries = [{"text": text, "score": score, "start_logit": start, "end_logit": end}
+                   for text, (score, start, end) in ranked]
+        entries.append({"text": "", "score": null_score, "start_logit": null_score / 2, "end_logit": null_score / 2})
+        scores = np.array([entry["score"] for entry in entries])
+        probabilities = np.exp(scores - scores.max())
+        probabilities /= probabilities.sum()
+        for entry, probability in zip(entries, probabilities):
+            entry["probability"] = float(probability)
+            del entry["score"]
+        return sorted(entries, key=lambda entry: entry["probability"], reverse=True)
+
+    def best_answer(self, nbest: List[Dict]) -> str:
+        """Best non-empty span, or '' when the no-answer score wins by more than null_threshold"""
+        spans = [entry for entry in nbest if entry["text"]]
+        empty = [entry for entry in nbest if not entry["text"]]
+        if not spans:
+            return ""
+        best_score = spans[0]["start_logit"] + spans[0]["end_logit"]
+        null_score = empty[0]["start_logit"] + empty[0]["end_logit"] if empty else float("-inf")
+        return spans[0]["text"] if best_score - null_score > self.null_threshold else ""
+
+    def evaluate(self, examples: Iterable[Dict], predictions: Optional[Dict] = None,
+                 nbest_predictions: Optional[Dict] = None) -> Dict:
+        """Accuracy report plus performance; fills predictions / nbest_predictions dicts when given"""
+        scores = ScoreAccumulator()
+        example_latency = []
+        count = 0
+        self.timings.clear()
+        self.features = 0
+        started = time.perf_counter()
+        with PeakMemorySampler() as memory:
+            for chunk in _chunks(examples, self.examples_per_chunk):
+                chunk_started = time.perf_counter()
+                for example, nbest in zip(chunk, self.predict(chunk)):
+                    answer = self.best_answer(nbest)
+                    scores.add(example["category"], example["answers"], answer, nbest)
+                    if predictions is not None:
+                        predictions[example["id"]] = answer
+                    if nbest_predictions is not None:
+                        nbest_predictions[example["id"]] = nbest
+                # Examples of a chunk finish together; report the amortized time per example
+                example_latency.extend([(time.perf_counter() - chunk_started) / len(chunk)] * len(chunk))
+                count += len(chunk)
+            peak = memory.reset()
+        elapsed = time.perf_counter() - started
+
+        return {
+            **scores.report(),
+            "performance": {
+                "examples": count,
+                "features": self.features,
+                "seconds": round(elapsed, 3),
+                "examples_per_second": round(count / elapsed, 3) if elapsed else 0.0,
+                "features_per_second": round(self.features / elapsed, 3) if elapsed else 0.0,
+                "example_latency": summarize(example_latency),
+                "tokenization": summarize(self.timings["tokenization"]),
+                "forward_batch": summarize(self.timings["forward"]),
+                "span_search_batch": summarize(self.timings["span_search"]),
+                "peak_rss_bytes": peak
+            }
+        }
+
+
+def score_prediction_files(dataset_path: str, nbest_path: str, predictions_path: Optional[str] = None,
+                           categories: Optional[List[str]] = None) -> Dict:
+    """Score saved predictions (predictions_.json / nbest_predictions_.json) against a dataset"""
+    with open(nbest_path, encoding="utf-8") as f:
+        nbest_predictions = json.load(f)
+    predictions = None
+    if predictions_path:
+        with open(predictions_path, encoding="utf-8") as f:
+            predictions = json.load(f)
+
+    scores = ScoreAccumulator()
+    for example in iter_cuad_examples(dataset_path, categories):
+        if example["id"] not in nbest_predictions:
+            continue
+        nbest = nbest_predictions[example["id"]]
+        if predictions is not None:
+            answer = predictions.get(example["id"], "")
+        else:
+            answer = max(nbest, key=lambda entry: entry["probability"])["text"] if nbest else ""
+        scores.add(example["category"], example["answers"], answer, nbest)
+    return scores.report()
+
+
+# Analyzer evaluation
+
+# CUAD categories answered by the analyzer's question templates
+ANALYZER_CATEGORIES = {
+    "Governing Law": "governing_law",
+    "Termination For Convenience": "termination",
+    "Cap On Liability": "liability",
+    "Uncapped Liability": "liability",
+    "Ip Ownership Assignment": "intellectual_property",
+    "License Grant": "intellectual_property",
+    "Minimum Commitment": "payment_terms",
+    "Revenue/Profit Sharing": "payment_terms",
+    "Renewal Term": "subscription_terms"
+}
+
+CONTEXT_MODES = ("keywords", "full")
+
+
+def analyzer_context(analyzer, example: Dict, category: str, context_mode: str = "keywords") -> str:
+    """Context the analyzer would answer the example's question from"""
+    from clause_segmenter import segment_contract
+
+    if context_mode == "full":
+        return example["context"]
+    sentences = segment_contract(example["context"]).sentences()
+    return analyzer.select_relevant_context(sentences, example["context"], category)
+
+
+def evaluate_analyzer(analyzer, examples: Iterable[Dict], context_mode: str = "keywords",
+                      records: Optional[List[Dict]] = None) -> Dict:
+    """Score EnhancedCUADAnalyzer.answer_from_context on the CUAD questions it has templates for.
+
+    context_mode "keywords" selects sentences as the analysis pipeline does;
+    "full" passes the whole contract (truncated by the tokenizer). Per-question
+    outcomes are appended to records when given.
+    """
+    no_answer = analyzer.postprocess_answer("")
+    scores = ScoreAccumulator()
+    latencies = []
+    forwards = []
+    contracts = set()
+    started = time.perf_counter()
+    with PeakMemorySampler() as memory:
+        for example in examples:
+            category = ANALYZER_CATEGORIES.get(example["category"])
+            if category is None:
+                continue
+            example_started = time.perf_counter()
+            result = analyzer.answer_from_context(analyzer_context(analyzer, example, category, context_mode), category)
+            latencies.append(time.perf_counter() - example_started)
+            forwards.append(result["forwards"])
+            contracts.add(example["title"] or example["context"])
+
+            answer = "" if result["answer"] == no_answer else result["answer"]
+            nbest = [{"text": answer, "probability": float(result["confidence"])}] if answer else []
+            scores.add(example["category"], example["answers"], answer, nbest)
+            if records is not None:
+                records.append({
+                    "id": example["id"],
+                    "category": category,
+                    "cuad_category": example["category"],
+                    "answer": answer,
+                    "confidence": float(result["confidence"]),
+                    "question_used": result["question_used"],
+                    "forwards": result["forwards"],
+                    "f1": max(token_f1(answer, gold) for gold in example["answers"] or [""]),
+                    "correct": any(spans_match(answer, gold, example["category"]) for gold in example["answers"])
+                    if answer else not example["answers"]
+                })
+        peak = memory.reset()
+    elapsed = time.perf_counter() - started
+
+    return {
+        **scores.report(),
+        "performance": {
+            "examples": len(latencies),
+            "seconds": round(elapsed, 3),
+            "examples_per_second": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+            "example_latency": summarize(latencies),
+            "forwards": sum(forwards),
+            "forwards_per_contract": round(sum(forwards) / len(contracts), 3) if contracts else 0.0,
+            "peak_rss_bytes": peak
+        }
+    }
+
+
+# Reporting
+
+def print_report(result: Dict):
+    rows = [(OVERALL, result[OVERALL])] + sorted(result["categories"].items())
+    print(f"\n{'Category':45s} {'N':>5s} {'EM':>7s} {'F1':>7s} {'AUPR':>7s} {'P@80R':>7s}")
+    for name, row in rows:
+        print(f"{name[:45]:45s} {row['questions']:5d} {row['exact']:7.2f} {row['f1']:7.2f} "
+              f"{row['aupr']:7.2f} {row['precision_at_80_recall']:7.2f}")
+    performance = result.get("performance")
+    if performance:
+        windows = f" ({performance['features']} windows)" if "features" in performance else ""
+        print(f"\n{performance['examples']} examples{windows} in {performance['seconds']:.1f}s: "
+              f"{performance['examples_per_second']:.2f} examples/s, "
+              f"p50 {performance['example_latency'].get('p50_ms', 0):.1f} ms per example, "
+              f"peak RSS {performance['peak_rss_bytes'] / 1e6:.0f} MB")
+
+
+def compare(baseline: Dict, current: Dict, max_drop: float) -> List[str]:
+    """Print accuracy changes against a previous run; returns metrics that dropped by more than max_drop points"""
+    regressions = []
+    print(f"\nComparison with {baseline.get('meta', {}).get('git_commit')} (max drop {max_drop:.2f} points):")
+    for name in ("exact", "f1", "aupr", "precision_at_80_recall"):
+        before, after = baseline[OVERALL][name], current[OVERALL][name]
+        flag = "  REGRESSION" if before - after > max_drop else ""
+        if flag:
+            regressions.append(name)
+        print(f"  {name:25s} {before:8.2f} -> {after:8.2f} ({after - before:+.2f}){flag}")
+    if "performance" in baseline and "performance" in current:
+        before = baseline["performance"]["examples_per_second"]
+        after = current["performance"]["examples_per_second"]
+        print(f"  {'examples_per_second':25s} {before:8.2f} -> {after:8.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the CUAD model: accuracy and speed in one run")
+    parser.add_argument("--dataset", required=True, help="CUAD dataset (SQuAD v2 .json or .jsonl)")
+    parser.add_argument("--model-path", default="./", help="Fine-tuned model directory (random-init fallback if absent)")
+    parser.add_argument("--model-size", choices=sorted(MODEL_SIZES), default="small",
+                        help="Size of the random-init fallback model")
+    parser.add_argument("--nbest", help="Score this saved nbest_predictions_.json instead of running the model")
+    parser.add_argument("--predictions", help="predictions_.json to use with --nbest for EM/F1")
+    parser.add_argument("--categories", nargs="+", help="Only evaluate these CUAD categories")
+    parser.add_argument("--limit", type=int, help="Evaluate only the first N questions")
+    parser.add_argument("--batch-size", type=int, default=16, help="Windows per forward pass")
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--doc-stride", type=int, default=128)
+    parser.add_argument("--max-answer-length", type=int, default=256)
+    parser.add_argument("--n-best", type=int, default=20)
+    parser.add_argument("--null-threshold", type=float, default=0.0)
+    parser.add_argument("--threads", type=int, help="torch intra-op threads (default: torch's choice)")
+    parser.add_argument("--save-predictions", help="Directory for predictions_.json and nbest_predictions_.json")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument("--compare", help="Previous report JSON to compare against")
+    parser.add_argument("--max-accuracy-drop", type=float, default=1.0,
+                        help="Drop in points reported as a regression (exit status 1)")
+    args = parser.parse_args()
+
+    meta = {"timestamp": datetime.now().isoformat(), "git_commit": git_commit(), "dataset": args.dataset,
+            "limit": args.limit, "categories": args.categories}
+    if args.nbest:
+        result = {"meta": {**meta, "nbest": args.nbest}, **score_prediction_files(
+            args.dataset, args.nbest, args.predictions, args.categories)}
+    else:
+        import torch
+
+        if args.threads:
+            torch.set_num_threads(args.threads)
+        options = {"batch_size": args.batch_size, "max_length": args.max_length, "doc_stride": args.doc_stride,
+                   "max_answer_length": args.max_answer_length, "n_best": args.n_best,
+                   "null_threshold": args.null_threshold}
+        with tempfile.TemporaryDirectory() as work_dir:
+            model_path, source = args.model_path, "fine_tuned"
+            if not has_fine_tuned_model(model_path):
+                print(f"ℹ️  No fine-tuned weights at {model_path}; using a random-init '{args.model_size}' RoBERTa")
+                model_path, source = build_random_model(work_dir, args.model_size), "random_init"
+            engine = CUADEvaluationEngine.from_pretrained(model_path, **options)
+
+        examples = iter_cuad_examples(args.dataset, args.categories)
+        if args.limit:
+            examples = itertools.islice(examples, args.limit)
+        predictions, nbest_predictions = ({}, {}) if args.save_predictions else (None, None)
+        result = {"meta": {**meta, "model": source, "torch_threads": torch.get_num_threads(), **options},
+                  **engine.evaluate(examples, predictions, nbest_predictions)}
+        if args.save_predictions:
+            os.makedirs(args.save_predictions, exist_ok=True)
+            with open(os.path.join(args.save_predictions, "predictions_.json"), "w", encoding="utf-8") as f:
+                json.dump(predictions, f, indent=2)
+            with open(os.path.join(args.save_predictions, "nbest_predictions_.json"), "w", encoding="utf-8") as f:
+                json.dump(nbest_predictions, f, indent=2)
+
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Report written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), result, args.max_accuracy_drop)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    structured_logging.quiet_offline_run()
+    main()
@@ -0,0 +1,246 @@
+"""
+Document Ingestion
+==================
+Turns uploaded contract files (PDF, DOCX, TXT) and ZIP archives of them into
+text for batch analysis. Uploads are copied to a private spool directory in
+chunks, archives are unpacked member by member with size limits, and text is
+extracted in a process pool so one request can ingest a whole data-room export.
+
+The pool is long-lived and started lazily from a forkserver (spawn where that
+is unavailable), so request threads never fork the server process with its
+model, logging and tracing threads.
+"""
+import atexit
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
+COPY_CHUNK_SIZE = 1024 * 1024
+# Limits protecting the server from oversized or malicious archives
+MAX_ARCHIVE_MEMBERS = 1000
+MAX_MEMBER_BYTES = 100 * 1024 * 1024
+# Caps both the uploaded ZIP itself and the total size of its unpacked members
+MAX_ARCHIVE_BYTES = int(os.getenv("MAX_ARCHIVE_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+
+# Long-lived extraction pools, one per worker count, created on first use
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class UploadTooLarge(ValueError):
+    """A copy went over its byte limit (HTTP 413 when it is a whole upload)"""
+
+
+def extract_text(file_path: str) -> str:
+    """Extract the text of one PDF, DOCX or TXT file (runs in worker processes)"""
+    extension = Path(file_path).suffix.lower()
+    if extension == ".pdf":
+        import PyPDF2
+        with open(file_path, "rb") as f:
+            reader = PyPDF2.PdfReader(f)
+            return "\n".join(page.extract_text() or "" for page in reader.pages)
+    if extension == ".docx":
+        import docx2txt
+        return docx2txt.process(file_path)
+    if extension == ".txt":
+        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    raise ValueError(f"Unsupported file type: {extension}")
+
+
+def _extract_worker(file_path: str) -> Tuple[Optional[str], Optional[str]]:
+    try:
+        return extract_text(file_path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """The shared extraction pool with this many workers (started on first use)"""
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+            _pools[workers] = pool
+        return pool
+
+
+def shutdown_pools():
+    """Stop every extraction pool (called at exit)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown_pools)
+
+
+class UploadSpool:
+    def __init__(self, spool_dir: Optional[str] = None):
+        """Private temporary directory holding one request's uploaded files"""
+        self.directory = tempfile.mkdtemp(prefix="contract_upload_", dir=spool_dir)
+        self.documents = []  # {"name", "path"}
+        self.skipped = []    # {"name", "reason"}
+        self.bytes_spooled = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+        return False
+
+    def cleanup(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _spool_path(self, extension: str) -> str:
+        return os.path.join(self.directory, f"{uuid.uuid4().hex}{extension}")
+
+    def _copy(self, source: BinaryIO, destination: str, limit: Optional[int] = None) -> int:
+        """Chunked copy; raises UploadTooLarge once more than limit bytes were read"""
+        copied = 0
+        with open(destination, "wb") as f:
+            while True:
+                chunk = source.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                copied += len(chunk)
+                if limit is not None and copied > limit:
+                    raise UploadTooLarge(f"File exceeds {limit // (1024 * 1024)} MB limit")
+                f.write(chunk)
+        self.bytes_spooled += copied
+        return copied
+
+    def add_upload(self, filename: str, stream: BinaryIO):
+        """Spool one uploaded file; ZIP archives are expanded into their contracts"""
+        name = os.path.basename(filename or "") or "upload"
+        extension = Path(name).suffix.lower()
+
+        if extension == ".zip":
+            archive_path = self._spool_path(".zip")
+            try:
+                # Stop reading as soon as the archive is over the limit instead of filling the spool volume
+                self._copy(stream, archive_path, MAX_ARCHIVE_BYTES)
+            except UploadTooLarge:
+                os.remove(archive_path)
+                raise
+            try:
+                self._add_archive(name, archive_path)
+            finally:
+                os.remove(archive_path)
+        elif extension in SUPPORTED_EXTENSIONS:
+            path = self._spool_path(extension)
+            try:
+                self._copy(stream, path, MAX_MEMBER_BYTES)
+            except ValueError as e:
+                os.remove(path)
+                self.skipped.append({"name": name, "reason": str(e)})
+                return
+            self.documents.append({"name": name, "path": path})
+        else:
+            self.skipped.append({"name": name, "reason": f"Unsupported file type: {extension or 'none'}"})
+
+    def _add_archive(self, archive_name: str, archive_path: str):
+        try:
+            archive = zipfile.ZipFile(archive_path)
+        except zipfile.BadZipFile:
+            self.skipped.append({"name": archive_name, "reason": "Not a valid ZIP archive"})
+            return
+
+        with archive:
+            members = [info for info in archive.infolist() if not info.is_dir()]
+            if len(members) > MAX_ARCHIVE_MEMBERS:
+                self.skipped.append({"name": archive_name,
+                                     "reason": f"Archive has more than {MAX_ARCHIVE_MEMBERS} files"})
+                return
+
+            total_bytes = 0
+            for info in members:
+                member_name = f"{archive_name}/{info.filename}"
+                base_name = os.path.basename(info.filename)
+                extension = Path(base_name).suffix.lower()
+                if base_name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                    continue
+                if extension not in SUPPORTED_EXTENSIONS:
+                    self.skipped.append({"name": member_name, "reason": f"Unsupported file type: {extension or 'none'}"})
+                    continue
+                if info.file_size > MAX_MEMBER_BYTES or total_bytes + info.file_size > MAX_ARCHIVE_BYTES:
+                    self.skipped.append({"name": member_name, "reason": "File too large"})
+                    continue
+
+                # Archive member names are never used as paths, so "../" entries cannot escape the spool
+                path = self._spool_path(extension)
+                try:
+                    with archive.open(info) as source:
+                        total_bytes += self._copy(source, path, MAX_MEMBER_BYTES)
+                except (ValueError, zipfile.BadZipFile, RuntimeError) as e:
+                    if os.path.exists(path):
+                        os.remove(path)
+                    self.skipped.append({"name": member_name, "reason": str(e)})
+                    continue
+                self.documents.append({"name": member_name, "path": path})
+
+
+def extract_documents(documents: List[Dict], max_workers: Optional[int] = None) -> Tuple[List[Dict], List[Dict]]:
+    """Extract text of spooled documents in a process pool.
+
+    Returns (contracts, failures): contracts as {"name", "text"} in upload
+    order, ready for batch analysis; failures as {"name", "reason"}.
+    """
+    if not documents:
+        return [], []
+
+    workers = max_workers or os.cpu_count() or 1
+    paths = [document["path"] for document in documents]
+    if workers == 1 or len(paths) == 1:
+        outcomes = [_extract_worker(path) for path in paths]
+    else:
+        outcomes = list(get_pool(workers).map(_extract_worker, paths))
+
+    contracts = []
+    failures = []
+    for document, (text, error) in zip(documents, outcomes):
+        if error:
+            failures.append({"name": document["name"], "reason": error})
+        elif not text or not text.strip():
+            failures.append({"name": document["name"], "reason": "No extractable text"})
+        else:
+            contracts.append({"name": document["name"], "text": text})
+    return contracts, failures
+
+
+def ingest_uploads(files: List[Tuple[str, BinaryIO]], max_workers: Optional[int] = None) -> Dict:
+    """Spool uploaded files, expand archives and extract text.
+
+    files is a list of (filename, stream) pairs. The spool is removed before
+    returning. Raises UploadTooLarge when a ZIP archive exceeds MAX_ARCHIVE_BYTES.
+    """
+    start = time.time()
+    with UploadSpool() as spool:
+        for filename, stream in files:
+            spool.add_upload(filename, stream)
+        spooled = time.time()
+        contracts, failures = extract_documents(spool.documents, max_workers)
+
+        return {
+            "contracts": contracts,
+            "skipped": spool.skipped + failures,
+            "files_received": len(files),
+            "documents_found": len(spool.documents),
+            "bytes_spooled": spool.bytes_spooled,
+            "spool_seconds": round(spooled - start, 3),
+            "extraction_seconds": round(time.time() - spooled, 3)
+        }
@@ -5,12 +5,23 @@ This is YOUR primary fine-tuned RoBERTa model for contract analysis.
 Works 100% independently without any external APIs.
 """
 import torch
-from transformers import RobertaTokenizer, RobertaForQuestionAnswering
+import transformers
+from transformers import RobertaTokenizer
 import json
 import re
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import os
+import time
 from datetime import datetime
+from clause_segmenter import segment_contract
+from model_weights import load_qa_model, weights_version
+from metrics import BATCH_SIZE, FORWARDS_SAVED, TEMPLATE_FORWARDS, TEMPLATE_GAIN, TEMPLATE_OUTCOMES, time_stage
+from tracing import span, traced
+from structured_logging import HOT, get_logger, hot
+from template_policy import load_policy
+from calibration import load_calibration
+
+logger = get_logger("analyzer")
 
 class EnhancedCUADAnalyzer:
     def __init__(self, model_path="./", enable_groq_enhancement=False):
@@ -22,8 +33,10 @@ class EnhancedCUADAnalyzer:
         
         # Load YOUR CUAD model (fine-tuned)
         print("📚 Loading YOUR fine-tuned RoBERTa model...")
+        self.model_path = model_path
         self.tokenizer = RobertaTokenizer.from_pretrained(model_path)
-        self.model = RobertaForQuestionAnswering.from_pretrained(model_path)
+        # Weights are memory-mapped from a one-time safetensors conversion
+        self.model = load_qa_model(model_path)
         self.model.eval()
         print("✅ YOUR fine-tuned model loaded successfully!")
         
@@ -106,6 +119,17 @@ class EnhancedCUADAnalyzer:
             ]
         }
         
+        # Inference settings; sweep_analyzer.py measures their accuracy/latency trade-off
+        self.templates_per_category = None  # None runs every template of a category
+        self.beam_size = 5
+        self.max_length = 512
+        
+        # Win-rate template order and early-exit thresholds (template_policy.py), if built
+        self.template_policy = load_policy(model_path)
+        
+        # Per-category confidence calibrators fitted on the evaluation set (calibration.py), if built
+        self.confidence_calibration = load_calibration(model_path)
+        
         # Risk assessment categories
         self.risk_categories = {
             "high_risk": [
@@ -206,8 +230,64 @@ class EnhancedCUADAnalyzer:
         else:
             return "general_contract"
     
+    # Risk term rules: (term, description) pairs per bucket, with the score each hit adds
+    HIGH_RISK_TERMS = [
+        ("no termination", "No clear termination rights"),
+        ("perpetual", "Perpetual obligations or licenses"),
+        ("exclusive", "Exclusive rights granted"),
+        ("irrevocable", "Irrevocable commitments"),
+        ("unlimited data", "Unlimited data collection rights")
+    ]
+    
+    MEDIUM_RISK_TERMS = [
+        ("automatic renewal", "Automatic renewal clauses"),
+        ("third party", "Third-party data sharing"),
+        ("modify", "Unilateral modification rights"),
+        ("arbitration", "Mandatory arbitration clauses")
+    ]
+    
+    RED_FLAG_TERMS = [
+        ("class action waiver", "Class action lawsuit waiver"),
+        ("foreign jurisdiction", "Foreign jurisdiction governing law"),
+        ("no warranty", "Complete warranty disclaimers"),
+        ("unlimited access", "Unlimited device/data access")
+    ]
+    
+    # Single words that only count in combination ("unlimited" + "liability")
+    RISK_MARKER_TERMS = ["unlimited", "liability"]
+    
+    def risk_scan_terms(self) -> List[str]:
+        """All terms looked for by the risk scan"""
+        terms = list(self.RISK_MARKER_TERMS)
+        for rules in (self.HIGH_RISK_TERMS, self.MEDIUM_RISK_TERMS, self.RED_FLAG_TERMS):
+            terms.extend(term for term, _ in rules)
+        return terms
+    
+    def scan_risk_terms(self, text: str) -> set:
+        """Return the set of risk terms present in a piece of contract text.
+        
+        None of the terms contain sentence punctuation or line breaks, so
+        scanning the segments of a ContractDocument one by one and taking the
+        union gives the same result as scanning the whole document.
+        """
+        text_lower = text.lower()
+        return {term for term in self.risk_scan_terms() if term in text_lower}
+    
+    def document_risk_terms(self, document) -> set:
+        """Risk terms present in a segmented document (memoized on the document)"""
+        found_terms = document.cache.get("risk_terms")
+        if found_terms is None:
+            found_terms = self.scan_risk_terms(document.text)
+            document.cache["risk_terms"] = found_terms
+        return found_terms
+    
     def assess_risks(self, contract_text: str, cuad_results: Dict) -> Dict:
         """Assess risks based on CUAD results and contract content"""
+        document = segment_contract(contract_text)
+        return self.score_risk_terms(self.document_risk_terms(document), cuad_results)
+    
+    def score_risk_terms(self, found_terms: set, cuad_results: Dict) -> Dict:
+        """Build the risk assessment from scanned terms and CUAD results"""
         risks = {
             "high_risk": [],
             "medium_risk": [],
@@ -216,10 +296,8 @@ class EnhancedCUADAnalyzer:
             "risk_score": 0
         }
         
-        text_lower = contract_text.lower()
-        
         # High risk assessments
-        if "unlimited" in text_lower and "liability" in text_lower:
+        if "unlimited" in found_terms and "liability" in found_terms:
             risks["high_risk"].append("Unlimited liability exposure")
             risks["risk_score"] += 30
         
@@ -228,42 +306,20 @@ class EnhancedCUADAnalyzer:
             risks["risk_score"] += 15
         
         # Check for specific high-risk terms
-        high_risk_terms = [
-            ("no termination", "No clear termination rights"),
-            ("perpetual", "Perpetual obligations or licenses"),
-            ("exclusive", "Exclusive rights granted"),
-            ("irrevocable", "Irrevocable commitments"),
-            ("unlimited data", "Unlimited data collection rights")
-        ]
-        
-        for term, description in high_risk_terms:
-            if term in text_lower:
+        for term, description in self.HIGH_RISK_TERMS:
+            if term in found_terms:
                 risks["high_risk"].append(description)
                 risks["risk_score"] += 25
         
         # Medium risk assessments
-        medium_risk_terms = [
-            ("automatic renewal", "Automatic renewal clauses"),
-            ("third party", "Third-party data sharing"),
-            ("modify", "Unilateral modification rights"),
-            ("arbitration", "Mandatory arbitration clauses")
-        ]
-        
-        for term, description in medium_risk_terms:
-            if term in text_lower:
+        for term, description in self.MEDIUM_RISK_TERMS:
+            if term in found_terms:
                 risks["medium_risk"].append(description)
                 risks["risk_score"] += 10
         
         # Red flags
-        red_flag_terms = [
-            ("class action waiver", "Class action lawsuit waiver"),
-            ("foreign jurisdiction", "Foreign jurisdiction governing law"),
-            ("no warranty", "Complete warranty disclaimers"),
-            ("unlimited access", "Unlimited device/data access")
-        ]
-        
-        for term, description in red_flag_terms:
-            if term in text_lower:
+        for term, description in self.RED_FLAG_TERMS:
+            if term in found_terms:
                 risks["red_flags"].append(description)
                 risks["risk_score"] += 20
         
@@ -277,28 +333,40 @@ class EnhancedCUADAnalyzer:
         
         return risks
     
+    @traced("analyze_contract_comprehensive")
     def analyze_contract_comprehensive(self, contract_text: str) -> Dict:
         """Comprehensive contract analysis using YOUR fine-tuned model"""
         
-        print("🧠 Starting analysis with YOUR fine-tuned model...")
+        logger.debug("🧠 Starting analysis with YOUR fine-tuned model...", extra=HOT)
         
         # Detect contract type using YOUR model
         contract_type = self.detect_contract_type(contract_text)
-        print(f"📋 Contract type detected: {contract_type}")
+        logger.debug("📋 Contract type detected: %s", contract_type, extra=hot(contract_type=contract_type))
         
         # Get CUAD analysis using YOUR fine-tuned model
         cuad_results = {}
         relevant_categories = self.get_relevant_categories(contract_type)
         
-        print("🔍 Analyzing contract sections with YOUR model...")
-        for category in relevant_categories:
+        logger.debug("🔍 Analyzing contract sections with YOUR model...", extra=HOT)
+        # Segment the document once and share the sentences across categories
+        document = segment_contract(contract_text)
+        sentences = document.sentences()
+        forwards_saved = 0
+        for category in dict.fromkeys(relevant_categories):
             if category in self.question_templates:
-                result = self.answer_question_advanced(contract_text, category)
+                with span("select_relevant_context", category=category), time_stage("context_extraction"):
+                    relevant_context = self.select_relevant_context(sentences, contract_text, category)
+                result = self.answer_from_context(relevant_context, category, contract_type=contract_type)
                 cuad_results[category] = result
+                # forwards is bookkeeping for this metric, not part of the analysis result
+                forwards_saved += len(self.templates_for(category, contract_type)) - result.pop("forwards")
+        FORWARDS_SAVED.observe(forwards_saved)
+        self.calibrate_results(cuad_results)
         
         # Risk assessment using YOUR model's results
-        print("⚠️  Assessing risks with YOUR model...")
-        risk_assessment = self.assess_risks(contract_text, cuad_results)
+        logger.debug("⚠️  Assessing risks with YOUR model...", extra=HOT)
+        with span("assess_risks"), time_stage("risk_scoring"):
+            risk_assessment = self.assess_risks(contract_text, cuad_results)
         
         # Optional enhancement (can be None if disabled)
         optional_enhancement = self.get_optional_enhancement(contract_text)
@@ -317,7 +385,11 @@ class EnhancedCUADAnalyzer:
             "primary_model": "YOUR_FINE_TUNED_ROBERTA_CUAD"
         }
         
-        print("✅ Analysis completed successfully with YOUR fine-tuned model!")
+        logger.info("✅ Analysis completed with YOUR fine-tuned model", extra=hot(
+            contract_type=contract_type,
+            overall_risk=risk_assessment["overall_risk"],
+            categories=len(cuad_results),
+            characters=len(contract_text)))
         return comprehensive_result
     
     def get_relevant_categories(self, contract_type: str) -> List[str]:
@@ -366,73 +438,227 @@ class EnhancedCUADAnalyzer:
         
         return recommendations
     
-    def answer_question_advanced(self, context: str, question_category: str, max_length: int = 512) -> Dict:
+    @traced("answer_question_advanced")
+    def answer_question_advanced(self, context: str, question_category: str, max_length: Optional[int] = None) -> Dict:
         """Advanced question answering with improved techniques"""
-        relevant_context = self.extract_relevant_context(context, question_category)
+        with span("extract_relevant_context", category=question_category), time_stage("context_extraction"):
+            relevant_context = self.extract_relevant_context(context, question_category)
+        result = self.answer_from_context(relevant_context, question_category, max_length)
+        result.pop("forwards")
+        return self.calibrate_results({question_category: result})[question_category]
+    
+    def calibrate_results(self, cuad_results: Dict) -> Dict:
+        """Replace raw confidences (kept as raw_confidence) with calibrated ones, in one
+        vectorized pass over the category results"""
+        if self.confidence_calibration is None or not cuad_results:
+            return cuad_results
+        categories = list(cuad_results)
+        raw = [cuad_results[category]["confidence"] for category in categories]
+        with time_stage("calibration"):
+            calibrated = self.confidence_calibration.apply(categories, raw)
+        for category, raw_confidence, confidence in zip(categories, raw, calibrated):
+            cuad_results[category]["raw_confidence"] = raw_confidence
+            cuad_results[category]["confidence"] = float(confidence)
+        return cuad_results
+    
+    def templates_for(self, question_category: str, contract_type: Optional[str] = None) -> List[str]:
+        """Question templates to run for a category: win-rate order without pruned templates
+        when a template policy is loaded"""
         questions = self.question_templates.get(question_category, [question_category])
+        if self.template_policy is not None:
+            questions = self.template_policy.ordered(question_category, questions, contract_type)
+        return questions[:self.templates_per_category]
+    
+    def answer_from_context(self, relevant_context: str, question_category: str, max_length: Optional[int] = None,
+                            contract_type: Optional[str] = None) -> Dict:
+        """Run the question templates of a category against already-extracted context.
+        
+        With a template policy loaded, templates run in win-rate order, pruned
+        templates are skipped, and the run stops once the best confidence
+        reaches the category's calibrated threshold.
+        """
+        questions = self.templates_for(question_category, contract_type)
+        threshold = self.template_policy.threshold(question_category) if self.template_policy else None
+        
+        steps = []
+        best_answer, best_confidence, best_question, forwards = self.select_best_answer(
+            self._recorded(self.template_answers(relevant_context, question_category, questions, max_length), steps),
+            threshold)
+        TEMPLATE_FORWARDS.inc(forwards, category=question_category, outcome="run")
+        if forwards < len(questions):
+            TEMPLATE_FORWARDS.inc(len(questions) - forwards, category=question_category, outcome="skipped")
+        self.record_template_outcomes(question_category, contract_type, steps, best_question, best_confidence)
         
+        best_answer = self.postprocess_answer(best_answer)
+        
+        return {
+            "answer": best_answer,
+            "confidence": best_confidence,
+            "question_used": best_question,
+            "forwards": forwards
+        }
+    
+    def template_answers(self, relevant_context: str, question_category: str, questions: List[str],
+                         max_length: Optional[int] = None):
+        """Lazily yield (question, answer, confidence) per template; each step is one forward pass"""
+        max_length = max_length or self.max_length
+        enhanced_context = f"Contract Document: {relevant_context}"
+        
+        for template_index, question in enumerate(questions):
+            with span("answer_template", category=question_category, template=template_index) as template_span:
+                with time_stage("tokenization"):
+                    inputs = self.tokenizer.encode_plus(
+                        question,
+                        enhanced_context,
+                        add_special_tokens=True,
+                        max_length=max_length,
+                        truncation=True,
+                        padding='max_length',
+                        return_tensors='pt'
+                    )
+            
+                BATCH_SIZE.observe(inputs['input_ids'].shape[0], kind="forward")
+                with time_stage("forward"), torch.no_grad():
+                    outputs = self.model(**inputs)
+                    start_logits = outputs.start_logits
+                    end_logits = outputs.end_logits
+            
+                with time_stage("span_selection"):
+                    answer, confidence = self.extract_answer_beam_search(inputs, start_logits, end_logits,
+                                                                         beam_size=self.beam_size)
+                template_span.set(tokens=int(inputs['attention_mask'].sum()), confidence=round(float(confidence), 4))
+            yield question, answer, confidence
+    
+    @staticmethod
+    def _recorded(template_answers, steps: List):
+        for step in template_answers:
+            steps.append(step)
+            yield step
+    
+    def record_template_outcomes(self, question_category: str, contract_type: Optional[str], steps: List,
+                                 best_question: str, best_confidence: float):
+        """Count which templates ran and won, and how much confidence the winner added over the
+        best other template; template_stats.py turns these into pruning decisions"""
+        templates = self.question_templates.get(question_category, [])
+        contract_type = contract_type or "unknown"
+        for question, _, _ in steps:
+            template = str(templates.index(question)) if question in templates else "other"
+            TEMPLATE_OUTCOMES.inc(category=question_category, contract_type=contract_type, template=template,
+                                  outcome="run")
+        if not best_question:
+            return
+        template = str(templates.index(best_question)) if best_question in templates else "other"
+        runner_up = max([float(confidence) for question, answer, confidence in steps
+                         if question != best_question and len(answer.strip()) > 3], default=0.0)
+        TEMPLATE_OUTCOMES.inc(category=question_category, contract_type=contract_type, template=template, outcome="won")
+        TEMPLATE_GAIN.inc(float(best_confidence) - runner_up, category=question_category, contract_type=contract_type,
+                          template=template)
+    
+    @staticmethod
+    def select_best_answer(template_answers, threshold: Optional[float] = None):
+        """(answer, confidence, question, forwards run) of the most confident valid template answer,
+        stopping early once the best confidence reaches threshold"""
         best_answer = ""
         best_confidence = 0
         best_question = ""
+        forwards = 0
         
-        for question in questions:
-            enhanced_context = f"Contract Document: {relevant_context}"
-            
+        for question, answer, confidence in template_answers:
+            forwards += 1
+            if confidence > best_confidence and len(answer.strip()) > 3:
+                best_answer = answer
+                best_confidence = confidence
+                best_question = question
+            if threshold is not None and best_confidence >= threshold:
+                break
+        
+        return best_answer, best_confidence, best_question, forwards
+    
+    def warm_up(self, seq_lengths=(128, 256, 512), batch_sizes=(1, 4)) -> List[Dict]:
+        """Run representative batched forwards so the first real request does not pay
+        for allocator growth and kernel selection. Returns per-shape timings."""
+        sample_context = ("Contract Document: This Agreement shall be governed by the laws of the State of Delaware. "
+                          "Either party may terminate this Agreement upon thirty days written notice. ") * 40
+        question = self.question_templates["governing_law"][0]
+        max_positions = self.model.config.max_position_embeddings - 2
+        
+        timings = []
+        for seq_length in seq_lengths:
+            seq_length = min(seq_length, max_positions)
             inputs = self.tokenizer.encode_plus(
                 question,
-                enhanced_context,
+                sample_context,
                 add_special_tokens=True,
-                max_length=max_length,
+                max_length=seq_length,
                 truncation=True,
                 padding='max_length',
                 return_tensors='pt'
             )
-            
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                start_logits = outputs.start_logits
-                end_logits = outputs.end_logits
-            
-            answer, confidence = self.extract_answer_beam_search(inputs, start_logits, end_logits)
-            
-            if confidence > best_confidence and len(answer.strip()) > 3:
-                best_answer = answer
-                best_confidence = confidence
-                best_question = question
-        
-        best_answer = self.postprocess_answer(best_answer)
-        
+            for batch_size in batch_sizes:
+                batch = {name: tensor.repeat(batch_size, 1) for name, tensor in inputs.items()}
+                start = time.perf_counter()
+                with torch.no_grad():
+                    self.model(**batch)
+                timings.append({
+                    "seq_length": seq_length,
+                    "batch_size": batch_size,
+                    "seconds": round(time.perf_counter() - start, 4)
+                })
+        return timings
+    
+    def model_memory_bytes(self) -> int:
+        """Bytes held by the model's parameters and buffers (mapped weights included)"""
+        tensors = list(self.model.parameters()) + list(self.model.buffers())
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    
+    def model_info(self) -> Dict:
+        """Model version and inference backend, reported by the readiness endpoint"""
+        parameter = next(self.model.parameters())
         return {
-            "answer": best_answer,
-            "confidence": best_confidence,
-            "question_used": best_question
+            "model": "YOUR_FINE_TUNED_ROBERTA_CUAD",
+            "version": weights_version(self.model_path),
+            "parameters": sum(p.numel() for p in self.model.parameters()),
+            "confidence_calibration": self.confidence_calibration.methods() if self.confidence_calibration else None,
+            "backend": {
+                "framework": "torch",
+                "torch_version": torch.__version__,
+                "transformers_version": transformers.__version__,
+                "device": str(parameter.device),
+                "dtype": str(parameter.dtype).replace("torch.", ""),
+                "threads": torch.get_num_threads()
+            }
         }
     
+    # Keywords used to pick the sentences relevant to each question category
+    SECTION_KEYWORDS = {
+        "governing_law": ["governing law", "governed by", "jurisdiction", "laws of"],
+        "termination": ["terminat", "end", "expire", "breach", "notice"],
+        "liability": ["liabilit", "damages", "limit", "cap", "exclude"],
+        "payment_terms": ["pay", "fee", "cost", "price", "invoice", "subscription"],
+        "intellectual_property": ["intellectual property", "IP", "copyright", "license"],
+        "confidentiality": ["confidential", "non-disclosure", "privacy", "secret"],
+        "data_privacy": ["data", "privacy", "personal information", "collection"],
+        "app_permissions": ["permission", "access", "device", "location", "camera"],
+        "subscription_terms": ["subscription", "billing", "auto-renew", "cancel"],
+        "user_content": ["user content", "user data", "upload", "share"]
+    }
+    
     def extract_relevant_context(self, full_context: str, question_category: str) -> str:
         """Extract relevant context for specific question categories"""
-        section_keywords = {
-            "governing_law": ["governing law", "governed by", "jurisdiction", "laws of"],
-            "termination": ["terminat", "end", "expire", "breach", "notice"],
-            "liability": ["liabilit", "damages", "limit", "cap", "exclude"],
-            "payment_terms": ["pay", "fee", "cost", "price", "invoice", "subscription"],
-            "intellectual_property": ["intellectual property", "IP", "copyright", "license"],
-            "confidentiality": ["confidential", "non-disclosure", "privacy", "secret"],
-            "data_privacy": ["data", "privacy", "personal information", "collection"],
-            "app_permissions": ["permission", "access", "device", "location", "camera"],
-            "subscription_terms": ["subscription", "billing", "auto-renew", "cancel"],
-            "user_content": ["user content", "user data", "upload", "share"]
-        }
-        
-        keywords = section_keywords.get(question_category, [])
-        sentences = re.split(r'[.!?]+', full_context)
+        document = segment_contract(full_context)
+        return self.select_relevant_context(document.sentences(), full_context, question_category)
+    
+    def select_relevant_context(self, sentences: List[str], full_context: str, question_category: str) -> str:
+        """Pick the highest-scoring sentences for a category from a pre-split document"""
+        keywords = self.SECTION_KEYWORDS.get(question_category, [])
         
         scored_sentences = []
         for sentence in sentences:
-            sentence = sentence.strip()
             if len(sentence) < 10:
                 continue
             
-            score = sum(2 for keyword in keywords if keyword.lower() in sentence.lower())
+            sentence_lower = sentence.lower()
+            score = sum(2 for keyword in keywords if keyword.lower() in sentence_lower)
             scored_sentences.append((sentence, score))
         
         scored_sentences.sort(key=lambda x: x[1], reverse=True)
@@ -3,18 +3,20 @@ Evaluation script for the fine-tuned CUAD model
 """
 import torch
 import json
-from transformers import RobertaTokenizer, RobertaForQuestionAnswering
-from sklearn.metrics import f1_score
+from transformers import RobertaTokenizerFast, RobertaForQuestionAnswering
 import numpy as np
+from cuad_evaluation import CUADEvaluationEngine, print_report, score_prediction_files
 
 class CUADEvaluator:
     def __init__(self, model_path="./"):
         """Initialize the model and tokenizer"""
-        self.tokenizer = RobertaTokenizer.from_pretrained(model_path)
+        self.tokenizer = RobertaTokenizerFast.from_pretrained(model_path)
         self.model = RobertaForQuestionAnswering.from_pretrained(model_path)
         self.model.eval()
+        self.engine = CUADEvaluationEngine(self.model, self.tokenizer)
     
-    def evaluate_predictions(self, predictions_file="predictions_.json"):
+    def evaluate_predictions(self, predictions_file="predictions_.json", dataset_file=None,
+                             nbest_file="nbest_predictions_.json"):
         """Evaluate model predictions against ground truth"""
         try:
             with open(predictions_file, 'r', encoding='utf-8') as f:
@@ -39,13 +41,17 @@ class CUADEvaluator:
                 print(f"Min answer length: {min(answer_lengths)} words")
                 print(f"Max answer length: {max(answer_lengths)} words")
             
+            # Score against the ground truth (EM/F1, AUPR, precision at 80% recall) when available
+            if dataset_file:
+                print_report(score_prediction_files(dataset_file, nbest_file, predictions_file))
+            
             return predictions
             
         except FileNotFoundError:
             print(f"Predictions file {predictions_file} not found")
             return None
     
-    def analyze_model_performance(self):
+    def analyze_model_performance(self, dataset_file=None):
         """Analyze the model's performance based on available files"""
         print("=== CUAD Model Analysis ===\n")
         
@@ -58,7 +64,7 @@ class CUADEvaluator:
         print(f"Vocabulary size: {self.model.config.vocab_size}")
         
         # Evaluate predictions if available
-        predictions = self.evaluate_predictions()
+        predictions = self.evaluate_predictions(dataset_file=dataset_file)
         
         # Show sample predictions
         if predictions:
@@ -92,15 +98,25 @@ class CUADEvaluator:
         
         print("\n=== Testing on Sample Data ===")
         
+        examples = [
+            {"id": f"sample{i}", "category": sample["question"], "question": sample["question"],
+             "context": sample["context"], "answers": [sample["expected"]]}
+            for i, sample in enumerate(sample_contracts, 1)
+        ]
+        predictions, nbest_predictions = {}, {}
+        result = self.engine.evaluate(examples, predictions, nbest_predictions)
+        
         for i, sample in enumerate(sample_contracts, 1):
-            result = self.answer_question(sample["context"], sample["question"])
-            
+            answer = predictions[f"sample{i}"]
+            best = next(entry for entry in nbest_predictions[f"sample{i}"] if entry["text"] == answer)
             print(f"\nTest {i}:")
             print(f"Question: {sample['question']}")
             print(f"Expected: {sample['expected']}")
-            print(f"Predicted: {result['answer']}")
-            print(f"Confidence: {result['confidence']:.3f}")
+            print(f"Predicted: {answer or 'No answer found'}")
+            print(f"Confidence: {best['probability']:.3f}")
             print("-" * 50)
+        
+        print(f"Exact match: {result['overall']['exact']:.1f}  F1: {result['overall']['f1']:.1f}")
     
     def answer_question(self, context, question, max_length=512):
         """Answer a question given a context"""
@@ -140,8 +156,14 @@ class CUADEvaluator:
         }
 
 def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Evaluate the fine-tuned CUAD model")
+    parser.add_argument("--dataset", help="CUAD test set to score predictions_.json against")
+    args = parser.parse_args()
+    
     evaluator = CUADEvaluator()
-    evaluator.analyze_model_performance()
+    evaluator.analyze_model_performance(args.dataset)
     evaluator.test_on_sample_data()
 
 if __name__ == "__main__":
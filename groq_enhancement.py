@@ -8,18 +8,25 @@ import os
 import requests
 from datetime import datetime
 from typing import Dict, Optional
+from metrics import GROQ_CALLS, time_stage
+from tracing import span, traced
+from structured_logging import HOT, get_logger, hot
+
+logger = get_logger("groq")
 
 class GroqEnhancement:
     def __init__(self, api_key: Optional[str] = None):
         """Initialize Groq enhancement (optional)"""
         self.api_key = api_key or os.getenv('GROQ_API_KEY')
-        self.base_url = "https://api.groq.com/openai/v1/chat/completions"
+        # GROQ_BASE_URL points at a local stub for load tests
+        self.base_url = os.getenv('GROQ_BASE_URL', "https://api.groq.com/openai/v1/chat/completions")
         self.available = bool(self.api_key)
     
     def is_available(self) -> bool:
         """Check if Groq enhancement is available"""
         return self.available
     
+    @traced("groq.enhance_analysis")
     def enhance_analysis(self, contract_text: str, analysis_type: str = "comprehensive") -> Optional[Dict]:
         """Provide enhanced analysis using Groq API (optional)"""
         if not self.available:
@@ -137,12 +144,15 @@ class GroqEnhancement:
                         "max_tokens": 2000
                     }
                     
-                    print(f"🤖 Trying Groq model: {model}")
-                    response = requests.post(self.base_url, headers=headers, json=payload, timeout=30)
+                    logger.debug("🤖 Trying Groq model %s", model, extra=hot(analysis_type=analysis_type))
+                    with span("groq.request", model=model, analysis_type=analysis_type) as request_span, time_stage("groq_call"):
+                        response = requests.post(self.base_url, headers=headers, json=payload, timeout=30)
+                        request_span.set(status=response.status_code)
+                    GROQ_CALLS.inc(caller="enhance_analysis", model=model, outcome=str(response.status_code))
                     
                     if response.status_code == 200:
                         result = response.json()
-                        print(f"✅ Success with model: {model}")
+                        logger.info("✅ Groq enhancement succeeded with %s", model, extra=hot(analysis_type=analysis_type))
                         return {
                             "analysis": result["choices"][0]["message"]["content"],
                             "model": model,
@@ -150,27 +160,28 @@ class GroqEnhancement:
                             "enhanced": True
                         }
                     elif response.status_code == 429:
-                        print(f"⚠️ Model {model} is busy (429), trying next...")
+                        logger.warning("⚠️ Groq model %s is busy (429), trying next...", model, extra=HOT)
                         continue
                     elif response.status_code == 503:
-                        print(f"⚠️ Model {model} unavailable (503), trying next...")
+                        logger.warning("⚠️ Groq model %s unavailable (503), trying next...", model, extra=HOT)
                         continue
                     else:
-                        print(f"⚠️ Model {model} failed with status {response.status_code}, trying next...")
+                        logger.warning("⚠️ Groq model %s failed with status %s, trying next...", model, response.status_code, extra=HOT)
                         continue
                         
                 except requests.exceptions.Timeout:
-                    print(f"⏰ Model {model} timed out, trying next...")
+                    GROQ_CALLS.inc(caller="enhance_analysis", model=model, outcome="timeout")
+                    logger.warning("⏰ Groq model %s timed out, trying next...", model, extra=HOT)
                     continue
                 except Exception as e:
-                    print(f"❌ Model {model} error: {str(e)}, trying next...")
+                    logger.warning("❌ Groq model %s error: %s, trying next...", model, e, extra=HOT)
                     continue
             
-            print("❌ All Groq models are currently busy or unavailable")
+            logger.error("❌ All Groq models are currently busy or unavailable", extra=hot(analysis_type=analysis_type))
             return None
                 
-        except Exception as e:
-            print(f"Groq enhancement failed (optional): {str(e)}")
+        except Exception:
+            logger.exception("Groq enhancement failed (optional)", extra=HOT)
             return None
     
     def enhance_recommendations(self, risk_assessment: Dict, contract_type: str) -> list:
@@ -0,0 +1,268 @@
+"""
+Incremental Contract Re-Analysis
+================================
+Re-analyzes an edited contract against the cached analysis of its previous
+version. Only categories whose relevant context changed are sent back through
+YOUR fine-tuned model, and risk terms are only re-scanned in changed regions.
+"""
+import difflib
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from clause_segmenter import segment_contract
+from metrics import FORWARDS_SAVED, record_cache, time_stage
+from tracing import span, traced
+
+
+class IncrementalContractAnalyzer:
+    def __init__(self, analyzer, max_documents: int = 256):
+        """Wrap an EnhancedCUADAnalyzer with a per-document snapshot cache"""
+        self.analyzer = analyzer
+        self.max_documents = max_documents
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def document_key(contract_text: str) -> str:
+        """Default document id when the caller does not supply one"""
+        return hashlib.sha256(contract_text.encode('utf-8')).hexdigest()
+
+    def get_snapshot(self, document_id: str) -> Optional[Dict]:
+        """Return the cached snapshot for a document (most recently used first)"""
+        with self._lock:
+            snapshot = self._snapshots.get(document_id)
+            if snapshot is not None:
+                self._snapshots.move_to_end(document_id)
+            return snapshot
+
+    def store_snapshot(self, document_id: str, snapshot: Dict):
+        """Cache a snapshot, evicting the least recently used documents"""
+        with self._lock:
+            self._snapshots[document_id] = snapshot
+            self._snapshots.move_to_end(document_id)
+            while len(self._snapshots) > self.max_documents:
+                self._snapshots.popitem(last=False)
+
+    def rebuild_snapshot(self, document_id: str, contract_text: str, result: Dict) -> Dict:
+        """Re-create the snapshot of an analysis persisted outside this cache (e.g. the
+        analysis store) from the exact text it was computed from. Segmentation, risk-term
+        scanning and context selection run again; the model does not."""
+        analyzer = self.analyzer
+        document = segment_contract(contract_text)
+        segments = document.segment_texts()
+        segment_terms = [analyzer.scan_risk_terms(segment) for segment in segments]
+        sentences = document.sentences()
+        cuad_results = result.get("cuad_analysis", {})
+        snapshot = {
+            "text": contract_text,
+            "segments": segments,
+            "segment_terms": segment_terms,
+            "found_terms": set().union(*segment_terms) if segment_terms else set(),
+            "contexts": {category: analyzer.select_relevant_context(sentences, contract_text, category)
+                         for category in cuad_results},
+            "cuad_analysis": cuad_results,
+            "result": result
+        }
+        self.store_snapshot(document_id, snapshot)
+        return snapshot
+
+    def forget(self, document_id: str):
+        """Drop the cached version of a document"""
+        with self._lock:
+            self._snapshots.pop(document_id, None)
+
+    @traced("incremental_analyze")
+    def analyze(self, contract_text: str, document_id: Optional[str] = None,
+                base_document_id: Optional[str] = None) -> Dict:
+        """Analyze a contract, reusing the cached analysis of its previous version.
+
+        When the document has no cached version yet, base_document_id can name
+        another cached document (e.g. the template it was derived from) to diff
+        against instead. Returns the same structure as
+        analyze_contract_comprehensive() plus a "change_summary" describing what
+        was re-run and what was reused.
+        """
+        document_id = document_id or self.document_key(contract_text)
+        previous = self.get_snapshot(document_id)
+        if previous is None and base_document_id:
+            previous = self.get_snapshot(base_document_id)
+        record_cache("analysis_snapshots", previous is not None)
+
+        if previous is not None and previous["text"] == contract_text:
+            self.store_snapshot(document_id, previous)
+            result = dict(previous["result"])
+            result["change_summary"] = self._unchanged_summary(document_id, previous)
+            return result
+
+        analyzer = self.analyzer
+        document = segment_contract(contract_text)
+        segments = document.segment_texts()
+
+        # Re-scan risk terms only in segments that are new or edited
+        segment_terms, changed_regions = self._diff_segments(previous, document)
+        found_terms = set().union(*segment_terms) if segment_terms else set()
+
+        contract_type = analyzer.detect_contract_type(contract_text)
+        categories = [category for category in dict.fromkeys(analyzer.get_relevant_categories(contract_type))
+                      if category in analyzer.question_templates]
+
+        # Re-run QA only where the context fed to the model actually changed
+        sentences = document.sentences()
+        previous_contexts = previous["contexts"] if previous else {}
+        previous_results = previous["cuad_analysis"] if previous else {}
+
+        contexts = {}
+        cuad_results = {}
+        categories_rerun = []
+        categories_reused = []
+        forwards_run = 0
+        forwards_saved = 0
+        forwards_saved_early_exit = 0
+
+        for category in categories:
+            with span("select_relevant_context", category=category), time_stage("context_extraction"):
+                relevant_context = analyzer.select_relevant_context(sentences, contract_text, category)
+            contexts[category] = relevant_context
+            template_count = len(analyzer.templates_for(category, contract_type))
+
+            if previous_contexts.get(category) == relevant_context and category in previous_results:
+                cuad_results[category] = previous_results[category]
+                categories_reused.append(category)
+                forwards_saved += template_count
+            else:
+                cuad_results[category] = analyzer.answer_from_context(relevant_context, category,
+                                                                       contract_type=contract_type)
+                categories_rerun.append(category)
+                # forwards is bookkeeping for the metrics, not part of the stored result
+                forwards = cuad_results[category].pop("forwards")
+                forwards_run += forwards
+                forwards_saved_early_exit += template_count - forwards
+        FORWARDS_SAVED.observe(forwards_saved_early_exit)
+        # Reused results were calibrated when they were first computed
+        analyzer.calibrate_results({category: cuad_results[category] for category in categories_rerun})
+
+        with span("score_risk_terms"), time_stage("risk_scoring"):
+            risk_assessment = analyzer.score_risk_terms(found_terms, cuad_results)
+        optional_enhancement = analyzer.get_optional_enhancement(contract_text)
+        recommendations = analyzer.generate_recommendations(risk_assessment, contract_type)
+
+        result = {
+            "contract_type": contract_type,
+            "cuad_analysis": cuad_results,
+            "risk_assessment": risk_assessment,
+            "optional_enhancement": optional_enhancement,
+            "recommendations": recommendations,
+            "timestamp": datetime.now().isoformat(),
+            "primary_model": "YOUR_FINE_TUNED_ROBERTA_CUAD"
+        }
+
+        previous_terms = previous["found_terms"] if previous else set()
+        previous_score = previous["result"]["risk_assessment"].get("risk_score", 0) if previous else 0
+        change_summary = {
+            "document_id": document_id,
+            "previous_version_found": previous is not None,
+            "segments_total": len(segments),
+            "segments_changed": sum(region["new_segments"] for region in changed_regions),
+            "changed_regions": changed_regions,
+            "contract_type_changed": bool(previous) and previous["result"]["contract_type"] != contract_type,
+            "categories_rerun": categories_rerun,
+            "categories_reused": categories_reused,
+            "model_forwards_run": forwards_run,
+            "model_forwards_saved": forwards_saved,
+            "model_forwards_saved_early_exit": forwards_saved_early_exit,
+            "risk_terms_added": sorted(found_terms - previous_terms),
+            "risk_terms_removed": sorted(previous_terms - found_terms),
+            "risk_score_change": risk_assessment["risk_score"] - previous_score
+        }
+
+        self.store_snapshot(document_id, {
+            "text": contract_text,
+            "segments": segments,
+            "segment_terms": segment_terms,
+            "found_terms": found_terms,
+            "contexts": contexts,
+            "cuad_analysis": cuad_results,
+            "result": result
+        })
+
+        result = dict(result)
+        result["change_summary"] = change_summary
+        return result
+
+    def _diff_segments(self, previous: Optional[Dict], document):
+        """Diff the segments of the new document against the previous version.
+
+        Returns the risk terms found in each new segment (reused for unchanged
+        segments) and the list of changed regions with character offsets and
+        the clause each region starts in.
+        """
+        scan = self.analyzer.scan_risk_terms
+        segments = document.segment_texts()
+
+        if previous is None:
+            segment_terms = [scan(segment) for segment in segments]
+            new_length = sum(len(segment) for segment in segments)
+            changed_regions = [{
+                "type": "insert",
+                "old_start": 0, "old_end": 0,
+                "new_start": 0, "new_end": new_length,
+                "old_segments": 0, "new_segments": len(segments)
+            }] if segments else []
+            return segment_terms, changed_regions
+
+        old_segments = previous["segments"]
+        old_terms = previous["segment_terms"]
+        old_offsets = self._offsets(old_segments)
+        new_offsets = self._offsets(segments)
+
+        segment_terms = []
+        changed_regions = []
+        matcher = difflib.SequenceMatcher(None, old_segments, segments, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                segment_terms.extend(old_terms[i1:i2])
+                continue
+
+            segment_terms.extend(scan(segment) for segment in segments[j1:j2])
+            clause = document.clause_at(new_offsets[j1]) if j2 > j1 else None
+            changed_regions.append({
+                "type": tag,
+                "old_start": old_offsets[i1], "old_end": old_offsets[i2],
+                "new_start": new_offsets[j1], "new_end": new_offsets[j2],
+                "old_segments": i2 - i1, "new_segments": j2 - j1,
+                "clause": clause.title if clause else None,
+                "new_text": "".join(segments[j1:j2]).strip()
+            })
+
+        return segment_terms, changed_regions
+
+    @staticmethod
+    def _offsets(segments: List[str]) -> List[int]:
+        """Character offset of each segment start, plus the total length"""
+        offsets = [0]
+        for segment in segments:
+            offsets.append(offsets[-1] + len(segment))
+        return offsets
+
+    def _unchanged_summary(self, document_id: str, snapshot: Dict) -> Dict:
+        """Change summary for a resubmission of identical text"""
+        return {
+            "document_id": document_id,
+            "previous_version_found": True,
+            "segments_total": len(snapshot["segments"]),
+            "segments_changed": 0,
+            "changed_regions": [],
+            "contract_type_changed": False,
+            "categories_rerun": [],
+            "categories_reused": list(snapshot["cuad_analysis"].keys()),
+            "model_forwards_run": 0,
+            "model_forwards_saved": sum(len(self.analyzer.templates_for(category))
+                                        for category in snapshot["cuad_analysis"]),
+            "model_forwards_saved_early_exit": 0,
+            "risk_terms_added": [],
+            "risk_terms_removed": [],
+            "risk_score_change": 0
+        }
@@ -0,0 +1,402 @@
+"""
+HTTP Load Test Harness
+======================
+Asyncio load generator for the unified_app API. Virtual users replay a
+traffic mix from a JSONL file (one request type per line, with a weight) and
+the harness reports p50/p95/p99 latency, error rate and throughput per
+request type. No external services: contract bodies are synthesized locally
+and, with --start-server, the app runs against a local Groq stub.
+
+Mix file lines look like:
+
+    {"name": "analyze_single", "method": "POST", "path": "/api/analyze_single", "weight": 5,
+     "body": {"contract_text": {"$contract": {"clauses": 40, "type": "app_agreement"}}}}
+
+Body placeholders: {"$contract": {clauses, type, seed}} becomes a synthetic
+contract text (a fresh one per request unless seed is fixed), and
+{"$contracts": {count, clauses, type}} a list of {"name", "text"} contracts.
+
+    python load_test.py --start-server --random-model --users 50 --duration 60 --output load.json
+    python load_test.py --url http://localhost:5000 --mix load_test_mix.jsonl --requests 500
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from benchmark_pipeline import CONTRACT_TYPES, build_random_model, generate_contract, git_commit, summarize
+
+DEFAULT_MIX = Path(__file__).parent / "load_test_mix.jsonl"
+
+
+class GroqStub:
+    """Local stand-in for the Groq chat completions API.
+
+    Answers every model after `latency` seconds; a `busy_rate` share of calls
+    get 429 so the client's model fallback path is exercised too.
+    """
+
+    def __init__(self, latency: float = 0.2, busy_rate: float = 0.0, seed: int = 0):
+        stub = self
+        self.latency = latency
+        self.busy_rate = busy_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with stub._lock:
+                    stub.calls += 1
+                    busy = stub._random.random() < stub.busy_rate
+                time.sleep(stub.latency)
+                if busy:
+                    body, status = {"error": {"message": "Rate limit reached (stub)"}}, 429
+                else:
+                    body, status = stub.completion(payload), 200
+                encoded = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="groq-stub", daemon=True)
+
+    @staticmethod
+    def completion(payload: Dict) -> Dict:
+        content = ("HIGH RISK CLAUSES:\n- unlimited liability - exposure is not capped\n\n"
+                   "MEDIUM RISK CLAUSES:\n- automatic renewal - renews unless cancelled\n\n"
+                   "LOW RISK/SAFE CLAUSES:\n- 30 days notice - reasonable termination notice\n")
+        return {
+            "id": "stub-completion",
+            "object": "chat.completion",
+            "model": payload.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/openai/v1/chat/completions"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def load_mix(path: str) -> List[Dict]:
+    """Request types of a traffic mix file (JSONL; blank lines and // comments ignored)"""
+    mix = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("//"):
+                continue
+            entry = json.loads(line)
+            if "path" not in entry:
+                raise ValueError(f"{path}:{line_number}: every request needs a path")
+            entry.setdefault("name", entry["path"])
+            entry.setdefault("method", "POST" if "body" in entry else "GET")
+            entry.setdefault("weight", 1)
+            mix.append(entry)
+    if not any(entry["weight"] > 0 for entry in mix):
+        raise ValueError(f"{path}: no request type has a positive weight")
+    return mix
+
+
+class BodyFactory:
+    """Expands $contract / $contracts placeholders with synthetic contracts"""
+
+    def __init__(self, seed: int = 0):
+        self._seeds = itertools.count(seed)
+
+    def contract(self, spec: Dict) -> str:
+        seed = spec["seed"] if "seed" in spec else next(self._seeds)
+        contract_type = spec.get("type") or CONTRACT_TYPES[seed % len(CONTRACT_TYPES)]
+        return generate_contract(seed, spec.get("clauses", 40), contract_type)
+
+    def expand(self, value):
+        if isinstance(value, dict):
+            if set(value) == {"$contract"}:
+                return self.contract(value["$contract"])
+            if set(value) == {"$contracts"}:
+                spec = value["$contracts"]
+                return [{"name": f"Contract {index + 1}", "text": self.contract(spec)}
+                        for index in range(spec.get("count", 2))]
+            return {key: self.expand(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.expand(item) for item in value]
+        return value
+
+
+async def http_request(host: str, port: int, method: str, path: str, body: Optional[bytes],
+                       timeout: float) -> Tuple[int, bytes]:
+    """Minimal HTTP/1.1 client (one connection per request, read to EOF)"""
+    async def exchange():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            head = (f"{method} {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                    f"Connection: close\r\nAccept: application/json\r\n")
+            if body is not None:
+                head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            writer.write(head.encode("latin-1") + b"\r\n" + (body or b""))
+            await writer.drain()
+            return await reader.read()
+        finally:
+            writer.close()
+
+    raw = await asyncio.wait_for(exchange(), timeout)
+    status_line, _, rest = raw.partition(b"\r\n")
+    parts = status_line.split(b" ", 2)
+    if len(parts) < 2 or not parts[1].isdigit():
+        raise ConnectionError(f"Malformed response: {status_line[:80]!r}")
+    return int(parts[1]), rest.partition(b"\r\n\r\n")[2]
+
+
+class LoadTest:
+    def __init__(self, base_url: str, mix: List[Dict], users: int, duration: Optional[float],
+                 total_requests: Optional[int], ramp_up: float = 0.0, think_time: float = 0.0,
+                 timeout: float = 300.0, order: str = "weighted", seed: int = 0):
+        url = urlsplit(base_url)
+        self.host = url.hostname or "localhost"
+        self.port = url.port or 80
+        self.mix = mix
+        self.users = users
+        self.duration = duration
+        self.total_requests = total_requests
+        self.ramp_up = ramp_up
+        self.think_time = think_time
+        self.timeout = timeout
+        self.order = order
+        self.bodies = BodyFactory(seed)
+        self._random = random.Random(seed)
+        self._replay = itertools.cycle(mix)
+        self._issued = 0
+        self.samples = []
+
+    def next_request(self) -> Optional[Dict]:
+        if self.total_requests is not None and self._issued >= self.total_requests:
+            return None
+        if self.duration is not None and time.perf_counter() >= self._deadline:
+            return None
+        self._issued += 1
+        if self.order == "replay":
+            return next(self._replay)
+        return self._random.choices(self.mix, weights=[entry["weight"] for entry in self.mix])[0]
+
+    async def user(self, index: int):
+        if self.ramp_up:
+            await asyncio.sleep(self.ramp_up * index / self.users)
+        while True:
+            entry = self.next_request()
+            if entry is None:
+                return
+            body = None
+            if "body" in entry:
+                body = json.dumps(self.bodies.expand(entry["body"])).encode()
+            start = time.perf_counter()
+            try:
+                status, _ = await http_request(self.host, self.port, entry["method"], entry["path"], body, self.timeout)
+                error = None if status < 400 else f"HTTP {status}"
+            except asyncio.TimeoutError:
+                status, error = None, "timeout"
+            except (OSError, ConnectionError) as e:
+                status, error = None, type(e).__name__
+            self.samples.append({"name": entry["name"], "start": start, "seconds": time.perf_counter() - start,
+                                 "status": status, "error": error})
+            if self.think_time:
+                await asyncio.sleep(self._random.expovariate(1 / self.think_time))
+
+    async def run(self) -> Dict:
+        self._deadline = time.perf_counter() + (self.duration or 0)
+        started = time.perf_counter()
+        await asyncio.gather(*(self.user(index) for index in range(self.users)))
+        elapsed = time.perf_counter() - started
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> Dict:
+        def describe(samples):
+            errors = [sample for sample in samples if sample["error"]]
+            error_kinds = {}
+            for sample in errors:
+                error_kinds[sample["error"]] = error_kinds.get(sample["error"], 0) + 1
+            return {
+                "requests": len(samples),
+                "errors": len(errors),
+                "error_rate": round(len(errors) / len(samples), 4) if samples else 0.0,
+                "error_kinds": error_kinds,
+                "throughput_rps": round(len(samples) / elapsed, 3) if elapsed else 0.0,
+                "latency": summarize([sample["seconds"] for sample in samples]),
+                "success_latency": summarize([sample["seconds"] for sample in samples if not sample["error"]])
+            }
+
+        by_name = {}
+        for sample in self.samples:
+            by_name.setdefault(sample["name"], []).append(sample)
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "overall": describe(self.samples),
+            "endpoints": {name: describe(samples) for name, samples in sorted(by_name.items())}
+        }
+
+
+def start_app(port: int, env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    """Run unified_app without the debug reloader, logging to a file"""
+    log = open(log_path, "w")
+    return subprocess.Popen([sys.executable, "unified_app.py"], cwd=Path(__file__).parent,
+                            env={**os.environ, **env, "PORT": str(port), "FLASK_DEBUG": "0"},
+                            stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(host: str, port: int, timeout: float, process: Optional[subprocess.Popen] = None) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            status, body = await http_request(host, port, "GET", "/api/ready", None, 5)
+            if status == 200:
+                return True
+            if status == 404:
+                return True  # server without readiness probe
+            if json.loads(body or b"{}").get("model_status", {}).get("state") == "failed":
+                return False
+        except (OSError, ConnectionError, asyncio.TimeoutError, ValueError):
+            pass
+        await asyncio.sleep(1)
+    return False
+
+
+def print_report(report: Dict):
+    print(f"\n{'endpoint':24s} {'reqs':>6s} {'err%':>6s} {'rps':>8s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}")
+    rows = list(report["endpoints"].items()) + [("ALL", report["overall"])]
+    for name, stats in rows:
+        latency = stats["latency"]
+        print(f"{name:24s} {stats['requests']:6d} {stats['error_rate'] * 100:6.1f} {stats['throughput_rps']:8.2f} "
+              f"{latency.get('p50_ms', 0):9.1f} {latency.get('p95_ms', 0):9.1f} {latency.get('p99_ms', 0):9.1f}")
+    kinds = report["overall"]["error_kinds"]
+    if kinds:
+        print("errors: " + ", ".join(f"{kind} x{count}" for kind, count in sorted(kinds.items())))
+
+
+async def main_async(args) -> Dict:
+    mix = load_mix(args.mix)
+    meta = {
+        "timestamp": datetime.now().isoformat(),
+        "git_commit": git_commit(),
+        "mix": args.mix,
+        "users": args.users,
+        "duration": args.duration,
+        "requests": args.requests,
+        "think_time": args.think_time,
+        "order": args.order,
+        "seed": args.seed
+    }
+
+    if not args.start_server:
+        url = urlsplit(args.url)
+        if not await wait_ready(url.hostname, url.port or 80, args.ready_timeout):
+            raise SystemExit(f"❌ {args.url} is not ready")
+        report = await LoadTest(args.url, mix, args.users, args.duration, args.requests, args.ramp_up,
+                                args.think_time, args.timeout, args.order, args.seed).run()
+        return {"meta": meta, **report}
+
+    with tempfile.TemporaryDirectory() as work_dir, GroqStub(args.groq_latency, args.groq_busy_rate, args.seed) as stub:
+        env = {
+            "GROQ_BASE_URL": stub.url,
+            "GROQ_API_KEY": "stub-key",
+            "GROQ_API_KEY_CREATION": "stub-key",
+            "ANALYSIS_STORE_PATH": os.path.join(work_dir, "analysis_store.db"),
+            # Trace like production unless the caller turned tracing off
+            "TRACING_ENABLED": os.getenv("TRACING_ENABLED", "1"),
+            "TRACE_LOG_PATH": os.path.join(work_dir, "traces.jsonl"),
+            "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING")
+        }
+        if args.random_model:
+            model_dir = os.path.join(work_dir, "model")
+            os.makedirs(model_dir)
+            build_random_model(model_dir, args.model_size, args.seed)
+            env["MODEL_PATH"] = model_dir
+        log_path = args.server_log or os.path.join(work_dir, "server.log")
+        process = start_app(args.port, env, log_path)
+        try:
+            print(f"⏳ Starting unified_app on port {args.port} (Groq stub at {stub.url})...")
+            if not await wait_ready("127.0.0.1", args.port, args.ready_timeout, process):
+                with open(log_path) as f:
+                    print(f.read()[-3000:])
+                raise SystemExit("❌ Server did not become ready")
+            print(f"✅ Server ready; running {args.users} users")
+            report = await LoadTest(f"http://127.0.0.1:{args.port}", mix, args.users, args.duration, args.requests,
+                                    args.ramp_up, args.think_time, args.timeout, args.order, args.seed).run()
+        finally:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        meta["groq_stub"] = {"latency": args.groq_latency, "busy_rate": args.groq_busy_rate, "calls": stub.calls}
+        meta["model"] = "random_init:" + args.model_size if args.random_model else "MODEL_PATH or ./"
+        return {"meta": meta, **report}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the contract analysis API")
+    parser.add_argument("--mix", default=str(DEFAULT_MIX), help="Traffic mix JSONL file")
+    parser.add_argument("--url", default="http://localhost:5000", help="Target server (ignored with --start-server)")
+    parser.add_argument("--users", type=int, default=50, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, help="Seconds to run (default 60 unless --requests is given)")
+    parser.add_argument("--requests", type=int, help="Total requests to send")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Seconds over which users start")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean pause between a user's requests")
+    parser.add_argument("--order", choices=["weighted", "replay"], default="weighted",
+                        help="Pick request types by weight, or cycle through the file in order")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start-server", action="store_true", help="Launch unified_app with a local Groq stub")
+    parser.add_argument("--port", type=int, default=5055, help="Port for --start-server")
+    parser.add_argument("--random-model", action="store_true",
+                        help="With --start-server, serve a random-init RoBERTa (offline, no weights needed)")
+    parser.add_argument("--model-size", default="small", help="Size of the --random-model model")
+    parser.add_argument("--groq-latency", type=float, default=0.2, help="Seconds the Groq stub takes per call")
+    parser.add_argument("--groq-busy-rate", type=float, default=0.0, help="Share of Groq stub calls answered 429")
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--server-log", help="Keep the started server's output in this file")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+    if args.duration is None and args.requests is None:
+        args.duration = 60.0
+
+    result = asyncio.run(main_async(args))
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Pipeline Metrics
+================
+Prometheus-style counters, gauges and histograms for the analysis pipeline,
+rendered in the text exposition format by the /metrics endpoint. Dependency
+free: recording a sample is a dict lookup, a bisect and two additions under a
+lock, so instrumenting the hot path costs microseconds per request.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans tokenizer calls (sub-millisecond) to full CPU analyses and Groq calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(self.name, _label_text(self.labelnames, key), value) for key, value in values]
+
+
+class Gauge(_Metric):
+    """Gauge set directly, or computed at scrape time from a callback"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        if self.callback is not None:
+            try:
+                value = self.callback()
+            except Exception:
+                return []
+            return [] if value is None else [(self.name, "", value)]
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(self.name, _label_text(self.labelnames, key), value) for key, value in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (last one is +Inf), sum]
+        self._series = {}
+        self._recorders = []
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+            for recorder in self._recorders:
+                recorder.setdefault(key, []).append(value)
+
+    @contextmanager
+    def record_samples(self):
+        """Collect raw observations while active (benchmarks need exact percentiles).
+
+        Yields a dict mapping label values (a tuple, in labelnames order) to the
+        list of values observed.
+        """
+        recorder = {}
+        with self._lock:
+            self._recorders.append(recorder)
+        try:
+            yield recorder
+        finally:
+            with self._lock:
+                self._recorders.remove(recorder)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def total(self, **labels) -> float:
+        series = self._series.get(self._key(labels))
+        return series[1] if series else 0.0
+
+    def samples(self):
+        with self._lock:
+            snapshot = sorted((key, list(series[0]), series[1]) for key, series in self._series.items())
+        samples = []
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                samples.append((f"{self.name}_bucket", _label_text(self.labelnames, key, le), cumulative))
+            labels = _label_text(self.labelnames, key)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "contract_stage_seconds",
+    "Latency of analysis pipeline stages",
+    ["stage"]))
+BATCH_SIZE = registry.register(Histogram(
+    "contract_batch_size",
+    "Items per batch (model forwards and batch analysis requests)",
+    ["kind"], buckets=BATCH_BUCKETS))
+CACHE_LOOKUPS = registry.register(Counter(
+    "contract_cache_lookups_total",
+    "Cache lookups by cache and result (hit or miss)",
+    ["cache", "result"]))
+GROQ_CALLS = registry.register(Counter(
+    "contract_groq_calls_total",
+    "Groq API calls by caller, model and outcome",
+    ["caller", "model", "outcome"]))
+HTTP_REQUESTS = registry.register(Counter(
+    "contract_http_requests_total",
+    "HTTP requests by endpoint and status code",
+    ["endpoint", "status"]))
+HTTP_SECONDS = registry.register(Histogram(
+    "contract_http_request_seconds",
+    "HTTP request latency by endpoint",
+    ["endpoint"]))
+IN_FLIGHT = registry.register(Gauge(
+    "contract_http_requests_in_flight",
+    "Requests currently being handled (the server's queue depth)"))
+TEMPLATE_FORWARDS = registry.register(Counter(
+    "contract_template_forwards_total",
+    "Question template forwards by category and outcome (run, or skipped by early exit)",
+    ["category", "outcome"]))
+TEMPLATE_OUTCOMES = registry.register(Counter(
+    "contract_template_outcomes_total",
+    "Question template answers by category, contract type, template index and outcome (run, or won)",
+    ["category", "contract_type", "template", "outcome"]))
+TEMPLATE_GAIN = registry.register(Counter(
+    "contract_template_marginal_gain_total",
+    "Confidence the winning template added over the best other template run (sum / won = average)",
+    ["category", "contract_type", "template"]))
+FORWARDS_SAVED = registry.register(Histogram(
+    "contract_forwards_saved",
+    "Template forwards skipped by early exit per analyzed contract (sum / count = average)",
+    buckets=BATCH_BUCKETS))
+MODEL_MEMORY = registry.register(Gauge(
+    "contract_model_memory_bytes",
+    "Memory held by the loaded model's parameters and buffers",
+    ["model"]))
+
+
+class time_stage:
+    """Context manager recording the wall time of a pipeline stage:
+
+        with time_stage("tokenization"):
+            ...
+    """
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, stage=self.stage)
+        return False
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def resident_memory_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux /proc; falls back to the peak from resource)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return None
+
+
+registry.register(Gauge(
+    "process_resident_memory_bytes",
+    "Resident memory of the server process",
+    callback=resident_memory_bytes))
@@ -0,0 +1,88 @@
+"""
+Deferred Model Initialization
+=============================
+Loads YOUR fine-tuned model on a background thread so the web server can
+bind and answer health checks immediately. Exposes a thread-safe readiness
+state (not_started -> loading -> ready | failed) for endpoints and probes.
+"""
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+NOT_STARTED = "not_started"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class ModelInitializer:
+    def __init__(self, load_function: Callable[[], None], name: str = "model"):
+        """Run load_function once in the background; it should raise on failure"""
+        self.load_function = load_function
+        self.name = name
+        self.state = NOT_STARTED
+        self.error = None
+        self.started_at = None
+        self.ready_at = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self) -> bool:
+        """Begin loading (no-op while loading or once ready; retries after a failure)"""
+        with self._lock:
+            if self.state in (LOADING, READY):
+                return False
+            self.state = LOADING
+            self.error = None
+            self.started_at = time.time()
+            self.ready_at = None
+            self._done.clear()
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-loader", daemon=True)
+            self._thread.start()
+            return True
+
+    def load_now(self):
+        """Load synchronously on the calling thread (scripts and tests)"""
+        if self.start():
+            self._thread.join()
+        else:
+            self._done.wait()
+
+    def _run(self):
+        try:
+            self.load_function()
+        except Exception as e:
+            traceback.print_exc()
+            with self._lock:
+                self.state = FAILED
+                self.error = str(e)
+            print(f"❌ {self.name} failed to load: {e}")
+        else:
+            with self._lock:
+                self.state = READY
+                self.ready_at = time.time()
+            print(f"✅ {self.name} ready after {self.ready_at - self.started_at:.1f}s")
+        finally:
+            self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until loading finishes; True if the model is ready"""
+        self._done.wait(timeout)
+        return self.is_ready
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == READY
+
+    def status(self) -> Dict:
+        with self._lock:
+            status = {"state": self.state, "error": self.error}
+            if self.started_at:
+                status["started_at"] = datetime.fromtimestamp(self.started_at).isoformat()
+                finished = self.ready_at or (time.time() if self.state == LOADING else None)
+                if finished:
+                    status["load_seconds"] = round(finished - self.started_at, 2)
+            return status
@@ -0,0 +1,169 @@
+"""
+Memory-Mapped Model Weights
+===========================
+Fast startup path for YOUR fine-tuned RoBERTa model. The checkpoint is
+converted once to safetensors, then every process maps that file read-only
+and builds its tensors directly on the mapping: no weight copy, no random
+initialization, and all workers share the same page-cache pages.
+"""
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import torch
+from transformers import RobertaConfig, RobertaForQuestionAnswering
+
+SAFETENSORS_NAME = "model.safetensors"
+PYTORCH_NAME = "pytorch_model.bin"
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+    "U8": torch.uint8, "BOOL": torch.bool
+}
+
+
+def weights_cache_dir(model_path: str) -> Path:
+    """Where converted weights live: WEIGHTS_CACHE_DIR, the model directory, or a temp directory"""
+    configured = os.getenv("WEIGHTS_CACHE_DIR")
+    if configured:
+        return Path(configured)
+    if os.access(model_path, os.W_OK):
+        return Path(model_path)
+    return Path(tempfile.gettempdir()) / "contract_platform_weights"
+
+
+def converted_weights_path(model_path: str) -> Optional[Path]:
+    """safetensors file for a model directory, converting pytorch_model.bin on first use"""
+    existing = Path(model_path) / SAFETENSORS_NAME
+    if existing.exists():
+        return existing
+
+    checkpoint = Path(model_path) / PYTORCH_NAME
+    if not checkpoint.exists():
+        return None
+
+    stat = checkpoint.stat()
+    cache_dir = weights_cache_dir(model_path)
+    if cache_dir == Path(model_path):
+        target = cache_dir / SAFETENSORS_NAME
+    else:
+        key = hashlib.sha256(f"{checkpoint.resolve()}:{stat.st_size}:{stat.st_mtime}".encode()).hexdigest()[:16]
+        target = cache_dir / f"{key}.safetensors"
+    if target.exists() and target.stat().st_mtime >= stat.st_mtime:
+        return target
+
+    from safetensors.torch import save_file
+
+    print(f"Converting {checkpoint} to memory-mappable safetensors (one-time)...")
+    start = time.time()
+    state_dict = torch.load(checkpoint, map_location="cpu", weights_only=True)
+    # safetensors refuses shared storage; contiguous copies also make every tensor mappable
+    state_dict = {name: tensor.contiguous().clone() for name, tensor in state_dict.items()}
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # Write then rename, so concurrently starting workers never map a half-written file
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    os.close(fd)
+    try:
+        save_file(state_dict, temp_path, metadata={"format": "pt"})
+        os.replace(temp_path, target)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    print(f"✅ Weights converted in {time.time() - start:.1f}s: {target}")
+    return target
+
+
+def map_safetensors(path: Path) -> Dict[str, torch.Tensor]:
+    """Tensors of a safetensors file, backed by a read-only shared mapping of it.
+
+    Pages are loaded on first touch and shared through the page cache with
+    every other process mapping the same file.
+    """
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+
+    file_size = os.path.getsize(path)
+    storage = torch.UntypedStorage.from_file(str(path), shared=False, nbytes=file_size)
+    data_start = 8 + header_size
+
+    tensors = {}
+    for name, info in header.items():
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        item_size = torch.empty((), dtype=dtype).element_size()
+        offset = data_start + begin
+        if offset % item_size:
+            # Unaligned tensor (not produced by our converter): copy it out
+            buffer = storage[offset:data_start + end]
+            tensors[name] = torch.frombuffer(bytearray(bytes(buffer)), dtype=dtype).reshape(info["shape"])
+            continue
+        tensor = torch.empty(0, dtype=dtype)
+        tensor.set_(storage, offset // item_size, torch.Size(info["shape"]))
+        tensors[name] = tensor
+    return tensors
+
+
+def _materialize_buffers(model: torch.nn.Module):
+    """Recreate non-persistent buffers that are not part of the checkpoint"""
+    for module_name, module in model.named_modules():
+        for buffer_name, buffer in list(module.named_buffers(recurse=False)):
+            if not buffer.is_meta:
+                continue
+            if buffer_name == "position_ids":
+                value = torch.arange(buffer.shape[-1]).expand(buffer.shape)
+            elif buffer_name == "token_type_ids":
+                value = torch.zeros(buffer.shape, dtype=torch.long)
+            else:
+                raise ValueError(f"Buffer {module_name}.{buffer_name} missing from checkpoint")
+            module.register_buffer(buffer_name, value, persistent=False)
+
+
+def weights_version(model_path: str) -> Optional[str]:
+    """Short fingerprint of the original checkpoint (file name, size and mtime), without reading it"""
+    for name in (PYTORCH_NAME, SAFETENSORS_NAME):
+        path = Path(model_path) / name
+        if path.exists():
+            stat = path.stat()
+            return hashlib.sha256(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:12]
+    return None
+
+
+def load_qa_model(model_path: str) -> RobertaForQuestionAnswering:
+    """YOUR fine-tuned QA model with weights memory-mapped from safetensors.
+
+    The model skeleton is built on the meta device, so no time is spent on
+    random initialization, and parameters are then pointed at the mapped
+    tensors. Falls back to from_pretrained when no local checkpoint exists
+    (e.g. a hub model id) or mapping fails.
+    """
+    start = time.time()
+    try:
+        # Conversion needs safetensors and a loadable checkpoint; any failure falls back below
+        weights_path = converted_weights_path(model_path) if os.path.isdir(model_path) else None
+        if weights_path is not None:
+            config = RobertaConfig.from_pretrained(model_path)
+            with torch.device("meta"):
+                model = RobertaForQuestionAnswering(config)
+            state_dict = map_safetensors(weights_path)
+            missing, unexpected = model.load_state_dict(state_dict, strict=False, assign=True)
+            missing = [name for name in missing if not name.endswith(("position_ids", "token_type_ids"))]
+            if missing:
+                raise ValueError(f"Checkpoint is missing weights: {missing[:5]}")
+            _materialize_buffers(model)
+            model.eval()
+    except Exception as e:
+        print(f"⚠️  Memory-mapped load failed ({e}), falling back to from_pretrained")
+        return RobertaForQuestionAnswering.from_pretrained(model_path)
+    if weights_path is None:
+        return RobertaForQuestionAnswering.from_pretrained(model_path)
+
+    print(f"✅ Weights memory-mapped in {time.time() - start:.2f}s ({weights_path.name})")
+    return model
@@ -0,0 +1,172 @@
+"""
+Near-Duplicate Contract Detection
+=================================
+MinHash signatures over word shingles plus a banded LSH index, so an
+incoming contract is matched against every previously analyzed contract in
+sub-linear time. Used to reuse prior analyses of near-identical agreements
+and to cluster duplicates in batch reports.
+"""
+import re
+import threading
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9$%]+")
+
+# Mersenne prime 2^31 - 1 keeps a * x + b inside uint64 for 31-bit a, b, x
+MERSENNE_PRIME = (1 << 31) - 1
+# Shingle hashes are processed in blocks to bound peak memory on long contracts
+HASH_BLOCK_SIZE = 4096
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 42):
+        """MinHash over word k-shingles with num_perm universal hash functions"""
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self._b = generator.randint(0, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+
+    def shingle_hashes(self, text: str) -> np.ndarray:
+        """Distinct 31-bit hashes of the word shingles of a text"""
+        tokens = TOKEN_RE.findall(text.lower())
+        k = self.shingle_size
+        if len(tokens) <= k:
+            shingles = [' '.join(tokens)]
+        else:
+            shingles = {' '.join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        return hashes % np.uint64(MERSENNE_PRIME)
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature (num_perm,) of a text"""
+        hashes = self.shingle_hashes(text)
+        signature = np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        prime = np.uint64(MERSENNE_PRIME)
+        for block_start in range(0, len(hashes), HASH_BLOCK_SIZE):
+            block = hashes[block_start:block_start + HASH_BLOCK_SIZE]
+            values = (np.outer(self._a, block) + self._b[:, None]) % prime
+            np.minimum(signature, values.min(axis=1), out=signature)
+        return signature
+
+    @staticmethod
+    def similarity(signature_a: np.ndarray, signature_b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of the underlying shingle sets"""
+        return float(np.count_nonzero(signature_a == signature_b)) / len(signature_a)
+
+
+class NearDuplicateIndex:
+    def __init__(self, num_perm: int = 128, bands: int = 16, threshold: float = 0.8, shingle_size: int = 5):
+        """Banded LSH index over MinHash signatures.
+
+        With 16 bands of 8 rows, pairs above ~0.7 Jaccard similarity collide
+        in at least one band with high probability; candidates are then
+        verified against the full signature and the threshold.
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self._signatures = {}
+        self._buckets = [defaultdict(set) for _ in range(bands)]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._signatures
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def add(self, key: str, text: Optional[str] = None, signature: Optional[np.ndarray] = None) -> np.ndarray:
+        """Index a contract under key (text or a precomputed signature)"""
+        if signature is None:
+            signature = self.hasher.signature(text)
+        with self._lock:
+            if key in self._signatures:
+                self._remove(key)
+            self._signatures[key] = signature
+            for band, band_key in enumerate(self._band_keys(signature)):
+                self._buckets[band][band_key].add(key)
+        return signature
+
+    def remove(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: str):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, band_key in enumerate(self._band_keys(signature)):
+            bucket = self._buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band][band_key]
+
+    def query(self, text: Optional[str] = None, signature: Optional[np.ndarray] = None,
+              threshold: Optional[float] = None, exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Near-duplicates of a contract as (key, estimated similarity), best first"""
+        if signature is None:
+            signature = self.hasher.signature(text)
+        threshold = self.threshold if threshold is None else threshold
+
+        with self._lock:
+            candidates = set()
+            for band, band_key in enumerate(self._band_keys(signature)):
+                candidates.update(self._buckets[band].get(band_key, ()))
+            candidates.discard(exclude)
+            scored = [(key, self.hasher.similarity(signature, self._signatures[key])) for key in candidates]
+
+        matches = [(key, similarity) for key, similarity in scored if similarity >= threshold]
+        matches.sort(key=lambda match: -match[1])
+        return matches
+
+    def best_match(self, text: Optional[str] = None, signature: Optional[np.ndarray] = None,
+                   exclude: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        matches = self.query(text, signature, exclude=exclude)
+        return matches[0] if matches else None
+
+
+def cluster_duplicates(pairs: List[Tuple[str, str, float]], keys: List[str]) -> List[Dict]:
+    """Group keys connected by near-duplicate pairs (union-find).
+
+    Returns only clusters with more than one member, each listing its members
+    in input order with the strongest similarity seen for that member.
+    """
+    parent = {key: key for key in keys}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    best_similarity = defaultdict(float)
+    for key_a, key_b, similarity in pairs:
+        if key_a not in parent or key_b not in parent:
+            continue
+        root_a, root_b = find(key_a), find(key_b)
+        if root_a != root_b:
+            parent[root_b] = root_a
+        best_similarity[key_a] = max(best_similarity[key_a], similarity)
+        best_similarity[key_b] = max(best_similarity[key_b], similarity)
+
+    clusters = defaultdict(list)
+    for key in keys:
+        clusters[find(key)].append(key)
+
+    return [{
+        "members": [{"key": key, "similarity": round(best_similarity[key], 3)} for key in members],
+        "size": len(members)
+    } for members in clusters.values() if len(members) > 1]
@@ -0,0 +1,308 @@
+"""
+Portfolio Risk Analytics
+========================
+Aggregates across every stored analysis: risk levels per contract type,
+counterparty and governing law, the most common risk findings and per-category
+confidence histograms. Aggregates are updated in the same transaction that
+stores each analysis and mirrored in memory, so dashboards read them without
+rescanning results. Every aggregate write bumps a version row; reads reload
+the mirror when it moved, so workers sharing the database (other processes,
+other apps) never serve stale totals. Only the latest analysis of each
+document is counted.
+"""
+import json
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from analysis_store import AnalysisStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS portfolio_risk_counts (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    overall_risk TEXT NOT NULL,
+    contracts INTEGER NOT NULL DEFAULT 0,
+    risk_score_total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, key, overall_risk)
+);
+CREATE TABLE IF NOT EXISTS portfolio_risk_items (
+    level TEXT NOT NULL,
+    item TEXT NOT NULL,
+    contracts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (level, item)
+);
+CREATE TABLE IF NOT EXISTS portfolio_confidence (
+    category TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    answers INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (category, bucket)
+);
+CREATE TABLE IF NOT EXISTS portfolio_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+DIMENSIONS = ["portfolio", "contract_type", "counterparty", "governing_law"]
+RISK_LEVELS = ["HIGH", "MEDIUM", "LOW"]
+RISK_ITEM_LEVELS = {"high_risk": "high", "medium_risk": "medium", "red_flags": "red_flag"}
+CONFIDENCE_BUCKETS = 10
+UNKNOWN = "unknown"
+
+
+def confidence_bucket(confidence: Optional[float]) -> int:
+    """Histogram bucket (0-9) of a confidence in [0, 1]"""
+    confidence = min(max(confidence or 0.0, 0.0), 1.0)
+    return min(int(confidence * CONFIDENCE_BUCKETS), CONFIDENCE_BUCKETS - 1)
+
+
+class PortfolioAggregator:
+    def __init__(self, store: AnalysisStore):
+        """Attach to a store: aggregates are kept in its database and updated on every new analysis"""
+        self.store = store
+        self._lock = threading.Lock()
+        self._risk_counts = {}   # (dimension, key, overall_risk) -> [contracts, risk_score_total]
+        self._risk_items = {}    # (level, item) -> contracts
+        self._confidence = {}    # (category, bucket) -> answers
+        self._contracts = 0
+        self._version = None     # aggregate version the mirror reflects; None forces a reload
+
+        with store.connection() as conn:
+            conn.executescript(SCHEMA)
+        if self._counted_documents() != self._stored_documents():
+            print("Portfolio aggregates out of date, rebuilding from the analysis store...")
+            self.rebuild()
+        else:
+            self._load()
+
+        store.add_listener(self._apply_in_transaction, on_commit=self._apply_in_memory)
+
+    # ---- maintenance ----
+
+    def _stored_documents(self) -> int:
+        return self.store.connection().execute("SELECT COUNT(DISTINCT document_id) FROM analyses").fetchone()[0]
+
+    def _stored_version(self) -> int:
+        row = self.store.connection().execute("SELECT value FROM portfolio_meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    def _counted_documents(self) -> int:
+        row = self.store.connection().execute("SELECT value FROM portfolio_meta WHERE key = 'documents'").fetchone()
+        return row[0] if row else 0
+
+    def rebuild(self) -> Dict:
+        """Recompute every aggregate from the latest stored analysis of each document"""
+        with self.store.transaction() as conn:
+            for table in ("portfolio_risk_counts", "portfolio_risk_items", "portfolio_confidence"):
+                conn.execute(f"DELETE FROM {table}")
+            # The version keeps counting up, so other workers notice the rebuild
+            conn.execute("DELETE FROM portfolio_meta WHERE key != 'version'")
+            latest_ids = [row[0] for row in conn.execute("SELECT MAX(id) FROM analyses GROUP BY document_id")]
+            deltas = self._empty_deltas()
+            for analysis_id in latest_ids:
+                self._add_contribution(deltas, self._contribution(conn, analysis_id), 1)
+            self._write_deltas(conn, deltas)
+        self._load()
+        return {"documents": len(latest_ids)}
+
+    def _load(self):
+        """Refresh the in-memory mirror from the aggregate tables"""
+        conn = self.store.connection()
+        # Read the version first: a write landing mid-load only causes one more reload later
+        version = self._stored_version()
+        risk_counts = {(row[0], row[1], row[2]): [row[3], row[4]] for row in conn.execute(
+            "SELECT dimension, key, overall_risk, contracts, risk_score_total FROM portfolio_risk_counts WHERE contracts > 0")}
+        risk_items = {(row[0], row[1]): row[2] for row in conn.execute(
+            "SELECT level, item, contracts FROM portfolio_risk_items WHERE contracts > 0")}
+        confidence = {(row[0], row[1]): row[2] for row in conn.execute(
+            "SELECT category, bucket, answers FROM portfolio_confidence WHERE answers > 0")}
+        with self._lock:
+            self._risk_counts = risk_counts
+            self._risk_items = risk_items
+            self._confidence = confidence
+            self._contracts = self._counted_documents()
+            self._version = version
+
+    def _refresh(self):
+        """Reload the mirror if any connection, in any process, changed the aggregates since"""
+        if self._stored_version() != self._version:
+            self._load()
+
+    # ---- incremental updates ----
+
+    @staticmethod
+    def _empty_deltas() -> Dict:
+        return {
+            "risk_counts": defaultdict(lambda: [0, 0]),
+            "risk_items": defaultdict(int),
+            "confidence": defaultdict(int),
+            "documents": 0
+        }
+
+    @staticmethod
+    def _contribution(conn: sqlite3.Connection, analysis_id: int) -> Dict:
+        """What one stored analysis adds to the aggregates"""
+        row = conn.execute(
+            """SELECT contract_type, counterparty, governing_law, overall_risk, risk_score, result_json
+               FROM analyses WHERE id = ?""", (analysis_id,)
+        ).fetchone()
+        contract_type, counterparty, governing_law, overall_risk, risk_score, result_json = row
+        risk_assessment = json.loads(result_json).get('risk_assessment', {})
+        keys = {
+            "portfolio": "all",
+            "contract_type": contract_type or UNKNOWN,
+            "counterparty": counterparty or UNKNOWN,
+            "governing_law": governing_law or UNKNOWN
+        }
+        return {
+            "risk": [(dimension, keys[dimension], overall_risk or "LOW", risk_score or 0) for dimension in DIMENSIONS],
+            "items": {(level, item) for field, level in RISK_ITEM_LEVELS.items()
+                      for item in risk_assessment.get(field, [])},
+            "confidences": [(category, confidence_bucket(confidence)) for category, confidence in conn.execute(
+                "SELECT category, confidence FROM category_answers WHERE analysis_id = ?", (analysis_id,))]
+        }
+
+    @staticmethod
+    def _add_contribution(deltas: Dict, contribution: Dict, sign: int):
+        for dimension, key, overall_risk, risk_score in contribution["risk"]:
+            entry = deltas["risk_counts"][(dimension, key, overall_risk)]
+            entry[0] += sign
+            entry[1] += sign * risk_score
+        for item in contribution["items"]:
+            deltas["risk_items"][item] += sign
+        for bucket in contribution["confidences"]:
+            deltas["confidence"][bucket] += sign
+        deltas["documents"] += sign
+
+    @staticmethod
+    def _write_deltas(conn: sqlite3.Connection, deltas: Dict):
+        conn.executemany(
+            """INSERT INTO portfolio_risk_counts (dimension, key, overall_risk, contracts, risk_score_total)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(dimension, key, overall_risk) DO UPDATE SET
+                   contracts = contracts + excluded.contracts,
+                   risk_score_total = risk_score_total + excluded.risk_score_total""",
+            [(*key, contracts, score) for key, (contracts, score) in deltas["risk_counts"].items() if contracts or score]
+        )
+        conn.executemany(
+            """INSERT INTO portfolio_risk_items (level, item, contracts) VALUES (?, ?, ?)
+               ON CONFLICT(level, item) DO UPDATE SET contracts = contracts + excluded.contracts""",
+            [(*key, count) for key, count in deltas["risk_items"].items() if count]
+        )
+        conn.executemany(
+            """INSERT INTO portfolio_confidence (category, bucket, answers) VALUES (?, ?, ?)
+               ON CONFLICT(category, bucket) DO UPDATE SET answers = answers + excluded.answers""",
+            [(*key, count) for key, count in deltas["confidence"].items() if count]
+        )
+        conn.execute(
+            """INSERT INTO portfolio_meta (key, value) VALUES ('documents', ?)
+               ON CONFLICT(key) DO UPDATE SET value = value + excluded.value""",
+            (deltas["documents"],)
+        )
+        conn.execute(
+            """INSERT INTO portfolio_meta (key, value) VALUES ('version', 1)
+               ON CONFLICT(key) DO UPDATE SET value = value + 1"""
+        )
+
+    def _apply_in_transaction(self, conn: sqlite3.Connection, record: Dict):
+        """Store listener: swap the document's previous contribution for the new analysis"""
+        deltas = self._empty_deltas()
+        previous = conn.execute(
+            "SELECT MAX(id) FROM analyses WHERE document_id = ? AND id < ?", (record["document_id"], record["id"])
+        ).fetchone()[0]
+        if previous is not None:
+            self._add_contribution(deltas, self._contribution(conn, previous), -1)
+        self._add_contribution(deltas, self._contribution(conn, record["id"]), 1)
+        self._write_deltas(conn, deltas)
+        deltas["version"] = conn.execute("SELECT value FROM portfolio_meta WHERE key = 'version'").fetchone()[0]
+        record["portfolio_deltas"] = deltas
+
+    def _apply_in_memory(self, record: Dict):
+        """Commit callback: apply the same deltas to the in-memory mirror"""
+        deltas = record.pop("portfolio_deltas", None)
+        if deltas is None:
+            return
+        with self._lock:
+            if self._version != deltas["version"] - 1:
+                # Another writer got in between; the next read reloads from the tables
+                self._version = None
+                return
+            self._version = deltas["version"]
+            for key, (contracts, score) in deltas["risk_counts"].items():
+                entry = self._risk_counts.setdefault(key, [0, 0])
+                entry[0] += contracts
+                entry[1] += score
+                if entry[0] <= 0:
+                    del self._risk_counts[key]
+            for table, changes in ((self._risk_items, deltas["risk_items"]), (self._confidence, deltas["confidence"])):
+                for key, count in changes.items():
+                    table[key] = table.get(key, 0) + count
+                    if table[key] <= 0:
+                        del table[key]
+            self._contracts += deltas["documents"]
+
+    # ---- reads ----
+
+    def risk_breakdown(self, dimension: str) -> Dict[str, Dict]:
+        """Risk level counts and average risk score per key of a dimension"""
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension: {dimension}")
+        self._refresh()
+        breakdown = {}
+        with self._lock:
+            for (entry_dimension, key, overall_risk), (contracts, score) in self._risk_counts.items():
+                if entry_dimension != dimension:
+                    continue
+                entry = breakdown.setdefault(key, {**{level: 0 for level in RISK_LEVELS}, "total": 0, "risk_score_total": 0})
+                entry[overall_risk] = entry.get(overall_risk, 0) + contracts
+                entry["total"] += contracts
+                entry["risk_score_total"] += score
+        for entry in breakdown.values():
+            entry["average_risk_score"] = round(entry.pop("risk_score_total") / entry["total"], 1) if entry["total"] else 0
+        return dict(sorted(breakdown.items(), key=lambda item: -item[1]["total"]))
+
+    def common_risks(self, top_k: int = 10) -> List[Dict]:
+        """Most frequent risk findings across the portfolio"""
+        self._refresh()
+        with self._lock:
+            items = sorted(self._risk_items.items(), key=lambda item: -item[1])[:top_k]
+        return [{"level": level, "risk": item, "contracts": count} for (level, item), count in items]
+
+    def confidence_histogram(self, category: Optional[str] = None) -> Dict:
+        """Answer confidence histogram for one category, or all categories combined"""
+        self._refresh()
+        counts = [0] * CONFIDENCE_BUCKETS
+        with self._lock:
+            for (entry_category, bucket), answers in self._confidence.items():
+                if category is None or entry_category == category:
+                    counts[bucket] += answers
+        return {
+            "bucket_edges": [round(i / CONFIDENCE_BUCKETS, 2) for i in range(CONFIDENCE_BUCKETS + 1)],
+            "counts": counts
+        }
+
+    def categories(self) -> List[str]:
+        self._refresh()
+        with self._lock:
+            return sorted({category for category, _ in self._confidence})
+
+    def summary(self, top_k: int = 10) -> Dict:
+        """Everything a portfolio dashboard needs, read from the in-memory aggregates"""
+        self._refresh()
+        portfolio = self.risk_breakdown("portfolio").get("all", {**{level: 0 for level in RISK_LEVELS},
+                                                                 "total": 0, "average_risk_score": 0})
+        return {
+            "total_contracts": self._contracts,
+            "risk_distribution": {level: portfolio[level] for level in RISK_LEVELS},
+            "average_risk_score": portfolio["average_risk_score"],
+            "by_contract_type": self.risk_breakdown("contract_type"),
+            "by_counterparty": self.risk_breakdown("counterparty"),
+            "by_governing_law": self.risk_breakdown("governing_law"),
+            "common_risks": self.common_risks(top_k),
+            "confidence_histograms": {
+                "all": self.confidence_histogram(),
+                **{category: self.confidence_histogram(category)["counts"] for category in self.categories()}
+            }
+        }
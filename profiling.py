@@ -0,0 +1,397 @@
+"""
+On-Demand Profiling
+===================
+Profiles a live worker without restarting it. Two scopes:
+
+- duration: a sampling profiler snapshots every thread's stack each few
+  milliseconds for N seconds (py-spy style, in-process, no dependencies)
+- requests: only the next K requests are profiled, either by sampling the
+  threads serving them or with cProfile (pstats output)
+
+Each session writes its dump to PROFILE_DIR (collapsed stacks for
+flamegraph.pl / speedscope, or a .prof file for pstats / snakeviz) plus a
+JSON summary attributing time to functions, with the analyzer hot paths
+(context extraction, tokenization, forward pass, span search decoding)
+broken out.
+
+    python profiling.py start --seconds 30               # profile a running server
+    python profiling.py start --requests 20 --format pstats
+    python profiling.py status
+"""
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", str(Path(__file__).parent / "profiles"))
+DEFAULT_INTERVAL = 0.005
+MAX_STACK_DEPTH = 128
+MAX_SECONDS = 600
+MAX_REQUESTS = 1000
+FORMATS = ("collapsed", "pstats")
+
+# Call paths reported separately in every summary: a path is a sequence of
+# function names that must appear in this order on the stack (caller first)
+HOT_PATHS = {
+    "context_extraction": (("extract_relevant_context",), ("select_relevant_context",)),
+    "tokenization": (("encode_plus",),),
+    "forward": (("forward",),),
+    "span_search": (("extract_answer_beam_search",),),
+    "span_search_decode": (("extract_answer_beam_search", "decode"),),
+    "risk_scoring": (("score_risk_terms",), ("assess_risks",)),
+}
+
+
+def _function_name(label: str) -> str:
+    return label.split(" ", 1)[0]
+
+
+def _stack_matches(names, path) -> bool:
+    """True if the names of path occur in order (not necessarily adjacent) in names"""
+    remaining = iter(names)
+    return all(name in remaining for name in path)
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Periodically records the Python stacks of other threads.
+
+    thread_filter, when given, is called with a thread id and decides whether
+    that thread's stack is recorded (used to profile only request threads).
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, thread_filter=None):
+        self.interval = interval
+        self.thread_filter = thread_filter
+        self.stacks = Counter()
+        self.sample_count = 0
+        self.started = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(exclude=own)
+
+    def sample(self, exclude: Optional[int] = None):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == exclude or (self.thread_filter and not self.thread_filter(thread_id)):
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+        self.sample_count += 1
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed format: 'root;caller;leaf count' per line"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def function_stats(self, top: int = 50) -> List[Dict]:
+        """Self and total (inclusive) time per function, estimated from sample counts"""
+        self_counts = Counter()
+        total_counts = Counter()
+        for stack, count in self.stacks.items():
+            if stack:
+                self_counts[stack[-1]] += count
+            for label in set(stack):
+                total_counts[label] += count
+        seconds_per_sample = self.interval
+        return [{
+            "function": label,
+            "self_samples": self_counts[label],
+            "total_samples": total,
+            "self_seconds": round(self_counts[label] * seconds_per_sample, 4),
+            "total_seconds": round(total * seconds_per_sample, 4)
+        } for label, total in total_counts.most_common(top)]
+
+    def hot_paths(self) -> Dict:
+        """Inclusive samples attributed to the analyzer's hot-path functions"""
+        totals = {}
+        for name, paths in HOT_PATHS.items():
+            samples = 0
+            for stack, count in self.stacks.items():
+                names = [_function_name(label) for label in stack]
+                if any(_stack_matches(names, path) for path in paths):
+                    samples += count
+            totals[name] = {"samples": samples, "seconds": round(samples * self.interval, 4)}
+        return totals
+
+
+def pstats_summary(stats: pstats.Stats, top: int = 50) -> Dict:
+    """Top functions by cumulative time plus the hot-path totals from cProfile stats.
+
+    cProfile keeps only direct caller edges, so two-step hot paths (span
+    search calling tokenizer.decode) are measured on the caller -> callee edge.
+    """
+    rows = []
+    for (filename, line, name), (_, calls, self_time, cumulative, _) in stats.stats.items():
+        rows.append({
+            "function": f"{name} ({os.path.basename(filename)}:{line})",
+            "calls": calls,
+            "self_seconds": round(self_time, 4),
+            "total_seconds": round(cumulative, 4)
+        })
+    rows.sort(key=lambda row: row["total_seconds"], reverse=True)
+
+    hot_paths = {}
+    for path_name, paths in HOT_PATHS.items():
+        calls, seconds = 0, 0.0
+        for path in paths:
+            for (_, _, name), (_, function_calls, _, cumulative, callers) in stats.stats.items():
+                if name != path[-1]:
+                    continue
+                if len(path) == 1:
+                    # Recursive or nested matches overlap; keep the largest cumulative time
+                    calls += function_calls
+                    seconds = max(seconds, cumulative)
+                    continue
+                for (_, _, caller), edge in callers.items():
+                    if caller == path[-2]:
+                        calls += edge[1]
+                        seconds += edge[3]
+        hot_paths[path_name] = {"calls": calls, "seconds": round(seconds, 4)}
+    return {"functions": rows[:top], "hot_paths": hot_paths}
+
+
+class ProfileSession:
+    def __init__(self, scope: str, fmt: str, seconds: Optional[float], requests: Optional[int], interval: float):
+        self.id = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        self.scope = scope
+        self.format = fmt
+        self.seconds = seconds
+        self.requests = requests
+        self.interval = interval
+        self.started_at = datetime.now().isoformat()
+        self.finished_at = None
+        self.requests_profiled = 0
+        self.requests_skipped = 0
+        self.request_threads = set()
+        self.sampler = None
+        self.stats = None
+        self.files = []
+        self.error = None
+
+    def info(self) -> Dict:
+        return {
+            "id": self.id,
+            "scope": self.scope,
+            "format": self.format,
+            "seconds": self.seconds,
+            "requests": self.requests,
+            "interval_ms": round(self.interval * 1000, 3),
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "requests_profiled": self.requests_profiled,
+            "requests_skipped": self.requests_skipped,
+            "files": self.files,
+            "error": self.error
+        }
+
+
+class ProfilerController:
+    """Runs at most one profiling session at a time and writes its dumps"""
+
+    def __init__(self, output_dir: str = PROFILE_DIR):
+        self.output_dir = output_dir
+        self.session = None
+        self.history = []
+        self._lock = threading.Lock()
+
+    def start(self, seconds: Optional[float] = None, requests: Optional[int] = None, fmt: str = "collapsed",
+              interval: float = DEFAULT_INTERVAL) -> Dict:
+        """Start a session profiling either the next `seconds` or the next `requests` requests"""
+        if (seconds is None) == (requests is None):
+            raise ValueError("Give exactly one of seconds or requests")
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {FORMATS}")
+        if seconds is not None and not 0 < seconds <= MAX_SECONDS:
+            raise ValueError(f"seconds must be between 0 and {MAX_SECONDS}")
+        if requests is not None and not 0 < requests <= MAX_REQUESTS:
+            raise ValueError(f"requests must be between 1 and {MAX_REQUESTS}")
+        if fmt == "pstats" and seconds is not None:
+            raise ValueError("pstats output profiles requests; use format 'collapsed' for a timed session")
+        if not 0.001 <= interval <= 1:
+            raise ValueError("interval must be between 1 ms and 1 s")
+
+        with self._lock:
+            if self.session is not None:
+                raise RuntimeError(f"Profiling session {self.session.id} is already running")
+            session = ProfileSession("duration" if seconds is not None else "requests", fmt, seconds, requests, interval)
+            if fmt == "collapsed":
+                thread_filter = None if seconds is not None else session.request_threads.__contains__
+                session.sampler = SamplingProfiler(interval, thread_filter)
+                session.sampler.start()
+            self.session = session
+
+        if seconds is not None:
+            timer = threading.Timer(seconds, self._finish, args=(session,))
+            timer.daemon = True
+            timer.start()
+        return session.info()
+
+    # Request hooks: cheap no-ops unless a request-scoped session is running
+
+    def request_started(self):
+        """Returns a token for request_finished(), or None when this request is not profiled"""
+        session = self.session
+        if session is None or session.scope != "requests":
+            return None
+        with self._lock:
+            if session is not self.session or \
+                    session.requests_profiled + len(session.request_threads) >= session.requests:
+                return None
+            thread_id = threading.get_ident()
+            session.request_threads.add(thread_id)
+        if session.format == "pstats":
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is active (cProfile is process-wide on Python 3.12+)
+                with self._lock:
+                    session.request_threads.discard(thread_id)
+                    session.requests_skipped += 1
+                return None
+            return session, thread_id, profiler
+        return session, thread_id, None
+
+    def request_finished(self, token):
+        if token is None:
+            return
+        session, thread_id, profiler = token
+        if profiler is not None:
+            profiler.disable()
+        with self._lock:
+            session.request_threads.discard(thread_id)
+            session.requests_profiled += 1
+            if profiler is not None:
+                if session.stats is None:
+                    session.stats = pstats.Stats(profiler)
+                else:
+                    session.stats.add(profiler)
+            done = session.requests_profiled >= session.requests
+        if done:
+            self._finish(session)
+
+    def _finish(self, session: ProfileSession):
+        with self._lock:
+            if self.session is not session:
+                return
+            self.session = None
+        try:
+            if session.sampler is not None:
+                session.sampler.stop()
+            self._write(session)
+        except Exception as e:
+            session.error = str(e)
+        session.finished_at = datetime.now().isoformat()
+        self.history.append(session.info())
+        del self.history[:-20]
+
+    def _write(self, session: ProfileSession):
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"profile-{session.id}-{session.scope}")
+        summary = {"session": session.info()}
+        if session.sampler is not None:
+            sampler = session.sampler
+            with open(f"{base}.collapsed.txt", "w") as f:
+                f.write(sampler.collapsed())
+            summary.update({
+                "samples": sampler.sample_count,
+                "elapsed_seconds": round(sampler.elapsed, 3),
+                "hot_paths": sampler.hot_paths(),
+                "functions": sampler.function_stats()
+            })
+            session.files.append(f"{base}.collapsed.txt")
+        elif session.stats is not None:
+            session.stats.dump_stats(f"{base}.prof")
+            summary.update(pstats_summary(session.stats))
+            session.files.append(f"{base}.prof")
+        session.files.append(f"{base}.summary.json")
+        summary["session"] = session.info()
+        with open(f"{base}.summary.json", "w") as f:
+            json.dump(summary, f, indent=2)
+
+    def stop(self) -> Optional[Dict]:
+        """End the running session early and write what was collected"""
+        session = self.session
+        if session is None:
+            return None
+        self._finish(session)
+        return session.info()
+
+    def status(self) -> Dict:
+        session = self.session
+        return {"running": session.info() if session else None, "completed": list(reversed(self.history))}
+
+
+profiler = ProfilerController()
+
+
+def main():
+    import argparse
+    import requests
+
+    parser = argparse.ArgumentParser(description="Profile a running contract analysis server")
+    parser.add_argument("command", choices=["start", "stop", "status"])
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--token", default=os.getenv("ADMIN_TOKEN"), help="Admin token (default $ADMIN_TOKEN)")
+    parser.add_argument("--seconds", type=float, help="Sample all threads for this many seconds")
+    parser.add_argument("--requests", type=int, help="Profile the next K requests")
+    parser.add_argument("--format", choices=FORMATS, default="collapsed")
+    parser.add_argument("--interval-ms", type=float, default=DEFAULT_INTERVAL * 1000)
+    parser.add_argument("--wait", action="store_true", help="Wait for the session to finish and print its summary")
+    args = parser.parse_args()
+
+    headers = {"X-Admin-Token": args.token or ""}
+    endpoint = f"{args.url}/api/admin/profile"
+    if args.command == "start":
+        payload = {"seconds": args.seconds, "requests": args.requests, "format": args.format,
+                   "interval_ms": args.interval_ms}
+        response = requests.post(endpoint, json=payload, headers=headers, timeout=10)
+    elif args.command == "stop":
+        response = requests.delete(endpoint, headers=headers, timeout=30)
+    else:
+        response = requests.get(endpoint, headers=headers, timeout=10)
+    print(json.dumps(response.json(), indent=2))
+    if response.status_code >= 400 or args.command != "start" or not args.wait:
+        return
+
+    session_id = response.json()["session"]["id"]
+    while True:
+        time.sleep(1)
+        status = requests.get(endpoint, headers=headers, timeout=10).json()
+        finished = [session for session in status["completed"] if session["id"] == session_id]
+        if finished:
+            print(json.dumps(finished[0], indent=2))
+            return
+
+
+if __name__ == "__main__":
+    main()
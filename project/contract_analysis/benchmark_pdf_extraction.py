@@ -0,0 +1,116 @@
+"""
+Benchmark sequential vs page-parallel PDF text extraction on synthetic contracts.
+
+    python benchmark_pdf_extraction.py --pages 100 500 --workers 1 2 4 --output results.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import PyPDF2
+
+from pdf_extraction import extract_pdf_pages
+
+CLAUSES_PER_PAGE = 6
+LINES_PER_CLAUSE = 6
+
+
+def write_synthetic_pdf(file_path, pages):
+    """Write a text-only PDF of numbered contract clauses (no external dependencies)"""
+    objects = []
+    page_ids = []
+    font_id = 3
+    clause = 1
+    for page in range(pages):
+        lines = []
+        for _ in range(CLAUSES_PER_PAGE):
+            lines.append(f"{clause}. CLAUSE {clause} INDEMNIFICATION AND LIABILITY")
+            for line in range(LINES_PER_CLAUSE):
+                lines.append(f"The Supplier shall indemnify the Customer against all losses under clause "
+                             f"{clause}, paragraph {line + 1}, page {page + 1}, subject to the limits herein.")
+            clause += 1
+        stream = "BT /F1 9 Tf 40 800 Td 11 TL\n" + "".join(
+            "({}) '\n".format(text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")) for text in lines
+        ) + "ET"
+        content_id = 4 + len(objects)
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        page_ids.append(4 + len(objects))
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>")
+
+    header = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{page_id} 0 R' for page_id in page_ids)}] /Count {pages} >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    offsets = []
+    with open(file_path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        for number, body in enumerate(header + objects, 1):
+            offsets.append(f.tell())
+            f.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+        xref = f.tell()
+        f.write(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+        for offset in offsets:
+            f.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+        f.write(f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1"))
+
+
+def sequential_extract(file_path):
+    """The previous extractor: one reader, pages in order"""
+    with open(file_path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def run_benchmark(page_counts, worker_counts, repeats):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for pages in page_counts:
+            file_path = os.path.join(directory, f"synthetic_{pages}.pdf")
+            write_synthetic_pdf(file_path, pages)
+
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                expected = sequential_extract(file_path)
+                timings.append(time.perf_counter() - start)
+            baseline = min(timings)
+            results.append({"pages": pages, "extractor": "sequential", "workers": 1,
+                            "seconds": round(baseline, 3), "speedup": 1.0})
+            print(f"{pages} pages, sequential: {baseline:.2f}s")
+
+            for workers in worker_counts:
+                timings = []
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    text, page_spans = extract_pdf_pages(file_path, workers=workers)
+                    timings.append(time.perf_counter() - start)
+                if text != expected or len(page_spans) != pages:
+                    raise RuntimeError(f"Parallel extraction with {workers} workers does not match sequential output")
+                best = min(timings)
+                results.append({"pages": pages, "extractor": "parallel", "workers": workers,
+                                "seconds": round(best, 3), "speedup": round(baseline / best, 2)})
+                print(f"{pages} pages, {workers} workers: {best:.2f}s ({baseline / best:.2f}x)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF extraction benchmark")
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, os.cpu_count() or 1])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.pages, sorted(set(args.workers)), args.repeats)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cpu_count": os.cpu_count(), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
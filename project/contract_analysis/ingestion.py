@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+import time
+
+import docx2txt
+
+from pdf_extraction import iter_pdf_pages
+from text_cache import text_cache
+
+# Size of each read from the incoming upload
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Characters of contract text sent to the model per analysis window
+WINDOW_CHARS = 12000
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+# File types whose extraction is worth caching
+CACHED_EXTENSIONS = (".pdf", ".docx")
+# Lines that start a new clause: "1.", "2.1", "ARTICLE IV", "Section 3", "GOVERNING LAW"
+CLAUSE_START_RE = re.compile(
+    r'^\s*(?:\d+(?:\.\d+)*[.)]?\s+\S|(?:ARTICLE|Article|SECTION|Section)\s+[\dIVXLC]+\b|[A-Z][A-Z &/,-]{3,}:?\s*$)'
+)
+
+
+def upload_extension(filename):
+    """Lower-case extension of a client filename, or None if it is not supported"""
+    extension = os.path.splitext(filename or "")[1].lower()
+    return extension if extension in SUPPORTED_EXTENSIONS else None
+
+
+async def spool_upload(upload, upload_dir, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Stream an upload into a new, uniquely named file in upload_dir.
+
+    The client filename only contributes its extension, so it can neither
+    collide with nor overwrite another upload. Returns (path, size, digest).
+    """
+    extension = upload_extension(upload.filename)
+    if extension is None:
+        raise ValueError("Unsupported file type")
+    fd, file_path = tempfile.mkstemp(prefix="upload_", suffix=extension, dir=upload_dir)
+    os.close(fd)
+    try:
+        size, digest = await save_upload(upload, file_path, chunk_size)
+    except BaseException:
+        remove_upload(file_path)
+        raise
+    return file_path, size, digest
+
+
+def remove_upload(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+def sweep_uploads(upload_dir, max_age):
+    """Delete upload files older than max_age seconds (left behind by crashes or old releases)"""
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(upload_dir):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+async def run_upload_sweeper(upload_dir, max_age, interval):
+    """Background task: periodically reclaim disk space from stale uploads"""
+    while True:
+        removed = await asyncio.to_thread(sweep_uploads, upload_dir, max_age)
+        if removed:
+            print(f"Upload sweeper removed {removed} stale files")
+        await asyncio.sleep(interval)
+
+
+async def save_upload(upload, file_path, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Copy an UploadFile to disk chunk by chunk instead of reading it whole.
+
+    Returns the size and the SHA-256 digest of the file, hashed on the way through.
+    """
+    size = 0
+    digest = hashlib.sha256()
+    with open(file_path, "wb") as f:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            f.write(chunk)
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def iter_pages(file_path):
+    """Yield (page_number, text) one page at a time.
+
+    PDF pages are extracted lazily by a process pool a few shards ahead of
+    the consumer, so only those pages are held in memory. DOCX files have no
+    pages and come back as a single page; text files are read from a memory
+    map in blocks of whole lines.
+    """
+    if file_path.endswith(".pdf"):
+        yield from iter_pdf_pages(file_path)
+    elif file_path.endswith(".docx"):
+        yield 1, docx2txt.process(file_path)
+    elif file_path.endswith(".txt"):
+        if os.path.getsize(file_path) == 0:
+            return
+        with open(file_path, "rb") as f:
+            view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            block = []
+            block_chars = 0
+            page_number = 1
+            for line in iter(view.readline, b""):
+                line = line.decode("utf-8", errors="replace")
+                block.append(line)
+                block_chars += len(line)
+                if block_chars >= WINDOW_CHARS:
+                    yield page_number, "".join(block)
+                    page_number += 1
+                    block = []
+                    block_chars = 0
+            if block:
+                yield page_number, "".join(block)
+        finally:
+            view.close()
+    else:
+        raise ValueError("Unsupported file type")
+
+
+def iter_clauses(pages):
+    """Yield (first_page, last_page, clause_text) as soon as each clause is complete.
+
+    A clause is complete once the next clause heading has been seen, so only
+    the clause currently being read is buffered across page boundaries.
+    """
+    lines = []
+    first_page = last_page = None
+    for page_number, page_text in pages:
+        for line in page_text.splitlines():
+            if CLAUSE_START_RE.match(line) and any(existing.strip() for existing in lines):
+                yield first_page, last_page, "\n".join(lines)
+                lines = []
+                first_page = None
+            if first_page is None:
+                first_page = page_number
+            last_page = page_number
+            lines.append(line)
+    if any(line.strip() for line in lines):
+        yield first_page, last_page, "\n".join(lines)
+
+
+def iter_windows(clauses, window_chars=WINDOW_CHARS):
+    """Group consecutive clauses into analysis windows of about window_chars characters"""
+    parts = []
+    size = 0
+    first_page = last_page = None
+    for clause_first, clause_last, text in clauses:
+        if parts and size + len(text) > window_chars:
+            yield first_page, last_page, "\n".join(parts)
+            parts = []
+            size = 0
+            first_page = None
+        # A single clause longer than a window is split on line boundaries
+        while len(text) > window_chars:
+            cut = text.rfind("\n", 0, window_chars)
+            cut = cut if cut > 0 else window_chars
+            yield clause_first, clause_last, text[:cut]
+            text = text[cut:].lstrip("\n")
+        if first_page is None:
+            first_page = clause_first
+        last_page = clause_last
+        parts.append(text)
+        size += len(text) + 1
+    if parts:
+        yield first_page, last_page, "\n".join(parts)
+
+
+def iter_cached_pages(file_path, digest=None):
+    """Pages of a file, served from the extracted-text cache when its digest is known"""
+    if digest is None or not file_path.endswith(CACHED_EXTENSIONS):
+        return iter_pages(file_path)
+    return text_cache.pages(digest, lambda: iter_pages(file_path))
+
+
+def iter_contract_windows(file_path, window_chars=WINDOW_CHARS, digest=None):
+    """Pages -> clauses -> analysis windows, all lazily"""
+    return iter_windows(iter_clauses(iter_cached_pages(file_path, digest)), window_chars)
@@ -1,7 +1,11 @@
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from utils import extract_text_from_file, analyze_contract
+from fastapi.concurrency import run_in_threadpool
+from utils import analyze_contract_stream
+from ingestion import spool_upload, remove_upload, upload_extension, iter_contract_windows, run_upload_sweeper
+from pdf_extraction import shutdown_pools
+import asyncio
 import os
 
 app = FastAPI()
@@ -16,13 +20,34 @@ app.add_middleware(
 
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Uploads are deleted after analysis; the sweeper catches anything left behind
+UPLOAD_MAX_AGE = int(os.getenv("UPLOAD_MAX_AGE", "3600"))
+UPLOAD_SWEEP_INTERVAL = int(os.getenv("UPLOAD_SWEEP_INTERVAL", "600"))
+
+@app.on_event("startup")
+async def start_upload_sweeper():
+    app.state.upload_sweeper = asyncio.create_task(run_upload_sweeper(UPLOAD_DIR, UPLOAD_MAX_AGE, UPLOAD_SWEEP_INTERVAL))
+
+@app.on_event("shutdown")
+async def stop_upload_sweeper():
+    app.state.upload_sweeper.cancel()
+
+@app.on_event("shutdown")
+async def stop_pdf_workers():
+    await run_in_threadpool(shutdown_pools)
 
 @app.post("/analyze")
 async def analyze(file: UploadFile = File(...)):
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    if upload_extension(file.filename) is None:
+        return JSONResponse(status_code=400, content={"success": False, "error": "Unsupported file type"})
 
-    contract_text = extract_text_from_file(file_path)
-    analysis = analyze_contract(contract_text)
+    file_path, _, digest = await spool_upload(file, UPLOAD_DIR)
+    try:
+        # Pages are parsed lazily (or read back from the text cache for repeat uploads)
+        # and each window is analyzed as soon as it is ready
+        analysis = await run_in_threadpool(analyze_contract_stream, iter_contract_windows(file_path, digest=digest))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+    finally:
+        remove_upload(file_path)
     return JSONResponse(content=analysis) 
\ No newline at end of file
@@ -0,0 +1,128 @@
+import atexit
+import mmap
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+# Below this many pages a process pool costs more than it saves
+PARALLEL_MIN_PAGES = 16
+PAGES_PER_SHARD = 8
+# Long-lived extraction pools, one per worker count, created on first use
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _map_reader(file_path):
+    """(reader, view): a PDF reader over a read-only memory map of the file"""
+    with open(file_path, "rb") as f:
+        view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return PyPDF2.PdfReader(view), view
+
+
+def _extract_range(file_path, start, end):
+    # Map the file only for this shard: the pool is long-lived, and a map kept
+    # by an idle worker would pin a deleted upload's disk space
+    reader, view = _map_reader(file_path)
+    try:
+        return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+    finally:
+        view.close()
+
+
+def get_pool(workers):
+    """The shared process pool with this many workers (started on first use)"""
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            _pools[workers] = pool
+        return pool
+
+
+def shutdown_pools():
+    """Stop every extraction pool (called on app shutdown and at exit)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown_pools)
+
+
+def count_pages(file_path):
+    with open(file_path, "rb") as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def iter_pdf_pages(file_path, workers=None, pages_per_shard=PAGES_PER_SHARD):
+    """Yield (page_number, text) in page order, extracting shards of pages in parallel.
+
+    Workers memory-map the file instead of each reading it into memory, and
+    only a few shards beyond the one being consumed are extracted ahead, so
+    memory stays bounded for very long documents.
+    """
+    page_count = count_pages(file_path)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or page_count < PARALLEL_MIN_PAGES:
+        # The map is released (and a deleted upload's disk space reclaimed)
+        # as soon as extraction ends
+        reader, view = _map_reader(file_path)
+        try:
+            for page_number in range(page_count):
+                yield page_number + 1, reader.pages[page_number].extract_text() or ""
+        finally:
+            view.close()
+        return
+
+    shards = [(start, min(start + pages_per_shard, page_count)) for start in range(0, page_count, pages_per_shard)]
+    executor = get_pool(workers)
+    pending = []
+    next_shard = 0
+    try:
+        while next_shard < len(shards) or pending:
+            while next_shard < len(shards) and len(pending) < workers * 2:
+                start, end = shards[next_shard]
+                pending.append((start, executor.submit(_extract_range, file_path, start, end)))
+                next_shard += 1
+            start, future = pending.pop(0)
+            for offset, text in enumerate(future.result()):
+                yield start + offset + 1, text
+    finally:
+        # The pool outlives this document: drop shards nobody will consume
+        for _, future in pending:
+            future.cancel()
+
+
+def extract_pdf_pages(file_path, workers=None):
+    """Full text of a PDF plus the character span of every page within it.
+
+    Pages are joined with newlines exactly like the sequential extractor, and
+    each entry of pages is {"page", "start", "end"} so highlights on the text
+    can be mapped back to page numbers.
+    """
+    parts = []
+    pages = []
+    offset = 0
+    for page_number, text in iter_pdf_pages(file_path, workers):
+        if parts:
+            offset += 1
+        pages.append({"page": page_number, "start": offset, "end": offset + len(text)})
+        parts.append(text)
+        offset += len(text)
+    return "\n".join(parts), pages
+
+
+def page_for_offset(pages, offset):
+    """Page number containing a character offset of the extracted text"""
+    low, high = 0, len(pages) - 1
+    while low < high:
+        middle = (low + high + 1) // 2
+        if pages[middle]["start"] <= offset:
+            low = middle
+        else:
+            high = middle - 1
+    return pages[low]["page"] if pages else None
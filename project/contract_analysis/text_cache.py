@@ -0,0 +1,133 @@
+import gzip
+import json
+import os
+import threading
+import uuid
+
+CACHE_DIR = os.getenv("TEXT_CACHE_DIR", os.path.join("cache", "extracted_text"))
+CACHE_MAX_BYTES = int(os.getenv("TEXT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+class ExtractedTextCache:
+    """Content-addressed cache of extracted page text, keyed by the SHA-256 of the file.
+
+    Each entry is a gzip-compressed JSON-lines file with one page per line
+    ({"page", "start", "end", "text"}), so entries are written and read back
+    page by page without holding the whole document in memory. Least recently
+    used entries are evicted once the cache exceeds max_bytes on disk.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, digest):
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.jsonl.gz")
+
+    def _entries(self):
+        for directory, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".jsonl.gz"):
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def __contains__(self, digest):
+        return os.path.exists(self._path(digest))
+
+    def get_pages(self, digest):
+        """Cached (page_number, text) pages of a file, or None on a miss"""
+        path = self._path(digest)
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._read_pages(path)
+
+    @staticmethod
+    def _read_pages(path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                yield entry["page"], entry["text"]
+
+    def get_page_spans(self, digest):
+        """[{"page", "start", "end"}] of a cached file, without the text"""
+        path = self._path(digest)
+        if not os.path.exists(path):
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return [{key: entry[key] for key in ("page", "start", "end")} for entry in map(json.loads, f)]
+
+    def record_pages(self, digest, pages):
+        """Pass pages through while writing them to the cache.
+
+        The entry only becomes visible once every page has been consumed; an
+        interrupted extraction leaves nothing behind.
+        """
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        offset = 0
+        first_page = True
+        completed = False
+        try:
+            with gzip.open(temp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+                for page_number, text in pages:
+                    if not first_page:
+                        offset += 1  # newline between pages in the joined text
+                    first_page = False
+                    f.write(json.dumps({"page": page_number, "start": offset, "end": offset + len(text), "text": text}))
+                    f.write("\n")
+                    offset += len(text)
+                    yield page_number, text
+            os.replace(temp_path, path)
+            completed = True
+            self._added(os.path.getsize(path))
+        finally:
+            if not completed and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def pages(self, digest, extract_pages):
+        """Pages from the cache, or from extract_pages() (recorded for next time)"""
+        cached = self.get_pages(digest)
+        if cached is not None:
+            return cached
+        return self.record_pages(digest, extract_pages())
+
+    def _added(self, size):
+        with self._lock:
+            self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._size = total
+
+    def stats(self):
+        return {"entries": sum(1 for _ in self._entries()), "bytes": self._size,
+                "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+
+text_cache = ExtractedTextCache()
@@ -1,8 +1,9 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 import docx2txt
-import PyPDF2
 from groq import Groq
 from dotenv import load_dotenv
+from pdf_extraction import extract_pdf_pages
 
 load_dotenv()
 groq_key = os.getenv("GROQ_API_KEY")
@@ -11,9 +12,7 @@ client = Groq(api_key=groq_key)
 
 def extract_text_from_file(file_path):
     if file_path.endswith(".pdf"):
-        with open(file_path, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            text = "\n".join(page.extract_text() or "" for page in reader.pages)
+        text, _ = extract_pdf_pages(file_path)
         return text
     elif file_path.endswith(".docx"):
         return docx2txt.process(file_path)
@@ -55,4 +54,54 @@ def analyze_contract(contract_text):
             "success": False,
             "error": str(e),
             "analysis": "Unable to analyze contract due to an error."
-        } 
\ No newline at end of file
+        } 
+
+def analyze_contract_stream(windows, max_workers=2, max_in_flight=4):
+    """Analyze contract windows as they arrive from the ingestion pipeline.
+
+    Each window is sent to the model while later pages are still being
+    parsed; at most max_in_flight windows are held in memory at once.
+    """
+    results = []
+    pending = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for first_page, last_page, text in windows:
+            pending.append((first_page, last_page, executor.submit(analyze_contract, text)))
+            while len(pending) >= max_in_flight:
+                first, last, future = pending.pop(0)
+                results.append((first, last, future.result()))
+        for first, last, future in pending:
+            results.append((first, last, future.result()))
+
+    if len(results) == 1:
+        return results[0][2]
+    return combine_window_analyses(results)
+
+def combine_window_analyses(results):
+    failed = [result for _, _, result in results if not result.get("success")]
+    if failed and len(failed) == len(results):
+        return failed[0]
+
+    sections = []
+    total_risks = 0
+    severity = "low"
+    for first_page, last_page, result in results:
+        pages = f"Page {first_page}" if first_page == last_page else f"Pages {first_page}-{last_page}"
+        if not result.get("success"):
+            sections.append(f"## {pages}\n\n{result['analysis']} ({result.get('error')})")
+            continue
+        sections.append(f"## {pages}\n\n{result['analysis']}")
+        total_risks += result["summary"]["total_risks"]
+        if result["summary"]["severity"] == "medium":
+            severity = "medium"
+
+    return {
+        "success": True,
+        "analysis": "\n\n".join(sections),
+        "summary": {
+            "total_risks": total_risks,
+            "severity": severity,
+            "sections_analyzed": len(results),
+            "sections_failed": len(failed)
+        }
+    }
@@ -14,18 +14,54 @@ import requests
 from pathlib import Path
 
 class ContractAnalysisServer:
-    def __init__(self):
+    def __init__(self, app_script="premium_app.py", ready_timeout=120):
         self.server_process = None
         self.base_dir = Path(__file__).parent
         self.server_url = "http://localhost:5000"
+        self.app_script = app_script
+        self.ready_timeout = ready_timeout
         
     def is_server_running(self):
-        """Check if the server is already running"""
+        """Check if the server is already running (liveness)"""
+        for endpoint in ("/api/live", "/api/health_check"):
+            try:
+                response = requests.get(f"{self.server_url}{endpoint}", timeout=2)
+            except:
+                return False
+            if response.status_code == 200:
+                return True
+            if response.status_code != 404:
+                return False
+        return False
+    
+    def get_readiness(self):
+        """Readiness details, or None when the server has no readiness endpoint"""
         try:
-            response = requests.get(f"{self.server_url}/api/health_check", timeout=2)
-            return response.status_code == 200
+            response = requests.get(f"{self.server_url}/api/ready", timeout=2)
         except:
-            return False
+            return {"ready": False}
+        if response.status_code == 404:
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            return {"ready": response.status_code == 200}
+    
+    def wait_until_ready(self):
+        """Poll readiness until the model is loaded and warmed up"""
+        deadline = time.time() + self.ready_timeout
+        while time.time() < deadline:
+            readiness = self.get_readiness()
+            if readiness is None or readiness.get("ready"):
+                return True
+            state = readiness.get("model_status", {}).get("state", "starting")
+            if state == "failed":
+                print(f"❌ Model failed to load: {readiness['model_status'].get('error')}")
+                return False
+            print(f"⏳ Waiting for model ({state})...")
+            time.sleep(1)
+        print("❌ Model did not become ready within timeout")
+        return False
     
     def start_server(self):
         """Start the premium contract analysis server"""
@@ -39,17 +75,20 @@ class ContractAnalysisServer:
         os.chdir(self.base_dir)
         
         try:
-            # Start the premium app
+            # Start the app
             self.server_process = subprocess.Popen([
-                sys.executable, "premium_app.py"
+                sys.executable, self.app_script
             ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             
-            # Wait for server to start
+            # Wait for server to start, then for the model to be ready
             max_attempts = 30
             for attempt in range(max_attempts):
                 if self.is_server_running():
                     print(f"✅ Server started successfully at {self.server_url}")
-                    return True
+                    if self.wait_until_ready():
+                        print("✅ Model loaded and warmed up")
+                        return True
+                    return False
                 time.sleep(1)
                 print(f"⏳ Waiting for server... ({attempt + 1}/{max_attempts})")
             
@@ -74,9 +113,12 @@ class ContractAnalysisServer:
             try:
                 response = requests.get(f"{self.server_url}/api/health_check")
                 data = response.json()
+                readiness = self.get_readiness() or {}
                 return {
                     "status": "running",
                     "url": self.server_url,
+                    "ready": readiness.get("ready", True),
+                    "model": readiness.get("model", {}).get("version"),
                     "groq_available": data.get("groq_available", False),
                     "timestamp": data.get("timestamp", "")
                 }
@@ -92,9 +134,13 @@ def main():
     parser = argparse.ArgumentParser(description="Contract Analysis Server Manager")
     parser.add_argument("action", choices=["start", "stop", "status", "restart"], 
                        help="Action to perform")
+    parser.add_argument("--app", default="premium_app.py",
+                       help="Server script to start (e.g. unified_app.py)")
+    parser.add_argument("--ready-timeout", type=int, default=120,
+                       help="Seconds to wait for the model to become ready")
     
     args = parser.parse_args()
-    server = ContractAnalysisServer()
+    server = ContractAnalysisServer(args.app, args.ready_timeout)
     
     if args.action == "start":
         server.start_server()
@@ -0,0 +1,218 @@
+"""
+Structured Logging
+==================
+Queue-based logging for the request path. Request threads only format the
+message and enqueue it; a listener thread does the stdout I/O, so a slow
+log consumer never blocks analysis. Hot-path messages (flagged with HOT or
+hot(...)) are sampled and rate-limited per message template, and each record
+carries the request's trace id.
+
+    logger = get_logger(__name__)
+    logger.info("Analyzing contract %d/%d", i, total, extra=hot(contract=name))
+
+Configuration (environment):
+    LOG_LEVEL        DEBUG | INFO | WARNING | ERROR       (default INFO)
+    LOG_FORMAT       text | json                          (default text)
+    LOG_SAMPLE_RATE  fraction of hot-path DEBUG/INFO records kept (default 1.0)
+    LOG_RATE_LIMIT   hot-path records per second per message template (default 5)
+    LOG_RATE_BURST   records allowed in a burst before limiting (default 20)
+    LOG_QUEUE_SIZE   records buffered before new ones are dropped (default 10000)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+import metrics
+import tracing
+
+ROOT_LOGGER = "contract_platform"
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "5"))
+LOG_RATE_BURST = float(os.getenv("LOG_RATE_BURST", "20"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# extra= values for hot-path records
+HOT = {"hot_path": True}
+
+
+def hot(**fields) -> Dict:
+    """extra= for a hot-path record with structured fields"""
+    return {"hot_path": True, "fields": fields}
+
+
+def with_fields(**fields) -> Dict:
+    """extra= for a regular record with structured fields"""
+    return {"fields": fields}
+
+
+LOG_RECORDS_DROPPED = metrics.registry.register(metrics.Counter(
+    "contract_log_records_dropped_total",
+    "Log records not written, by reason (sampled, rate_limited, queue_full)",
+    ["reason"]))
+
+
+class HotPathFilter(logging.Filter):
+    """Sampling plus a token bucket per (logger, message template) for hot-path records.
+
+    Warnings and errors are never sampled, only rate-limited. When records of
+    a template were suppressed, the next one that passes reports how many.
+    """
+
+    def __init__(self, sample_rate: float = LOG_SAMPLE_RATE, rate: float = LOG_RATE_LIMIT,
+                 burst: float = LOG_RATE_BURST):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "hot_path", False):
+            return True
+        if record.levelno < logging.WARNING and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            LOG_RECORDS_DROPPED.inc(reason="sampled")
+            return False
+        if self.rate <= 0:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, suppressed = self._buckets.get(key, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now, suppressed + 1)
+                allowed = False
+            else:
+                self._buckets[key] = (tokens - 1, now, 0)
+                allowed = True
+        if not allowed:
+            LOG_RECORDS_DROPPED.inc(reason="rate_limited")
+            return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class ContextFilter(logging.Filter):
+    """Stamp records with the request's trace id while still on the request thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "trace_id"):
+            record.trace_id = tracing.current_trace_id()
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(reason="queue_full")
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = dict(getattr(record, "fields", None) or {})
+        if getattr(record, "suppressed", 0):
+            extras["suppressed"] = record.suppressed
+        if getattr(record, "trace_id", None):
+            extras["trace_id"] = record.trace_id
+        if extras:
+            line += " " + " ".join(f"{key}={value}" for key, value in extras.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        entry.update(getattr(record, "fields", None) or {})
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None, stream=None):
+    """Route the platform's loggers through a queue to a background writer (idempotent)"""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return _listener
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+
+        records = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        handler = NonBlockingQueueHandler(records)
+        handler.addFilter(HotPathFilter())
+        handler.addFilter(ContextFilter())
+
+        logger = logging.getLogger(ROOT_LOGGER)
+        for previous in list(logger.handlers):
+            logger.removeHandler(previous)
+        logger.setLevel(level or LOG_LEVEL)
+        logger.addHandler(handler)
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _listener
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the platform root, configuring logging on first use"""
+    configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def quiet_offline_run():
+    """Defaults for offline CLI jobs: WARNING logs and no trace file, unless the environment says otherwise
+
+    Call first thing under ``if __name__ == "__main__":``. The environment is
+    updated too, so subprocesses the job spawns inherit the same defaults.
+    """
+    global LOG_LEVEL
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("TRACING_ENABLED", "0")
+    LOG_LEVEL = os.environ["LOG_LEVEL"].upper()
+    logging.getLogger(ROOT_LOGGER).setLevel(LOG_LEVEL)
+    tracing.TRACING_ENABLED = os.environ["TRACING_ENABLED"].lower() not in ("0", "false", "no")
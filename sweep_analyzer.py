@@ -0,0 +1,240 @@
+"""
+Analyzer Accuracy/Latency Sweep
+===============================
+Runs the CUAD evaluation set through the analysis pipeline for every
+combination of a grid of analyzer settings and reports which settings are
+worth using: the Pareto frontier of F1 against per-question latency and
+against memory.
+
+Settings swept:
+- templates:     question templates used per category (first N)
+- beam_size:     start/end candidates in the span search
+- max_length:    tokens per question + context sequence
+- backend:       fp32 | bf16 | int8 (dynamic int8 quantization of Linear layers)
+- context_mode:  keywords (sentence selection) | full (whole contract, truncated)
+
+    python sweep_analyzer.py --dataset CUAD_v1/test.json --templates 1 2 4 --beam-sizes 1 5 \\
+        --max-lengths 256 512 --backends fp32 int8 --output sweep.json
+
+Use --isolate to run each setting in its own process, so peak memory is not
+inflated by the settings measured before it.
+"""
+import argparse
+import copy
+import io
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from benchmark_pipeline import MODEL_SIZES, build_random_model, git_commit, has_fine_tuned_model
+from cuad_evaluation import ANALYZER_CATEGORIES, CONTEXT_MODES, OVERALL, evaluate_analyzer, iter_cuad_examples
+import structured_logging
+
+SETTINGS = ("templates", "beam_size", "max_length", "backend", "context_mode")
+BACKENDS = ("fp32", "bf16", "int8")
+
+# (metric, True if higher is better)
+LATENCY_OBJECTIVES = (("f1", True), ("latency_p50_ms", False))
+MEMORY_OBJECTIVES = (("f1", True), ("peak_rss_bytes", False))
+
+
+def apply_backend(model, backend: str):
+    """A copy of model converted to the backend (fp32 returns the model itself)"""
+    import torch
+
+    if backend == "fp32":
+        return model
+    if backend == "bf16":
+        return copy.deepcopy(model).to(torch.bfloat16)
+    if backend == "int8":
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=False)
+    raise ValueError(f"Unknown backend {backend}; expected one of {BACKENDS}")
+
+
+def model_bytes(model) -> int:
+    """Serialized size of the model's weights (counts packed int8 weights too)"""
+    import torch
+
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def pareto_frontier(rows: List[Dict], objectives=LATENCY_OBJECTIVES) -> List[Dict]:
+    """Rows not dominated by any other row on the objectives, best first objective first"""
+    def at_least_as_good(a, b):
+        return all((a[name] >= b[name]) if higher else (a[name] <= b[name]) for name, higher in objectives)
+
+    frontier = [row for row in rows
+                if not any(other is not row and at_least_as_good(other, row) and
+                           any(other[name] != row[name] for name, _ in objectives) for other in rows)]
+    name, higher = objectives[0]
+    return sorted(frontier, key=lambda row: row[name], reverse=higher)
+
+
+def load_analyzer(model_path: str, model_size: str, work_dir: str):
+    """(analyzer, model source), falling back to a random-init model"""
+    from enhanced_analyzer import EnhancedCUADAnalyzer
+
+    source = "fine_tuned"
+    if not has_fine_tuned_model(model_path):
+        print(f"ℹ️  No fine-tuned weights at {model_path}; using a random-init '{model_size}' RoBERTa")
+        model_path, source = build_random_model(work_dir, model_size), "random_init"
+    return EnhancedCUADAnalyzer(model_path, enable_groq_enhancement=False), source
+
+
+class AnalyzerSweep:
+    def __init__(self, analyzer, examples: List[Dict]):
+        self.analyzer = analyzer
+        self.examples = examples
+        self.base_model = analyzer.model
+        self._backends = {}
+
+    def _model(self, backend: str):
+        if backend not in self._backends:
+            self._backends[backend] = apply_backend(self.base_model, backend)
+        return self._backends[backend]
+
+    def run_setting(self, setting: Dict) -> Dict:
+        """Evaluate one combination of settings; the analyzer is restored afterwards"""
+        analyzer = self.analyzer
+        saved = (analyzer.model, analyzer.templates_per_category, analyzer.beam_size, analyzer.max_length)
+        try:
+            analyzer.model = self._model(setting["backend"])
+            analyzer.templates_per_category = setting["templates"]
+            analyzer.beam_size = setting["beam_size"]
+            analyzer.max_length = setting["max_length"]
+            # One untimed question so lazy initialization is not charged to the first setting
+            evaluate_analyzer(analyzer, self.examples[:1], setting["context_mode"])
+            report = evaluate_analyzer(analyzer, self.examples, setting["context_mode"])
+        finally:
+            analyzer.model, analyzer.templates_per_category, analyzer.beam_size, analyzer.max_length = saved
+
+        overall, performance = report[OVERALL], report["performance"]
+        return {
+            **setting,
+            "f1": overall["f1"],
+            "exact": overall["exact"],
+            "aupr": overall["aupr"],
+            "precision_at_80_recall": overall["precision_at_80_recall"],
+            "latency_p50_ms": performance["example_latency"].get("p50_ms", 0.0),
+            "latency_p95_ms": performance["example_latency"].get("p95_ms", 0.0),
+            "examples_per_second": performance["examples_per_second"],
+            "peak_rss_bytes": performance["peak_rss_bytes"],
+            "model_bytes": model_bytes(self._model(setting["backend"])),
+            "categories": {name: row["f1"] for name, row in report["categories"].items()}
+        }
+
+
+def grid(args) -> List[Dict]:
+    values = (args.templates, args.beam_sizes, args.max_lengths, args.backends, args.context_modes)
+    return [dict(zip(SETTINGS, combination)) for combination in itertools.product(*values)]
+
+
+def run_isolated(setting: Dict, args) -> Dict:
+    """Evaluate one setting in a fresh interpreter and return its row"""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as handle:
+        row_path = handle.name
+    try:
+        command = [sys.executable, os.path.abspath(__file__), "--dataset", args.dataset,
+                   "--model-path", args.model_path, "--model-size", args.model_size,
+                   "--setting", json.dumps(setting), "--row-output", row_path]
+        if args.limit:
+            command += ["--limit", str(args.limit)]
+        if args.threads:
+            command += ["--threads", str(args.threads)]
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        with open(row_path) as f:
+            return json.load(f)
+    finally:
+        os.remove(row_path)
+
+
+def load_examples(dataset: str, limit: Optional[int]) -> List[Dict]:
+    examples = iter_cuad_examples(dataset, sorted(ANALYZER_CATEGORIES))
+    return list(itertools.islice(examples, limit) if limit else examples)
+
+
+def print_rows(title: str, rows: List[Dict]):
+    print(f"\n{title}")
+    print(f"  {'templates':>9s} {'beam':>4s} {'max_len':>7s} {'backend':>7s} {'context':>8s} "
+          f"{'F1':>6s} {'p50 ms':>8s} {'RSS MB':>7s} {'model MB':>8s}")
+    for row in rows:
+        templates = "all" if row["templates"] is None else str(row["templates"])
+        print(f"  {templates:>9s} {row['beam_size']:4d} {row['max_length']:7d} {row['backend']:>7s} "
+              f"{row['context_mode']:>8s} {row['f1']:6.2f} {row['latency_p50_ms']:8.1f} "
+              f"{row['peak_rss_bytes'] / 1e6:7.0f} {row['model_bytes'] / 1e6:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep analyzer settings and report the F1/latency/memory Pareto frontier")
+    parser.add_argument("--dataset", required=True, help="CUAD dataset (SQuAD v2 .json or .jsonl)")
+    parser.add_argument("--model-path", default="./", help="Fine-tuned model directory (random-init fallback if absent)")
+    parser.add_argument("--model-size", choices=sorted(MODEL_SIZES), default="small",
+                        help="Size of the random-init fallback model")
+    parser.add_argument("--limit", type=int, help="Evaluate only the first N questions")
+    parser.add_argument("--templates", type=int, nargs="+", default=[1, 2, 4], help="Question templates per category")
+    parser.add_argument("--beam-sizes", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--max-lengths", type=int, nargs="+", default=[256, 512])
+    parser.add_argument("--backends", choices=BACKENDS, nargs="+", default=["fp32"])
+    parser.add_argument("--context-modes", choices=CONTEXT_MODES, nargs="+", default=["keywords"])
+    parser.add_argument("--threads", type=int, help="torch intra-op threads (default: torch's choice)")
+    parser.add_argument("--isolate", action="store_true", help="Run each setting in its own process")
+    parser.add_argument("--output", help="Write all rows and frontiers as JSON to this file")
+    parser.add_argument("--setting", help=argparse.SUPPRESS)
+    parser.add_argument("--row-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    import torch
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    settings = [json.loads(args.setting)] if args.setting else grid(args)
+
+    rows = []
+    if args.isolate and not args.setting:
+        for index, setting in enumerate(settings, 1):
+            rows.append(run_isolated(setting, args))
+            print(f"[{index}/{len(settings)}] {setting}: F1 {rows[-1]['f1']:.2f}, p50 {rows[-1]['latency_p50_ms']:.1f} ms")
+    else:
+        examples = load_examples(args.dataset, args.limit)
+        with tempfile.TemporaryDirectory() as work_dir:
+            analyzer, source = load_analyzer(args.model_path, args.model_size, work_dir)
+        print(f"📊 {len(examples)} questions, {len(settings)} settings")
+        sweep = AnalyzerSweep(analyzer, examples)
+        for index, setting in enumerate(settings, 1):
+            rows.append(sweep.run_setting(setting))
+            print(f"[{index}/{len(settings)}] {setting}: F1 {rows[-1]['f1']:.2f}, p50 {rows[-1]['latency_p50_ms']:.1f} ms")
+        if args.row_output:
+            with open(args.row_output, "w") as f:
+                json.dump(rows[0], f)
+            return
+
+    frontiers = {
+        "latency": pareto_frontier(rows, LATENCY_OBJECTIVES),
+        "memory": pareto_frontier(rows, MEMORY_OBJECTIVES),
+        "latency_and_memory": pareto_frontier(rows, LATENCY_OBJECTIVES + MEMORY_OBJECTIVES[1:])
+    }
+    print_rows("Pareto frontier: F1 vs latency", frontiers["latency"])
+    print_rows("Pareto frontier: F1 vs memory", frontiers["memory"])
+
+    if args.output:
+        result = {
+            "meta": {"timestamp": datetime.now().isoformat(), "git_commit": git_commit(), "dataset": args.dataset,
+                     "limit": args.limit, "isolated": args.isolate, "torch_threads": torch.get_num_threads()},
+            "rows": rows,
+            "pareto": frontiers
+        }
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    structured_logging.quiet_offline_run()
+    main()
@@ -0,0 +1,276 @@
+"""
+Adaptive Question Templates
+===========================
+Every category has four question templates and the analyzer used to run all
+of them even when the first one already produced a confident answer. A
+template policy changes that:
+
+- templates run in order of historical win rate per category, learned from
+  the question_used values logged in the analysis store
+- the analyzer stops once the best confidence reaches the category's
+  threshold, calibrated on an evaluation set so that stopping early gives the
+  same answer as running every template in at least --target-agreement of
+  the questions
+
+The policy is stored next to the model as template_policy.json and picked up
+when the analyzer loads (TEMPLATE_POLICY_PATH overrides the location,
+ADAPTIVE_TEMPLATES=0 disables it).
+
+    python template_policy.py --dataset CUAD_v1/test.json --model-path ./
+"""
+import json
+import math
+import os
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import structured_logging
+
+POLICY_FILENAME = "template_policy.json"
+DEFAULT_TARGET_AGREEMENT = 0.97
+MIN_CALIBRATION_QUESTIONS = 20
+
+
+class TemplatePolicy:
+    def __init__(self, order: Optional[Dict[str, List[str]]] = None, thresholds: Optional[Dict[str, float]] = None,
+                 meta: Optional[Dict] = None, pruned: Optional[Dict[str, List[str]]] = None,
+                 pruned_by_type: Optional[Dict[str, Dict[str, List[str]]]] = None):
+        """order: category -> templates best first; thresholds: category -> early-exit confidence;
+        pruned / pruned_by_type: templates no longer run (template_stats.py), per category and
+        per contract type and category"""
+        self.order = order or {}
+        self.thresholds = thresholds or {}
+        self.meta = meta or {}
+        self.pruned = pruned or {}
+        self.pruned_by_type = pruned_by_type or {}
+
+    def ordered(self, category: str, questions: List[str], contract_type: Optional[str] = None) -> List[str]:
+        """questions in win-rate order without pruned templates (at least one always remains);
+        templates the policy has not seen keep their place at the end"""
+        ranked = self.order.get(category)
+        if ranked:
+            position = {question: index for index, question in enumerate(ranked)}
+            questions = sorted(questions, key=lambda question: position.get(question, len(ranked)))
+        pruned = self.pruned_by_type.get(contract_type, {}).get(category, self.pruned.get(category))
+        if pruned:
+            kept = [question for question in questions if question not in pruned]
+            questions = kept or questions[:1]
+        return list(questions)
+
+    def threshold(self, category: str) -> Optional[float]:
+        return self.thresholds.get(category)
+
+    def to_dict(self) -> Dict:
+        return {"order": self.order, "thresholds": self.thresholds, "pruned": self.pruned,
+                "pruned_by_type": self.pruned_by_type, "meta": self.meta}
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "TemplatePolicy":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("order"), data.get("thresholds"), data.get("meta"), data.get("pruned"),
+                   data.get("pruned_by_type"))
+
+
+def policy_path(model_path: str) -> str:
+    return os.getenv("TEMPLATE_POLICY_PATH") or os.path.join(model_path, POLICY_FILENAME)
+
+
+def load_policy(model_path: str) -> Optional[TemplatePolicy]:
+    """The model's template policy, or None when there is none (every template runs)"""
+    if os.getenv("ADAPTIVE_TEMPLATES", "1").lower() in ("0", "false", "no"):
+        return None
+    path = policy_path(model_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        policy = TemplatePolicy.load(path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Ignoring template policy {path}: {e}")
+        return None
+    print(f"✅ Template policy loaded: early exit for {len(policy.thresholds)} categories")
+    return policy
+
+
+def win_counts(usage: List[Dict], contract_type: Optional[str] = None) -> Dict[str, Counter]:
+    """category -> Counter of winning questions, from AnalysisStore.question_usage() rows"""
+    wins = defaultdict(Counter)
+    for row in usage:
+        if contract_type is None or row["contract_type"] == contract_type:
+            wins[row["category"]][row["question_used"]] += row["wins"]
+    return wins
+
+
+def order_by_win_rate(templates: Dict[str, List[str]], wins: Dict[str, Counter], prior: float = 1.0) -> Dict[str, List[str]]:
+    """Templates per category sorted by smoothed win rate; ties keep the original order"""
+    order = {}
+    for category, questions in templates.items():
+        counts = wins.get(category, Counter())
+        total = sum(counts[question] for question in questions)
+        rate = {question: (counts[question] + prior) / (total + prior * len(questions)) for question in questions}
+        order[category] = sorted(questions, key=lambda question: -rate[question])
+    return order
+
+
+def reorder(trace: List, questions: List[str]) -> List:
+    """A question's recorded template answers, rearranged into the given question order"""
+    by_question = {step[0]: step for step in trace}
+    return [by_question[question] for question in questions]
+
+
+def _exit_profile(trace) -> (float, np.ndarray):
+    """(critical confidence, best confidence after each template) of one question's template answers.
+
+    Mirrors EnhancedCUADAnalyzer.select_best_answer(): an early exit at a
+    threshold gives the full-run answer exactly when threshold > critical.
+    """
+    best = 0.0
+    best_so_far = []
+    final_position = 0
+    for position, (_, answer, confidence) in enumerate(trace):
+        if confidence > best and len(answer.strip()) > 3:
+            best = confidence
+            final_position = position
+        best_so_far.append(best)
+    critical = best_so_far[final_position - 1] if final_position > 0 else 0.0
+    return critical, np.array(best_so_far)
+
+
+def calibrate_thresholds(traces: Dict[str, List], target_agreement: float = DEFAULT_TARGET_AGREEMENT,
+                         min_questions: int = MIN_CALIBRATION_QUESTIONS) -> (Dict[str, float], Dict[str, Dict]):
+    """Lowest per-category threshold whose early exits agree with the full run often enough.
+
+    traces: category -> per question, the (question, answer, confidence) of
+    every template in policy order. Categories with fewer than min_questions
+    questions get no threshold (all templates keep running).
+    """
+    thresholds, report = {}, {}
+    for category, category_traces in traces.items():
+        if len(category_traces) < min_questions:
+            report[category] = {"questions": len(category_traces), "threshold": None}
+            continue
+        profiles = [_exit_profile(trace) for trace in category_traces]
+        critical = np.sort([profile[0] for profile in profiles])
+        needed = math.ceil(target_agreement * len(critical))
+        threshold = float(np.nextafter(max(critical[needed - 1], 0.0), 1.0))
+
+        saved = [len(best_so_far) - (int(np.argmax(best_so_far >= threshold)) + 1)
+                 if (best_so_far >= threshold).any() else 0 for _, best_so_far in profiles]
+        thresholds[category] = threshold
+        report[category] = {
+            "questions": len(category_traces),
+            "threshold": round(threshold, 6),
+            "agreement": round(float(np.mean(critical < threshold)), 4),
+            "forwards_saved_per_question": round(float(np.mean(saved)), 3)
+        }
+    return thresholds, report
+
+
+def main():
+    import argparse
+    import itertools
+
+    from analysis_store import AnalysisStore
+    from cuad_evaluation import ANALYZER_CATEGORIES, OVERALL, ScoreAccumulator, analyzer_context, iter_cuad_examples
+    from enhanced_analyzer import EnhancedCUADAnalyzer
+
+    parser = argparse.ArgumentParser(description="Build the win-rate template order and early-exit thresholds")
+    parser.add_argument("--dataset", required=True, help="CUAD evaluation set used to calibrate thresholds")
+    parser.add_argument("--model-path", default="./")
+    parser.add_argument("--store", help="Analysis store with logged question_used values (default: ANALYSIS_STORE_PATH)")
+    parser.add_argument("--limit", type=int, help="Calibrate on the first N questions only")
+    parser.add_argument("--target-agreement", type=float, default=DEFAULT_TARGET_AGREEMENT,
+                        help="Share of questions where early exit must give the full-run answer")
+    parser.add_argument("--min-questions", type=int, default=MIN_CALIBRATION_QUESTIONS)
+    parser.add_argument("--output", help=f"Policy file (default: {POLICY_FILENAME} in the model directory)")
+    args = parser.parse_args()
+
+    analyzer = EnhancedCUADAnalyzer(args.model_path, enable_groq_enhancement=False)
+    analyzer.template_policy = None
+    examples = iter_cuad_examples(args.dataset, sorted(ANALYZER_CATEGORIES))
+    examples = list(itertools.islice(examples, args.limit) if args.limit else examples)
+
+    # Every template's answer per question; template answers do not depend on the order they run in
+    contexts, traces = [], []
+    for example in examples:
+        category = ANALYZER_CATEGORIES[example["category"]]
+        context = analyzer_context(analyzer, example, category)
+        contexts.append((example, category))
+        traces.append(list(analyzer.template_answers(context, category, analyzer.templates_for(category))))
+
+    # Order templates by how often they won in production; the evaluation set decides if nothing is logged yet
+    usage = AnalysisStore(args.store).question_usage()
+    order_source = "analysis_store" if usage else "evaluation_set"
+    wins = win_counts(usage)
+    if not usage:
+        for (_, category), trace in zip(contexts, traces):
+            question_used = analyzer.select_best_answer(trace)[2]
+            if question_used:
+                wins[category][question_used] += 1
+    policy = TemplatePolicy(order_by_win_rate(analyzer.question_templates, wins))
+    output = args.output or policy_path(args.model_path)
+    previous = TemplatePolicy.load(output) if os.path.exists(output) else TemplatePolicy()
+    # Templates pruned by template_stats.py stay pruned across rebuilds
+    policy.pruned, policy.pruned_by_type = previous.pruned, previous.pruned_by_type
+
+    traces = [reorder(trace, policy.ordered(category, [step[0] for step in trace]))
+              for (_, category), trace in zip(contexts, traces)]
+    by_category = defaultdict(list)
+    for (_, category), trace in zip(contexts, traces):
+        by_category[category].append(trace)
+    policy.thresholds, calibration = calibrate_thresholds(by_category, args.target_agreement, args.min_questions)
+
+    # Accuracy and forwards with and without early exit, replayed from the recorded template answers
+    no_answer = analyzer.postprocess_answer("")
+    scores = {"full": ScoreAccumulator(), "adaptive": ScoreAccumulator()}
+    forwards_used = Counter()
+    for (example, category), trace in zip(contexts, traces):
+        for mode, threshold in (("full", None), ("adaptive", policy.threshold(category))):
+            answer, confidence, _, forwards = analyzer.select_best_answer(trace, threshold)
+            answer = analyzer.postprocess_answer(answer)
+            answer = "" if answer == no_answer else answer
+            scores[mode].add(example["category"], example["answers"], answer,
+                             [{"text": answer, "probability": float(confidence)}] if answer else [])
+            forwards_used[mode] += forwards
+    forwards_full, forwards_adaptive = forwards_used["full"], forwards_used["adaptive"]
+    contracts = len({example["title"] or example["context"] for example, _ in contexts}) or 1
+
+    full_f1, adaptive_f1 = scores["full"].report()[OVERALL]["f1"], scores["adaptive"].report()[OVERALL]["f1"]
+    policy.meta = {
+        "built_at": datetime.now().isoformat(),
+        "dataset": args.dataset,
+        "questions": len(contexts),
+        "order_source": order_source,
+        "target_agreement": args.target_agreement,
+        "calibration": calibration,
+        "f1_all_templates": full_f1,
+        "f1_early_exit": adaptive_f1,
+        "forwards_saved_per_contract": round((forwards_full - forwards_adaptive) / contracts, 3)
+    }
+    if "pruning" in previous.meta:
+        policy.meta["pruning"] = previous.meta["pruning"]
+    policy.save(output)
+
+    print(f"\n{'Category':25s} {'N':>5s} {'threshold':>10s} {'agreement':>10s} {'saved/q':>8s}")
+    for category, row in sorted(calibration.items()):
+        if row["threshold"] is None:
+            print(f"{category:25s} {row['questions']:5d} {'(too few)':>10s}")
+        else:
+            print(f"{category:25s} {row['questions']:5d} {row['threshold']:10.4g} {row['agreement']:10.2%} "
+                  f"{row['forwards_saved_per_question']:8.2f}")
+    print(f"\nTemplate order from {order_source}; F1 {full_f1:.2f} with all templates, {adaptive_f1:.2f} with early exit")
+    print(f"Forwards per contract: {forwards_full / contracts:.2f} -> {forwards_adaptive / contracts:.2f} "
+          f"(saved {policy.meta['forwards_saved_per_contract']:.2f})")
+    print(f"Policy written to {output}")
+
+
+if __name__ == "__main__":
+    structured_logging.quiet_offline_run()
+    main()
@@ -0,0 +1,270 @@
+"""
+Template Win-Rate Statistics and Pruning
+========================================
+Offline job that measures, per category and contract type, which question
+templates actually decide the answer and prunes the ones that almost never
+do, so steady-state inference runs fewer forwards.
+
+For every template it reports:
+- production win rate: share of logged analyses (question_used in the
+  analysis store) where the template gave the kept answer
+- evaluation win rate and change rate: on a CUAD evaluation set, how often
+  the template wins and how often removing it changes the final answer
+- marginal F1: F1 points lost on the evaluation set when only this template
+  is removed
+
+A template is pruned when its win rate is below --min-win-rate (production
+counts when there are at least --min-observations of them, the evaluation
+set otherwise) and pruning it keeps the group's evaluation F1 within
+--max-f1-drop points of running every template. Per contract type pruning
+is only written where it differs from the category-wide decision. The
+replay applies the model's template policy (order and early exit), so the
+reported F1 and forwards are what the analyzer will actually do.
+
+Runtime counterparts are the contract_template_outcomes_total and
+contract_template_marginal_gain_total metrics on /metrics.
+
+    python template_stats.py --dataset CUAD_v1/test.json --model-path ./ --apply
+"""
+import json
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import structured_logging
+from template_policy import MIN_CALIBRATION_QUESTIONS, TemplatePolicy, policy_path, win_counts
+
+DEFAULT_MIN_WIN_RATE = 0.02
+DEFAULT_MAX_F1_DROP = 0.5
+DEFAULT_MIN_OBSERVATIONS = 50
+ALL_TYPES = "all"
+
+
+def production_wins(usage: List[Dict]) -> Dict[str, Dict[str, Counter]]:
+    """contract type ('all' for every type) -> category -> Counter of winning questions"""
+    wins = {ALL_TYPES: win_counts(usage)}
+    for contract_type in {row["contract_type"] for row in usage}:
+        wins[contract_type] = win_counts(usage, contract_type)
+    return wins
+
+
+class TemplateReplay:
+    """Replays recorded template answers of an evaluation set under any template policy.
+
+    records: dicts with category, contract_type, answers (gold texts) and
+    trace, the (question, answer, confidence) of every template of the
+    category in question_templates order.
+    """
+
+    def __init__(self, analyzer, records: List[Dict]):
+        self.analyzer = analyzer
+        self.records = records
+        self.no_answer = analyzer.postprocess_answer("")
+
+    def group(self, category: str, contract_type: Optional[str] = None) -> List[Dict]:
+        return [record for record in self.records if record["category"] == category and
+                (contract_type in (None, ALL_TYPES) or record["contract_type"] == contract_type)]
+
+    def predict(self, record: Dict, policy: TemplatePolicy, removed=()) -> (str, str, int):
+        """(answer, question used, forwards) of one question under the policy, without the removed templates"""
+        questions = [step[0] for step in record["trace"]]
+        ordered = policy.ordered(record["category"], questions, record["contract_type"])
+        by_question = {step[0]: step for step in record["trace"]}
+        trace = [by_question[question] for question in ordered if question not in removed]
+        answer, _, question_used, forwards = self.analyzer.select_best_answer(
+            trace, policy.threshold(record["category"]))
+        answer = self.analyzer.postprocess_answer(answer)
+        return ("" if answer == self.no_answer else answer), question_used, forwards
+
+    def score(self, records: List[Dict], policy: TemplatePolicy, removed=()) -> (float, float):
+        """(F1 in points, forwards per question) of the records under the policy"""
+        from cuad_evaluation import token_f1
+
+        if not records:
+            return 0.0, 0.0
+        f1, forwards = [], []
+        for record in records:
+            answer, _, used = self.predict(record, policy, removed)
+            f1.append(max(token_f1(answer, gold) for gold in record["answers"] or [""]))
+            forwards.append(used)
+        return round(100.0 * float(np.mean(f1)), 2), round(float(np.mean(forwards)), 3)
+
+    def template_table(self, records: List[Dict], questions: List[str], policy: TemplatePolicy) -> Dict[str, Dict]:
+        """question -> evaluation wins, win rate, change rate and marginal F1 over the records"""
+        unrestricted = TemplatePolicy(order=policy.order, thresholds=policy.thresholds)
+        baseline_f1, _ = self.score(records, unrestricted)
+        baseline = [self.predict(record, unrestricted) for record in records]
+        wins = Counter(question_used for _, question_used, _ in baseline if question_used)
+
+        table = {}
+        for question in questions:
+            changed = sum(self.predict(record, unrestricted, {question})[0] != answer
+                          for record, (answer, _, _) in zip(records, baseline))
+            f1_without, _ = self.score(records, unrestricted, {question})
+            table[question] = {
+                "eval_wins": wins[question],
+                "eval_win_rate": round(wins[question] / len(records), 4) if records else 0.0,
+                "change_rate": round(changed / len(records), 4) if records else 0.0,
+                "marginal_f1": round(baseline_f1 - f1_without, 2)
+            }
+        return table
+
+
+def prune_group(replay: TemplateReplay, records: List[Dict], questions: List[str], policy: TemplatePolicy,
+                win_rate: Dict[str, float], category: str, contract_type: Optional[str],
+                min_win_rate: float, max_f1_drop: float) -> (List[str], float, float):
+    """Greedily prune the least-winning templates below min_win_rate while the F1 drop on the
+    records stays within max_f1_drop; at least one template is kept. Returns (pruned, F1 before, F1 after)"""
+    def with_pruned(pruned):
+        trial = TemplatePolicy(order=policy.order, thresholds=policy.thresholds)
+        if contract_type in (None, ALL_TYPES):
+            trial.pruned = {category: pruned}
+        else:
+            trial.pruned_by_type = {contract_type: {category: pruned}}
+        return trial
+
+    baseline_f1, _ = replay.score(records, with_pruned([]))
+    pruned, pruned_f1 = [], baseline_f1
+    candidates = sorted((question for question in questions if win_rate.get(question, 0.0) < min_win_rate),
+                        key=lambda question: win_rate.get(question, 0.0))
+    for question in candidates:
+        if len(pruned) + 1 >= len(questions):
+            break
+        trial_f1, _ = replay.score(records, with_pruned(pruned + [question]))
+        if baseline_f1 - trial_f1 <= max_f1_drop:
+            pruned.append(question)
+            pruned_f1 = trial_f1
+    return pruned, baseline_f1, pruned_f1
+
+
+def main():
+    import argparse
+    import itertools
+
+    from analysis_store import AnalysisStore
+    from cuad_evaluation import ANALYZER_CATEGORIES, analyzer_context, iter_cuad_examples
+    from enhanced_analyzer import EnhancedCUADAnalyzer
+
+    parser = argparse.ArgumentParser(description="Template win rates per category and contract type, with pruning")
+    parser.add_argument("--dataset", required=True, help="CUAD evaluation set used to measure accuracy impact")
+    parser.add_argument("--model-path", default="./")
+    parser.add_argument("--store", help="Analysis store with logged question_used values (default: ANALYSIS_STORE_PATH)")
+    parser.add_argument("--limit", type=int, help="Replay the first N questions only")
+    parser.add_argument("--min-win-rate", type=float, default=DEFAULT_MIN_WIN_RATE,
+                        help="Templates winning less often than this are pruning candidates")
+    parser.add_argument("--max-f1-drop", type=float, default=DEFAULT_MAX_F1_DROP,
+                        help="F1 points a group may lose to pruning")
+    parser.add_argument("--min-observations", type=int, default=DEFAULT_MIN_OBSERVATIONS,
+                        help="Logged analyses needed before production win rates are trusted")
+    parser.add_argument("--min-questions", type=int, default=MIN_CALIBRATION_QUESTIONS,
+                        help="Evaluation questions needed to measure a group's accuracy impact")
+    parser.add_argument("--apply", action="store_true", help="Write the pruned templates into the template policy")
+    parser.add_argument("--output", help="Write the statistics as JSON to this file")
+    args = parser.parse_args()
+
+    analyzer = EnhancedCUADAnalyzer(args.model_path, enable_groq_enhancement=False)
+    path = policy_path(args.model_path)
+    policy = analyzer.template_policy or (TemplatePolicy.load(path) if os.path.exists(path) else TemplatePolicy())
+    policy.pruned, policy.pruned_by_type = {}, {}
+    analyzer.template_policy = None
+    examples = iter_cuad_examples(args.dataset, sorted(ANALYZER_CATEGORIES))
+    examples = list(itertools.islice(examples, args.limit) if args.limit else examples)
+
+    # Every template's answer per question, in question_templates order
+    contract_types = {}
+    records = []
+    for example in examples:
+        category = ANALYZER_CATEGORIES[example["category"]]
+        if example["context"] not in contract_types:
+            contract_types[example["context"]] = analyzer.detect_contract_type(example["context"])
+        context = analyzer_context(analyzer, example, category)
+        records.append({
+            "category": category,
+            "contract_type": contract_types[example["context"]],
+            "answers": example["answers"],
+            "trace": list(analyzer.template_answers(context, category, analyzer.question_templates[category]))
+        })
+    replay = TemplateReplay(analyzer, records)
+
+    wins = production_wins(AnalysisStore(args.store).question_usage())
+    groups = [(ALL_TYPES, category) for category in sorted({record["category"] for record in records})]
+    groups += sorted({(record["contract_type"], record["category"]) for record in records})
+
+    stats = []
+    for contract_type, category in groups:
+        questions = analyzer.question_templates[category]
+        group_records = replay.group(category, contract_type)
+        logged = wins.get(contract_type, {}).get(category, Counter())
+        observations = sum(logged.values())
+        table = replay.template_table(group_records, questions, policy)
+        if observations >= args.min_observations:
+            source, win_rate = "analysis_store", {question: logged[question] / observations for question in questions}
+        else:
+            source, win_rate = "evaluation_set", {question: table[question]["eval_win_rate"] for question in questions}
+
+        row = {"contract_type": contract_type, "category": category, "observations": observations,
+               "questions": len(group_records), "win_rate_source": source, "pruned": [], "templates": []}
+        for index, question in enumerate(questions):
+            row["templates"].append({
+                "template": index,
+                "question": question,
+                "production_wins": logged[question],
+                "production_win_rate": round(logged[question] / observations, 4) if observations else None,
+                **table[question]
+            })
+        if len(group_records) >= args.min_questions:
+            pruned, f1_before, f1_after = prune_group(replay, group_records, questions, policy, win_rate, category,
+                                                      contract_type, args.min_win_rate, args.max_f1_drop)
+            row.update(pruned=pruned, f1_all_templates=f1_before, f1_pruned=f1_after)
+            if contract_type == ALL_TYPES:
+                if pruned:
+                    policy.pruned[category] = pruned
+            elif sorted(pruned) != sorted(policy.pruned.get(category, [])):
+                policy.pruned_by_type.setdefault(contract_type, {})[category] = pruned
+        stats.append(row)
+
+    # Accuracy and forwards of the whole evaluation set with and without pruning
+    unpruned = TemplatePolicy(order=policy.order, thresholds=policy.thresholds)
+    f1_before, forwards_before = replay.score(records, unpruned)
+    f1_after, forwards_after = replay.score(records, policy)
+    summary = {
+        "built_at": datetime.now().isoformat(),
+        "dataset": args.dataset,
+        "questions": len(records),
+        "min_win_rate": args.min_win_rate,
+        "max_f1_drop": args.max_f1_drop,
+        "f1_before_pruning": f1_before,
+        "f1_after_pruning": f1_after,
+        "forwards_per_question_before": forwards_before,
+        "forwards_per_question_after": forwards_after
+    }
+
+    print(f"\n{'Contract type':16s} {'Category':25s} {'#':>2s} {'prod win':>9s} {'eval win':>9s} "
+          f"{'changes':>8s} {'marg F1':>8s}")
+    for row in stats:
+        for template in row["templates"]:
+            production = template["production_win_rate"]
+            production = "-" if production is None else f"{production:.1%}"
+            marker = "  pruned" if template["question"] in row["pruned"] else ""
+            print(f"{row['contract_type']:16s} {row['category']:25s} {template['template']:2d} {production:>9s} "
+                  f"{template['eval_win_rate']:9.1%} {template['change_rate']:8.1%} "
+                  f"{template['marginal_f1']:8.2f}{marker}")
+    print(f"\nF1 {f1_before:.2f} -> {f1_after:.2f} after pruning; "
+          f"forwards per question {forwards_before:.2f} -> {forwards_after:.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "groups": stats}, f, indent=2)
+        print(f"Statistics written to {args.output}")
+    if args.apply:
+        policy.meta["pruning"] = summary
+        policy.save(path)
+        print(f"Pruned templates written to {path}")
+
+
+if __name__ == "__main__":
+    structured_logging.quiet_offline_run()
+    main()
@@ -4,6 +4,7 @@ Test script for fine-tuned RoBERTa model on CUAD dataset
 import torch
 from transformers import RobertaTokenizer, RobertaForQuestionAnswering
 import json
+from clause_segmenter import segment_contract
 
 class CUADModelTester:
     def __init__(self, model_path="./"):
@@ -96,22 +97,9 @@ class CUADModelTester:
     
     def preprocess_context(self, context):
         """Clean and preprocess the contract text"""
-        # Remove extra whitespace and normalize
-        context = ' '.join(context.split())
-        
-        # Add section markers for better understanding
-        context = context.replace('GOVERNING LAW:', '\n[GOVERNING LAW]:')
-        context = context.replace('PAYMENT TERMS:', '\n[PAYMENT TERMS]:')
-        context = context.replace('TERMINATION:', '\n[TERMINATION]:')
-        context = context.replace('LIABILITY:', '\n[LIABILITY]:')
-        context = context.replace('INTELLECTUAL PROPERTY:', '\n[INTELLECTUAL PROPERTY]:')
-        context = context.replace('CONFIDENTIALITY:', '\n[CONFIDENTIALITY]:')
-        context = context.replace('FORCE MAJEURE:', '\n[FORCE MAJEURE]:')
-        context = context.replace('WARRANTY:', '\n[WARRANTY]:')
-        context = context.replace('DISPUTE RESOLUTION:', '\n[DISPUTE RESOLUTION]:')
-        context = context.replace('RENEWAL:', '\n[RENEWAL]:')
-        
-        return context
+        # Normalize whitespace and add a [SECTION]: marker for every heading
+        # found by the clause segmenter
+        return segment_contract(context).render_with_markers()
     
     def postprocess_answer(self, answer, question):
         """Clean up the extracted answer"""
@@ -0,0 +1,263 @@
+"""
+Request Tracing
+===============
+Lightweight structured tracing for the analysis pipeline. Each HTTP request
+gets a trace id (returned in the X-Trace-Id header); spans opened while it is
+handled (analyzer stages, model forwards, Groq attempts) are nested under it
+and written as JSON lines to a local file, so slow requests can be
+reconstructed offline:
+
+    with span("extract_relevant_context", category=category):
+        ...
+"""
+import contextvars
+import functools
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+TRACE_HEADER = "X-Trace-Id"
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", str(Path(__file__).parent / "traces.jsonl"))
+TRACE_LOG_MAX_BYTES = int(os.getenv("TRACE_LOG_MAX_BYTES", str(100 * 1024 * 1024)))
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1").lower() not in ("0", "false", "no")
+
+TRACE_ID_RE = re.compile(r"^[0-9a-fA-F-]{8,64}$")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def valid_trace_id(value: Optional[str]) -> bool:
+    """Accept caller-supplied trace ids only if they look like ids (they end up in logs)"""
+    return bool(value) and bool(TRACE_ID_RE.match(value))
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start", "start_time",
+                 "duration", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, attributes: Optional[Dict] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start_time = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes):
+        """Attach attributes learned while the span runs (status codes, sizes, ...)"""
+        self.attributes.update(attributes)
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.duration = time.perf_counter() - self.start
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict:
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start_time, 6),
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attributes": self.attributes
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class TraceSink:
+    """Appends finished spans to a JSONL file from a background writer thread.
+
+    Request threads only enqueue; the writer batches whatever is queued into
+    one write and rotates the file to <path>.1 once it exceeds max_bytes.
+    """
+
+    def __init__(self, path: str = TRACE_LOG_PATH, max_bytes: int = TRACE_LOG_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._idle = threading.Event()
+        self._idle.set()
+
+    def write(self, span: Span):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-sink", daemon=True)
+                self._thread.start()
+            self._pending += 1
+            self._idle.clear()
+        self._queue.put(span)
+
+    def _run(self):
+        while True:
+            spans = [self._queue.get()]
+            while True:
+                try:
+                    spans.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._append("".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans))
+            except Exception as e:
+                print(f"⚠️ Could not write {len(spans)} trace spans: {e}")
+            with self._lock:
+                self._pending -= len(spans)
+                if not self._pending:
+                    self._idle.set()
+
+    def _append(self, lines: str):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            if os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+        except FileNotFoundError:
+            pass
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    def flush(self, timeout: Optional[float] = 5.0) -> bool:
+        """Wait until every queued span has been written"""
+        return self._idle.wait(timeout)
+
+
+sink = TraceSink()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    active = _current_span.get()
+    return active.trace_id if active else None
+
+
+def start_span(name: str, trace_id: Optional[str] = None, **attributes):
+    """Open a span and make it current; returns (span, token) for end_span().
+
+    Children of the current span share its trace id; a span opened with no
+    current span starts a new trace (with trace_id, if given).
+    """
+    parent = _current_span.get()
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        trace_id, parent_id = trace_id or new_trace_id(), None
+    opened = Span(name, trace_id, parent_id, attributes)
+    return opened, _current_span.set(opened)
+
+
+def end_span(opened: Span, token, error: Optional[BaseException] = None):
+    opened.finish(error)
+    _current_span.reset(token)
+    if TRACING_ENABLED:
+        sink.write(opened)
+
+
+class span:
+    """Context manager form of start_span()/end_span(); yields the Span"""
+    __slots__ = ("name", "attributes", "opened", "token")
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> Span:
+        self.opened, self.token = start_span(self.name, **self.attributes)
+        return self.opened
+
+    def __exit__(self, exc_type, exc, traceback):
+        end_span(self.opened, self.token, exc)
+        return False
+
+
+def traced(name: str):
+    """Decorator running the whole function inside a span"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def load_trace(trace_id: str, path: str = TRACE_LOG_PATH):
+    """All spans of one trace from the sink (and its rotated predecessor), in start order"""
+    spans = []
+    for candidate in (f"{path}.1", path):
+        if not os.path.exists(candidate):
+            continue
+        with open(candidate, encoding="utf-8") as f:
+            for line in f:
+                if trace_id in line:
+                    record = json.loads(line)
+                    if record["trace_id"] == trace_id:
+                        spans.append(record)
+    return sorted(spans, key=lambda record: record["start"])
+
+
+def format_trace(spans) -> str:
+    """Indented span tree with durations, slowest path easy to spot"""
+    children = {}
+    for record in spans:
+        children.setdefault(record["parent_id"], []).append(record)
+    known = {record["span_id"] for record in spans}
+
+    lines = []
+
+    def walk(record, depth):
+        attributes = " ".join(f"{key}={value}" for key, value in record["attributes"].items())
+        error = f" ERROR {record['error']}" if record.get("error") else ""
+        lines.append(f"{'  ' * depth}{record['name']} {record['duration_ms']:.1f}ms {attributes}{error}".rstrip())
+        for child in children.get(record["span_id"], []):
+            walk(child, depth + 1)
+
+    for record in spans:
+        if record["parent_id"] is None or record["parent_id"] not in known:
+            walk(record, 0)
+    return "\n".join(lines)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show the spans of a traced request")
+    parser.add_argument("trace_id", help="Value of the X-Trace-Id response header")
+    parser.add_argument("--path", default=TRACE_LOG_PATH, help="Trace JSONL file")
+    parser.add_argument("--json", action="store_true", help="Print raw span records")
+    args = parser.parse_args()
+
+    spans = load_trace(args.trace_id, args.path)
+    if not spans:
+        print(f"No spans found for trace {args.trace_id} in {args.path}")
+        return
+    if args.json:
+        for record in spans:
+            print(json.dumps(record))
+    else:
+        print(format_trace(spans))
+
+
+if __name__ == "__main__":
+    main()
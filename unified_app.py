@@ -3,14 +3,25 @@ Unified Flask Server - Serves both Landing Page and Contract Analysis
 ===================================================================
 This combines your React landing page with the premium contract analysis app
 """
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, g, Response
 from flask_cors import CORS
 import os
+import hmac
 import json
 import tempfile
+import time
 from datetime import datetime
-from enhanced_analyzer import EnhancedCUADAnalyzer
+from html import escape
 from advanced_features import AdvancedContractProcessor, create_sample_app_agreements
+from clause_segmenter import segment_contract
+from analysis_store import AnalysisStore, period_bounds
+from portfolio_analytics import PortfolioAggregator
+from document_ingestion import MAX_ARCHIVE_BYTES, UploadTooLarge, ingest_uploads
+from model_loader import FAILED, READY, ModelInitializer
+import metrics
+import profiling
+import tracing
+from structured_logging import HOT, get_logger, hot
 from pathlib import Path
 from contract_creator import ContractCreator
 from whatsapp_integration import WhatsAppContractSender, AdvancedWhatsAppSender
@@ -18,34 +29,141 @@ from whatsapp_integration import WhatsAppContractSender, AdvancedWhatsAppSender
 app = Flask(__name__, 
            static_folder='static',
            template_folder='templates')
+# Reject oversized request bodies before werkzeug parses them: room for one
+# maximal ZIP archive plus multipart framing
+app.config['MAX_CONTENT_LENGTH'] = MAX_ARCHIVE_BYTES + 1024 * 1024
 
 # Enable CORS for all routes
 CORS(app)
 
+logger = get_logger("api")
+
 # Global variables
 enhanced_analyzer = None
 processor = None
+incremental_analyzer = None
+analysis_store = None
+portfolio_analytics = None
+model_readiness = {}
 
-def load_enhanced_system():
-    """Load YOUR enhanced analyzer and processor"""
-    global enhanced_analyzer, processor
+# Sequence lengths exercised by the warm-up before the server reports ready
+WARMUP_SEQ_LENGTHS = [int(length) for length in os.getenv('WARMUP_SEQ_LENGTHS', '128,256,512').split(',') if length]
+
+def load_analysis_store():
+    """Open the analysis store (fast; stored analyses stay queryable while the model loads)"""
+    global analysis_store, portfolio_analytics
     try:
-        print("Loading YOUR fine-tuned CUAD analyzer...")
-        # Load YOUR fine-tuned model (Groq enhancement disabled by default)
-        enhanced_analyzer = EnhancedCUADAnalyzer('./', enable_groq_enhancement=False)
-        print("✅ YOUR fine-tuned analyzer loaded successfully")
-        
-        print("Loading advanced processor...")
-        processor = AdvancedContractProcessor(enhanced_analyzer)
-        print("✅ Advanced processor loaded successfully")
-        
+        analysis_store = AnalysisStore()
+        portfolio_analytics = PortfolioAggregator(analysis_store)
+        print(f"✅ Analysis store opened ({analysis_store.count()} stored analyses)")
     except Exception as e:
-        print(f"❌ Error loading YOUR enhanced system: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        # Don't let the server fail to start, but log the error
-        enhanced_analyzer = None
-        processor = None
+        print(f"❌ Error opening analysis store: {str(e)}")
+        analysis_store = None
+        portfolio_analytics = None
+
+def load_enhanced_system():
+    """Load YOUR enhanced analyzer and processor (runs on the model loader thread)"""
+    global enhanced_analyzer, processor, incremental_analyzer, model_readiness
+    # torch and transformers are only imported here, so the server binds without them
+    from enhanced_analyzer import EnhancedCUADAnalyzer
+    
+    print("Loading YOUR fine-tuned CUAD analyzer...")
+    # Load YOUR fine-tuned model (Groq enhancement disabled by default)
+    analyzer = EnhancedCUADAnalyzer(os.getenv('MODEL_PATH', './'), enable_groq_enhancement=False)
+    print("✅ YOUR fine-tuned analyzer loaded successfully")
+    
+    # Warm up before reporting ready, so load balancers only route to warm workers
+    print(f"Warming up model at sequence lengths {WARMUP_SEQ_LENGTHS}...")
+    warmup = analyzer.warm_up(WARMUP_SEQ_LENGTHS)
+    print(f"✅ Warm-up finished in {sum(step['seconds'] for step in warmup):.2f}s")
+    
+    print("Loading advanced processor...")
+    loaded_processor = AdvancedContractProcessor(analyzer, analysis_store)
+    print("✅ Advanced processor loaded successfully")
+    
+    # Publish only fully initialized objects; the processor's analysis cache is shared with the incremental endpoint
+    processor = loaded_processor
+    incremental_analyzer = loaded_processor.incremental
+    model_readiness = {'model': analyzer.model_info(), 'warmup': warmup}
+    metrics.MODEL_MEMORY.set(analyzer.model_memory_bytes(), model='YOUR_FINE_TUNED_ROBERTA_CUAD')
+    enhanced_analyzer = analyzer
+
+model_initializer = ModelInitializer(load_enhanced_system, name="YOUR fine-tuned model")
+
+# Endpoints that need the model; they answer 503 until it is ready
+MODEL_ENDPOINTS = {
+    'analyze_single_contract', 'analyze_incremental', 'batch_analyze_contracts', 'upload_contracts',
+    'compare_contracts', 'contract_templates', 'compare_to_library', 'check_app_compliance',
+    'enhanced_analysis', 'export_report', 'detailed_risk_assessment', 'test_analyzer', 'enhance_contract'
+}
+
+# Registered before the model gate, so 503s are timed and counted too
+@app.before_request
+def start_request_metrics():
+    """Track in-flight requests and start the latency clock"""
+    g.metrics_start = time.perf_counter()
+    metrics.IN_FLIGHT.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    """Per-endpoint request count and latency (unmatched URLs share one label)"""
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        endpoint = request.endpoint or 'unmatched'
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+        metrics.HTTP_REQUESTS.inc(endpoint=endpoint, status=str(response.status_code))
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    metrics.IN_FLIGHT.dec()
+
+@app.before_request
+def start_request_trace():
+    """Open the request's root span; callers may pass their own X-Trace-Id to join a trace"""
+    incoming = request.headers.get(tracing.TRACE_HEADER)
+    trace_id = incoming if tracing.valid_trace_id(incoming) else None
+    g.trace_span, g.trace_token = tracing.start_span(
+        f"{request.method} {request.path}", trace_id=trace_id, endpoint=request.endpoint)
+
+@app.after_request
+def add_trace_header(response):
+    """Return the trace id so a slow request can be looked up in the trace log"""
+    trace_span = g.get('trace_span')
+    if trace_span is not None:
+        trace_span.set(status=response.status_code)
+        response.headers[tracing.TRACE_HEADER] = trace_span.trace_id
+    return response
+
+@app.teardown_request
+def finish_request_trace(error=None):
+    trace_span = g.pop('trace_span', None)
+    if trace_span is not None:
+        tracing.end_span(trace_span, g.pop('trace_token'), error)
+
+# Polling these should not use up a request-scoped profiling session
+UNPROFILED_ENDPOINTS = {'admin_profile', 'prometheus_metrics', 'liveness', 'readiness', 'static'}
+
+@app.before_request
+def start_request_profile():
+    """Profile this request if an admin started a request-scoped profiling session"""
+    if request.endpoint not in UNPROFILED_ENDPOINTS:
+        g.profile_token = profiling.profiler.request_started()
+
+@app.teardown_request
+def finish_request_profile(error=None):
+    profiling.profiler.request_finished(g.pop('profile_token', None))
+
+@app.before_request
+def require_loaded_model():
+    """Answer model endpoints with 503 while the model is still loading"""
+    if request.endpoint in MODEL_ENDPOINTS and not model_initializer.is_ready:
+        status = model_initializer.status()
+        message = 'Model is still loading, retry shortly' if status['state'] != 'failed' else 'Model failed to load'
+        response = jsonify({'error': message, 'model_status': status})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
 
 # Serve React App (Landing Page)
 @app.route('/')
@@ -77,41 +195,83 @@ def analyze_single_contract():
         if not enhanced_analyzer:
             return jsonify({'error': 'Analyzer not initialized'}), 500
         
-        print(f"Starting analysis for contract: {contract_name}")
+        logger.info("Starting analysis", extra=hot(contract=contract_name, characters=len(contract_text)))
         
         # Comprehensive analysis with error handling
+        near_duplicate = None
+        analysis_id = None
         try:
-            results = enhanced_analyzer.analyze_contract_comprehensive(contract_text)
-            print("CUAD analysis completed successfully")
+            if processor:
+                # Reuses the analysis of a near-duplicate contract when one was seen before
+                record = processor.analyze_with_history(contract_text, contract_name)
+                results = record['analysis']
+                near_duplicate = record['near_duplicate']
+                analysis_id = record['analysis_id']
+            else:
+                results = enhanced_analyzer.analyze_contract_comprehensive(contract_text)
+            logger.debug("CUAD analysis completed", extra=HOT)
         except Exception as e:
-            print(f"CUAD analysis failed: {str(e)}")
+            logger.exception("CUAD analysis failed", extra=hot(contract=contract_name))
             return jsonify({'error': f'CUAD analysis failed: {str(e)}'}), 500
         
         # Generate report with error handling
         try:
             if processor:
                 report = processor.generate_contract_report(results, contract_name)
-                print("Report generation completed")
+                logger.debug("Report generation completed", extra=HOT)
             else:
                 report = "Report generation not available"
-                print("Processor not available, skipping report generation")
+                logger.warning("Processor not available, skipping report generation", extra=HOT)
         except Exception as e:
-            print(f"Report generation failed: {str(e)}")
+            logger.exception("Report generation failed", extra=hot(contract=contract_name))
             report = f"Report generation failed: {str(e)}"
         
         return jsonify({
             'analysis': results,
             'report': report,
             'contract_name': contract_name,
+            'near_duplicate': near_duplicate,
+            'analysis_id': analysis_id,
             'timestamp': datetime.now().isoformat()
         })
         
     except Exception as e:
-        print(f"Analysis endpoint error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Analysis endpoint error", extra=HOT)
         return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
 
+@app.route('/api/analyze_incremental', methods=['POST'])
+def analyze_incremental():
+    """Re-analyze an edited contract, reusing the analysis of its previous version"""
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        contract_text = data.get('contract_text', '')
+        contract_name = data.get('contract_name', 'Unnamed Contract')
+        document_id = data.get('document_id')
+        
+        if not contract_text:
+            return jsonify({'error': 'Contract text is required'}), 400
+        
+        if not incremental_analyzer:
+            return jsonify({'error': 'Analyzer not initialized'}), 500
+        
+        results = incremental_analyzer.analyze(contract_text, document_id)
+        change_summary = results.pop('change_summary')
+        
+        return jsonify({
+            'analysis': results,
+            'change_summary': change_summary,
+            'document_id': change_summary['document_id'],
+            'contract_name': contract_name,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.exception("Incremental analysis error", extra=HOT)
+        return jsonify({'error': f'Incremental analysis failed: {str(e)}'}), 500
+
 @app.route('/api/batch_analyze', methods=['POST'])
 def batch_analyze_contracts():
     """Batch analysis of multiple contracts"""
@@ -136,6 +296,37 @@ def batch_analyze_contracts():
     except Exception as e:
         return jsonify({'error': f'Batch analysis failed: {str(e)}'}), 500
 
+@app.route('/api/upload_contracts', methods=['POST'])
+def upload_contracts():
+    """Batch analysis of uploaded files (multipart field "files": PDF, DOCX, TXT or ZIP archives)"""
+    uploads = request.files.getlist('files')
+    if not uploads:
+        return jsonify({'error': 'At least one file is required'}), 400
+    
+    if not processor:
+        return jsonify({'error': 'Analyzer not initialized'}), 500
+    
+    try:
+        ingestion = ingest_uploads([(upload.filename, upload.stream) for upload in uploads])
+        contracts = ingestion.pop('contracts')
+        logger.info("Ingested %d contracts from %d uploaded files", len(contracts), ingestion['files_received'],
+                    extra=hot(bytes_spooled=ingestion['bytes_spooled']))
+        
+        if not contracts:
+            return jsonify({'error': 'No analyzable contracts found', 'ingestion': ingestion}), 400
+        
+        results = processor.batch_analyze_contracts(contracts)
+        
+        return jsonify({
+            'batch_results': results,
+            'ingestion': ingestion,
+            'timestamp': datetime.now().isoformat()
+        })
+    except UploadTooLarge as e:
+        return jsonify({'error': f'Upload too large: {str(e)}'}), 413
+    except Exception as e:
+        return jsonify({'error': f'Upload analysis failed: {str(e)}'}), 500
+
 @app.route('/api/compare_contracts', methods=['POST'])
 def compare_contracts():
     """Compare two contracts"""
@@ -165,6 +356,137 @@ def compare_contracts():
     except Exception as e:
         return jsonify({'error': f'Comparison failed: {str(e)}'}), 500
 
+@app.route('/api/templates', methods=['GET', 'POST'])
+def contract_templates():
+    """List the template library or add templates to it"""
+    if request.method == 'GET':
+        return jsonify({
+            'templates': [
+                {'name': name, 'clauses': len(template['units'])}
+                for name, template in processor.template_library.templates.items()
+            ]
+        })
+    
+    data = request.json
+    templates = data.get('templates', []) if data else []
+    
+    if not templates:
+        return jsonify({'error': 'At least one template is required'}), 400
+    
+    try:
+        for template in templates:
+            if 'name' not in template or 'text' not in template:
+                return jsonify({'error': 'Each template must have name and text fields'}), 400
+        
+        added = [processor.add_template(template['name'], template['text']) for template in templates]
+        
+        return jsonify({
+            'added': added,
+            'templates_indexed': len(processor.template_library.templates),
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({'error': f'Adding templates failed: {str(e)}'}), 500
+
+@app.route('/api/compare_to_library', methods=['POST'])
+def compare_to_library():
+    """Compare a contract against the closest templates in the library"""
+    data = request.json
+    contract_text = data.get('contract_text', '') if data else ''
+    top_k = data.get('top_k', 3) if data else 3
+    
+    if not contract_text:
+        return jsonify({'error': 'Contract text is required'}), 400
+    try:
+        top_k = int(top_k)
+    except (TypeError, ValueError, OverflowError):
+        top_k = 0
+    if top_k < 1:
+        return jsonify({'error': 'top_k must be a positive integer'}), 400
+    
+    try:
+        comparison = processor.compare_with_templates(contract_text, top_k)
+        
+        return jsonify({
+            'library_comparison': comparison,
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({'error': f'Library comparison failed: {str(e)}'}), 500
+
+@app.route('/api/analyses')
+def list_analyses():
+    """Query stored analyses.
+    
+    Filters: risk (HIGH/MEDIUM/LOW), contract_type, governing_law, counterparty,
+    name, period (today/this_week/this_month/this_year) or since/until (ISO dates),
+    plus page and page_size. Example: ?risk=HIGH&contract_type=vendor_supply&period=this_month
+    """
+    if not analysis_store:
+        return jsonify({'error': 'Analysis store not initialized'}), 500
+    
+    try:
+        since = until = None
+        period = request.args.get('period')
+        if period:
+            since, until = period_bounds(period)
+        if request.args.get('since'):
+            since = datetime.fromisoformat(request.args['since']).timestamp()
+        if request.args.get('until'):
+            until = datetime.fromisoformat(request.args['until']).timestamp()
+        
+        results = analysis_store.query(
+            overall_risk=request.args.get('risk'),
+            contract_type=request.args.get('contract_type'),
+            governing_law=request.args.get('governing_law'),
+            counterparty=request.args.get('counterparty'),
+            since=since,
+            until=until,
+            name_contains=request.args.get('name'),
+            page=request.args.get('page', 1, type=int),
+            page_size=request.args.get('page_size', 20, type=int)
+        )
+        return jsonify(results)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Analysis query failed: {str(e)}'}), 500
+
+@app.route('/api/portfolio')
+def portfolio_summary():
+    """Portfolio-wide risk aggregates (served from memory, no rescans)"""
+    if not portfolio_analytics:
+        return jsonify({'error': 'Portfolio analytics not initialized'}), 500
+    
+    top_k = request.args.get('top_k', 10, type=int)
+    return jsonify({
+        'portfolio': portfolio_analytics.summary(top_k),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/api/portfolio/rebuild', methods=['POST'])
+def rebuild_portfolio():
+    """Recompute portfolio aggregates from the analysis store"""
+    if not portfolio_analytics:
+        return jsonify({'error': 'Portfolio analytics not initialized'}), 500
+    
+    try:
+        rebuilt = portfolio_analytics.rebuild()
+        return jsonify({'rebuilt': rebuilt, 'timestamp': datetime.now().isoformat()})
+    except Exception as e:
+        return jsonify({'error': f'Portfolio rebuild failed: {str(e)}'}), 500
+
+@app.route('/api/analyses/<int:analysis_id>')
+def get_stored_analysis(analysis_id):
+    """Full stored analysis by id"""
+    if not analysis_store:
+        return jsonify({'error': 'Analysis store not initialized'}), 500
+    
+    stored = analysis_store.get_analysis(analysis_id)
+    if stored is None:
+        return jsonify({'error': 'Analysis not found'}), 404
+    return jsonify(stored)
+
 @app.route('/api/check_compliance', methods=['POST'])
 def check_app_compliance():
     """Check app store compliance"""
@@ -298,15 +620,81 @@ def detailed_risk_assessment():
 
 @app.route('/api/health_check')
 def health_check():
-    """API health check"""
+    """API health check: healthy once the model is ready, starting while it loads, degraded if loading failed"""
+    model_status = model_initializer.status()
+    if model_status['state'] == READY:
+        status = 'healthy'
+    elif model_status['state'] == FAILED:
+        status = 'degraded'
+    else:
+        status = 'starting'
     return jsonify({
-        'status': 'healthy',
+        'status': status,
+        'model_status': model_status,
         'your_model_loaded': enhanced_analyzer is not None,
         'groq_enhancement': enhanced_analyzer.groq_enhancer is not None if enhanced_analyzer else False,
         'primary_model': 'YOUR_FINE_TUNED_ROBERTA_CUAD',
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/api/live')
+def liveness():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({'status': 'alive', 'timestamp': datetime.now().isoformat()})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint: stage latencies, batch sizes, cache lookups, queue depth and memory"""
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+def is_admin_request():
+    """Admin endpoints are disabled unless ADMIN_TOKEN is set; callers send it as X-Admin-Token"""
+    admin_token = os.getenv('ADMIN_TOKEN')
+    supplied = request.headers.get('X-Admin-Token', '')
+    return bool(admin_token) and hmac.compare_digest(supplied.encode(), admin_token.encode())
+
+@app.route('/api/admin/profile', methods=['GET', 'POST', 'DELETE'])
+def admin_profile():
+    """Start (POST), inspect (GET) or stop (DELETE) an on-demand profiling session"""
+    if not is_admin_request():
+        return jsonify({'error': 'Admin token required', 'timestamp': datetime.now().isoformat()}), 403
+
+    if request.method == 'GET':
+        return jsonify({**profiling.profiler.status(), 'timestamp': datetime.now().isoformat()})
+    if request.method == 'DELETE':
+        session = profiling.profiler.stop()
+        if session is None:
+            return jsonify({'error': 'No profiling session is running', 'timestamp': datetime.now().isoformat()}), 404
+        return jsonify({'session': session, 'timestamp': datetime.now().isoformat()})
+
+    data = request.get_json(silent=True) or {}
+    try:
+        session = profiling.profiler.start(
+            seconds=float(data['seconds']) if data.get('seconds') is not None else None,
+            requests=int(data['requests']) if data.get('requests') is not None else None,
+            fmt=data.get('format', 'collapsed'),
+            interval=float(data.get('interval_ms', profiling.DEFAULT_INTERVAL * 1000)) / 1000
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e), 'timestamp': datetime.now().isoformat()}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e), 'timestamp': datetime.now().isoformat()}), 409
+    return jsonify({'session': session, 'output_dir': profiling.profiler.output_dir,
+                    'timestamp': datetime.now().isoformat()}), 202
+
+@app.route('/api/ready')
+def readiness():
+    """Readiness probe: 200 only once the model is loaded and warmed up"""
+    ready = model_initializer.is_ready
+    response = jsonify({
+        'ready': ready,
+        'model_status': model_initializer.status(),
+        **(model_readiness if ready else {}),
+        'timestamp': datetime.now().isoformat()
+    })
+    response.status_code = 200 if ready else 503
+    return response
+
 # Authentication API endpoints (for React frontend)
 @app.route('/api/auth/login', methods=['POST'])
 def api_login():
@@ -386,6 +774,11 @@ def not_found(error):
         except:
             return jsonify({'error': 'Page not found'}), 404
 
+@app.errorhandler(413)
+def request_too_large(error):
+    limit = app.config['MAX_CONTENT_LENGTH']
+    return jsonify({'error': f'Upload too large: request body exceeds {limit} bytes'}), 413
+
 @app.errorhandler(500)
 def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
@@ -393,41 +786,35 @@ def internal_error(error):
 @app.route('/api/enhance_contract', methods=['POST'])
 def enhance_contract():
     """Enhance contract analysis with visual risk highlighting"""
-    print("🚀 ENHANCE ENDPOINT CALLED!")
     try:
         data = request.json
-        print(f"📊 Received data: {data is not None}")
         if not data:
-            print("❌ No data provided")
+            logger.warning("❌ Enhancement request without data", extra=HOT)
             return jsonify({'error': 'No data provided'}), 400
             
         contract_text = data.get('contract_text', '')
         contract_name = data.get('contract_name', 'Unnamed Contract')
-        print(f"📋 Processing enhancement for: {contract_name}")
-        print(f"📄 Contract text length: {len(contract_text)} characters")
         existing_analysis = data.get('existing_analysis', {})
         
         if not contract_text:
             return jsonify({'error': 'Contract text is required'}), 400
         
-        print(f"Starting enhancement for contract: {contract_name}")
+        logger.info("🚀 Starting enhancement", extra=hot(contract=contract_name, characters=len(contract_text)))
         
         # STEP 1: Always run YOUR model analysis first
-        print("🤖 Step 1: Running YOUR fine-tuned RoBERTa analysis...")
         
         # Get comprehensive analysis from YOUR model
         if existing_analysis and 'risk_assessment' in existing_analysis:
-            print("✅ Using existing analysis from YOUR model")
+            logger.debug("✅ Using existing analysis from YOUR model", extra=HOT)
             your_model_analysis = existing_analysis
             risk_assessment = existing_analysis['risk_assessment']
         else:
-            print("🔄 Running fresh analysis with YOUR fine-tuned model...")
+            logger.debug("🔄 Running fresh analysis with YOUR fine-tuned model...", extra=HOT)
             # Run complete analysis with YOUR model
             your_model_analysis = enhanced_analyzer.analyze_contract_comprehensive(contract_text)
             risk_assessment = your_model_analysis.get('risk_assessment', {})
         
         # STEP 2: Use Groq API for simple summary and detailed highlighting
-        print("⚡ Step 2: Getting Groq enhancement...")
         
         # Initialize Groq enhancer specifically for enhancement
         groq_summary = None
@@ -438,24 +825,21 @@ def enhance_contract():
             groq_enhancer = GroqEnhancement()
             
             if groq_enhancer.is_available():
-                print("✅ Groq API available, getting enhancements...")
-                
-                print("🔍 Getting simple summary from Groq...")
+                logger.debug("🔍 Getting simple summary from Groq...", extra=HOT)
                 groq_summary_result = groq_enhancer.enhance_analysis(contract_text, "simple_summary")
                 groq_summary = groq_summary_result.get('analysis', None) if groq_summary_result else None
                 
-                print("🎨 Getting detailed highlighting from Groq...")
+                logger.debug("🎨 Getting detailed highlighting from Groq...", extra=HOT)
                 groq_highlighting_result = groq_enhancer.enhance_analysis(contract_text, "risk_highlighting")
                 groq_highlighting = groq_highlighting_result.get('analysis', None) if groq_highlighting_result else None
                 
-                print("✅ Groq enhancements completed successfully")
+                logger.debug("✅ Groq enhancements completed", extra=hot(
+                    summary=groq_summary is not None, highlighting=groq_highlighting is not None))
             else:
-                print("⚠️ Groq API key not available")
+                logger.info("⚠️ Groq API key not available", extra=HOT)
                 
-        except Exception as e:
-            print(f"⚠️ Groq enhancement failed: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("⚠️ Groq enhancement failed", extra=HOT)
             groq_summary = None
             groq_highlighting = None
         
@@ -484,9 +868,7 @@ def enhance_contract():
         return jsonify(enhanced_result)
         
     except Exception as e:
-        print(f"Enhancement endpoint error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Enhancement endpoint error", extra=HOT)
         return jsonify({'error': f'Enhancement failed: {str(e)}'}), 500
 
 @app.route('/contract-creation')
@@ -641,27 +1023,27 @@ def generate_highlighted_contract(contract_text, risk_assessment, groq_highlight
             "specific payment terms", "data protection"
         ]
         
-        # Apply highlighting for YOUR model's findings
-        for term in high_risk_terms:
-            if term.lower() in contract_text.lower():
-                highlighted_html = highlighted_html.replace(
-                    term, 
-                    f'<span style="{risk_colors["high"]}" title="High Risk: {term}">{term}</span>'
-                )
-        
-        for term in medium_risk_terms:
-            if term.lower() in contract_text.lower():
-                highlighted_html = highlighted_html.replace(
-                    term, 
-                    f'<span style="{risk_colors["medium"]}" title="Medium Risk: {term}">{term}</span>'
-                )
-        
-        for term in low_risk_terms:
-            if term.lower() in contract_text.lower():
-                highlighted_html = highlighted_html.replace(
-                    term, 
-                    f'<span style="{risk_colors["low"]}" title="Low Risk: {term}">{term}</span>'
-                )
+        # Apply highlighting for YOUR model's findings in a single pass over the
+        # clause-segmented document, tagging each match with its clause
+        document = segment_contract(contract_text)
+        term_levels = {}
+        for level, terms in (("low", low_risk_terms), ("medium", medium_risk_terms), ("high", high_risk_terms)):
+            for term in terms:
+                term_levels[term] = level
+        
+        pieces = []
+        cursor = 0
+        for start, end, term in document.find_terms(list(term_levels)):
+            level = term_levels[term]
+            clause = document.clause_at(start)
+            location = f" ({escape(clause.title)})" if clause is not None and clause.title else ""
+            pieces.append(contract_text[cursor:start])
+            pieces.append(
+                f'<span style="{risk_colors[level]}" title="{level.title()} Risk: {term}{location}">{term}</span>'
+            )
+            cursor = end
+        pieces.append(contract_text[cursor:])
+        highlighted_html = ''.join(pieces)
         
         # Add Groq enhancements if available
         if groq_highlighting and isinstance(groq_highlighting, dict):
@@ -696,7 +1078,7 @@ def generate_highlighted_contract(contract_text, risk_assessment, groq_highlight
                                 f'<span style="{risk_colors["low"]}" title="Groq Analysis: {reason}">{text}</span>'
                             )
             except Exception as e:
-                print(f"Error applying Groq highlights: {str(e)}")
+                logger.warning("Error applying Groq highlights: %s", e, extra=HOT)
         
         # Convert line breaks to HTML
         highlighted_html = highlighted_html.replace('\n', '<br>')
@@ -704,7 +1086,7 @@ def generate_highlighted_contract(contract_text, risk_assessment, groq_highlight
         return highlighted_html
         
     except Exception as e:
-        print(f"Error generating highlighted contract: {str(e)}")
+        logger.warning("Error generating highlighted contract: %s", e, extra=HOT)
         return contract_text.replace('\n', '<br>')
 
 def generate_enhancement_summary(risk_assessment, groq_highlighting, groq_simple_summary):
@@ -738,14 +1120,32 @@ def generate_enhancement_summary(risk_assessment, groq_highlighting, groq_simple
     
     return summary
 
-# Initialize the enhanced analyzer system
-print("Initializing enhanced contract analysis system...")
-load_enhanced_system()
+# Initialize the enhanced analyzer system in the background so the server binds immediately.
+# Upload extraction workers import this module as __mp_main__ and must not load the model.
+if __name__ != '__mp_main__':
+    print("Initializing enhanced contract analysis system...")
+    load_analysis_store()
+    model_initializer.start()
 
 if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Unified Contract Analysis Server")
+    parser.add_argument('--profile-seconds', type=float, help="Sample all threads for this many seconds after startup")
+    parser.add_argument('--profile-requests', type=int, help="Profile the next K requests")
+    parser.add_argument('--profile-format', choices=profiling.FORMATS, default='collapsed')
+    args = parser.parse_args()
+    debug = os.getenv('FLASK_DEBUG', '1') != '0'
+
+    # With the debug reloader only the serving child process profiles
+    if (args.profile_seconds or args.profile_requests) and (not debug or os.environ.get('WERKZEUG_RUN_MAIN')):
+        session = profiling.profiler.start(seconds=args.profile_seconds, requests=args.profile_requests,
+                                           fmt=args.profile_format)
+        print(f"🔬 Profiling session {session['id']} started, output in {profiling.profiler.output_dir}")
+
     print("🚀 Starting Unified Contract Analysis Server...")
     print("📊 Landing Page: http://localhost:5000")
     print("🔍 Contract Analysis: http://localhost:5000/contract-analysis")
     print("💡 Uses YOUR fine-tuned RoBERTa model as primary engine")
     print("⚡ Optional Groq enhancement available")
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=int(os.getenv('PORT', '5000')), debug=debug)